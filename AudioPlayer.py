@@ -1,7 +1,9 @@
 import os
 import sys
 import subprocess
-from BluetoothAudioPlayer import play_audio_bluetooth
+import tempfile
+import wave
+from BluetoothAudioPlayer import play_audio_bluetooth, get_bluetooth_sink
 
 
 def play_audio(audio_file: str) -> bool:
@@ -65,3 +67,84 @@ def play_audio(audio_file: str) -> bool:
         print(f"Audio playback failed: {e}")
         return False
 
+
+def _raw_playback_commands(sample_rate: int):
+    commands = []
+    if os.getenv("BLUETOOTH_OUTPUT", "false").lower() == "true":
+        bt_sink = get_bluetooth_sink()
+        if bt_sink:
+            commands.append(["paplay", "--raw", "--device", bt_sink, "--format=s16le",
+                             f"--rate={sample_rate}", "--channels=1"])
+    if sys.platform == "linux":
+        commands.append(["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(sample_rate), "-c", "1"])
+        commands.append(["paplay", "--raw", "--format=s16le", f"--rate={sample_rate}", "--channels=1"])
+    return commands
+
+
+def _play_buffered(pcm_blocks, sample_rate: int, first_block: bytes) -> bool:
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+        wav_path = tmp.name
+    try:
+        with wave.open(wav_path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(first_block)
+            for block in pcm_blocks:
+                wav_file.writeframes(block)
+        return play_audio(wav_path)
+    finally:
+        try:
+            os.unlink(wav_path)
+        except:
+            pass
+
+
+def play_stream(pcm_blocks, sample_rate: int) -> bool:
+    """Play mono 16-bit PCM blocks as they arrive instead of waiting for a finished file."""
+    try:
+        pcm_blocks = iter(pcm_blocks)
+        first_block = next(pcm_blocks, None)
+        if first_block is None:
+            print("Audio stream was empty")
+            return False
+        
+        # Blocks read from the stream so far: a player that fails (no device, wrong
+        # sink) hands them to the next one instead of dropping the utterance
+        received = [first_block]
+        for cmd in _raw_playback_commands(sample_rate):
+            try:
+                player = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+            except FileNotFoundError:
+                continue
+            try:
+                for block in received:
+                    player.stdin.write(block)
+                for block in pcm_blocks:
+                    received.append(block)
+                    player.stdin.write(block)
+            except BrokenPipeError:
+                player.wait()
+                print(f"{cmd[0]} stopped reading the audio stream, trying the next player")
+                continue
+            except ConnectionError as e:
+                # The server went away mid-stream: let the player drain what it has, then reap it
+                player.stdin.close()
+                player.wait()
+                print(f"Audio stream ended early: {e}")
+                return False
+            finally:
+                try:
+                    player.stdin.close()
+                except BrokenPipeError:
+                    pass
+            if player.wait() == 0:
+                return True
+            print(f"{cmd[0]} failed with error code {player.returncode}, trying the next player")
+        
+        # No raw-PCM player worked: collect the stream and play it as a file
+        return _play_buffered(pcm_blocks, sample_rate, b"".join(received))
+        
+    except Exception as e:
+        print(f"Audio stream playback failed: {e}")
+        return False
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import uuid
+import shutil
+from pathlib import Path
+
+from OutputStore import untrack_output
+
+# Ready-to-play clips kept per time period, and how long a clip stays valid.
+MAX_CLIPS_PER_PERIOD = 5
+MAX_CLIP_AGE_HOURS = 12
+
+
+def get_buffer_dir(buffer_dir: str = None) -> str:
+    if buffer_dir is None:
+        buffer_dir = os.getenv("CLIP_BUFFER_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "buffer")
+    return buffer_dir
+
+
+def _period_dir(period: str, buffer_dir: str = None) -> Path:
+    return Path(get_buffer_dir(buffer_dir)) / period
+
+
+def _metadata_path(clip_path: Path) -> Path:
+    return clip_path.with_suffix(".json")
+
+
+def _read_metadata(clip_path: Path) -> dict:
+    try:
+        with open(_metadata_path(clip_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove_clip(clip_path: Path):
+    for path in (clip_path, _metadata_path(clip_path)):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def list_clips(period: str, buffer_dir: str = None) -> list:
+    period_dir = _period_dir(period, buffer_dir)
+    if not period_dir.exists():
+        return []
+    return sorted(period_dir.glob("*.wav"))
+
+
+def count_clips(period: str, buffer_dir: str = None) -> int:
+    return len(list_clips(period, buffer_dir))
+
+
+def add_clip(period: str, audio_path: str, text: str, buffer_dir: str = None) -> str:
+    period_dir = _period_dir(period, buffer_dir)
+    period_dir.mkdir(parents=True, exist_ok=True)
+    created = time.time()
+    clip_path = period_dir / f"{int(created * 1000):015d}_{uuid.uuid4().hex[:8]}.wav"
+
+    # Write metadata first so a clip is never visible without its text
+    with open(_metadata_path(clip_path), "w", encoding="utf-8") as f:
+        json.dump({"text": text, "created": created}, f, ensure_ascii=False)
+    tmp_path = clip_path.with_suffix(".wav.tmp")
+    untrack_output(audio_path)
+    shutil.move(audio_path, tmp_path)
+    os.replace(tmp_path, clip_path)
+
+    prune_clips(period, buffer_dir)
+    return str(clip_path)
+
+
+def pop_clip(period: str, buffer_dir: str = None):
+    # Claims the oldest fresh clip by moving it out of the queue; the caller discards it after playback
+    prune_clips(period, buffer_dir)
+    playing_dir = _period_dir(period, buffer_dir) / "playing"
+    for clip_path in list_clips(period, buffer_dir):
+        playing_dir.mkdir(exist_ok=True)
+        claimed_path = playing_dir / clip_path.name
+        try:
+            os.replace(clip_path, claimed_path)
+        except FileNotFoundError:
+            continue
+        metadata = _read_metadata(clip_path)
+        try:
+            _metadata_path(clip_path).unlink()
+        except FileNotFoundError:
+            pass
+        return str(claimed_path), metadata.get("text", "")
+    return None
+
+
+def discard_clip(audio_path: str):
+    try:
+        os.unlink(audio_path)
+    except FileNotFoundError:
+        pass
+
+
+def prune_clips(period: str, buffer_dir: str = None,
+                max_clips: int = None, max_age_hours: float = None) -> int:
+    if max_clips is None:
+        max_clips = MAX_CLIPS_PER_PERIOD
+    if max_age_hours is None:
+        max_age_hours = MAX_CLIP_AGE_HOURS
+
+    removed = 0
+    now = time.time()
+    fresh_clips = []
+    for clip_path in list_clips(period, buffer_dir):
+        try:
+            created = _read_metadata(clip_path).get("created") or clip_path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if now - created > max_age_hours * 3600:
+            _remove_clip(clip_path)
+            removed += 1
+        else:
+            fresh_clips.append(clip_path)
+
+    # Clips claimed by a playback that never finished
+    playing_dir = _period_dir(period, buffer_dir) / "playing"
+    if playing_dir.exists():
+        for claimed_path in playing_dir.glob("*.wav"):
+            try:
+                if now - claimed_path.stat().st_mtime > max_age_hours * 3600:
+                    claimed_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    # Clips are named by creation time, so the overflow to drop is at the front
+    for clip_path in fresh_clips[:max(0, len(fresh_clips) - max_clips)]:
+        _remove_clip(clip_path)
+        removed += 1
+    return removed
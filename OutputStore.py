@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+# Converted clips kept in outputs/; the oldest are rotated out beyond either limit.
+MAX_OUTPUT_FILES = 200
+MAX_OUTPUT_MB = 300
+
+
+def get_output_dir(output_dir: str = None) -> str:
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs")
+    return output_dir
+
+
+# Per output directory: its clips oldest first as (path, size), their total size and the
+# paths handed out since the last rotation. The directory is scanned once per process;
+# after that only newly allocated clips are looked at.
+_tracked = {}
+_tracked_lock = threading.Lock()
+
+
+def _tracked_outputs(output_dir: str) -> dict:
+    output_dir = os.path.abspath(output_dir)
+    state = _tracked.get(output_dir)
+    if state is None:
+        outputs = []
+        for output_path in Path(output_dir).glob("*.wav"):
+            try:
+                stat = output_path.stat()
+            except FileNotFoundError:
+                continue
+            outputs.append((stat.st_mtime, str(output_path), stat.st_size))
+        outputs.sort()
+        state = {
+            "outputs": deque((path, size) for _, path, size in outputs),
+            "total": sum(size for _, _, size in outputs),
+            "pending": [],
+        }
+        _tracked[output_dir] = state
+    return state
+
+
+def allocate_output(output_dir: str = None, prefix: str = "vc") -> str:
+    # Names are unique per call, so overlapping conversions never share a file
+    output_dir = get_output_dir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{prefix}_{int(time.time() * 1000):015d}_{uuid.uuid4().hex[:8]}.wav")
+    with _tracked_lock:
+        _tracked_outputs(output_dir)["pending"].append(os.path.abspath(output_path))
+    return output_path
+
+
+def untrack_output(output_path: str):
+    """Forget a clip that is being moved out of outputs/, so it no longer counts against the limits."""
+    output_path = os.path.abspath(output_path)
+    with _tracked_lock:
+        state = _tracked.get(os.path.dirname(output_path))
+        if state is None:
+            return
+        if output_path in state["pending"]:
+            state["pending"].remove(output_path)
+            return
+        for entry in state["outputs"]:
+            if entry[0] == output_path:
+                state["outputs"].remove(entry)
+                state["total"] -= entry[1]
+                return
+
+
+def rotate_outputs(output_dir: str = None, max_files: int = None, max_mb: float = None) -> int:
+    if max_files is None:
+        max_files = MAX_OUTPUT_FILES
+    if max_mb is None:
+        max_mb = MAX_OUTPUT_MB
+    budget = max_mb * 1024 * 1024
+
+    with _tracked_lock:
+        state = _tracked_outputs(get_output_dir(output_dir))
+        outputs = state["outputs"]
+        for output_path in state["pending"]:
+            try:
+                size = os.path.getsize(output_path)
+            except FileNotFoundError:
+                # The conversion that allocated it failed
+                continue
+            outputs.append((output_path, size))
+            state["total"] += size
+        state["pending"] = []
+
+        removed = 0
+        # The newest clip is always kept, it is the one a caller is about to play
+        while len(outputs) > 1 and (len(outputs) > max_files or state["total"] > budget):
+            output_path, size = outputs.popleft()
+            state["total"] -= size
+            try:
+                os.unlink(output_path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+    return removed
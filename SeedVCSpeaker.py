@@ -1,8 +1,48 @@
 import os
 import sys
+import json
+import socket
+import struct
 import subprocess
 import tempfile
+import wave
 from pathlib import Path
+from OutputStore import get_output_dir, allocate_output, rotate_outputs
+from UtteranceCache import tts_key, vc_key, lookup_utterance, store_utterance, copy_utterance
+
+DEFAULT_SEED_VC_SOCKET = "/tmp/seed_vc.sock"
+# Must match RESULT_PREFIX in seed-vc/inference.py
+INFERENCE_RESULT_PREFIX = "SEED_VC_RESULT "
+# Length of each source window converted before its audio is handed to playback.
+STREAM_CHUNK_SECONDS = 3.0
+# Reference prompt each streamed window attends to. With the full reference (up to 25 s)
+# every 3 s window costs about as much as a whole short clip; a shorter prompt makes
+# streaming cheaper and the first audio earlier, at some cost in speaker similarity.
+STREAM_PROMPT_SECONDS = 6.0
+
+# Conversion parameters shared by the resident server and the subprocess fallback.
+VC_PARAMS = {
+    "diffusion_steps": 40,
+    "inference_cfg_rate": 0.7,
+    # ODE solver, timestep schedule and early-stop tolerance, see seed-vc/modules/flow_matching.py
+    "solver": "euler",
+    "schedule": "uniform",
+    "velocity_tol": None,
+    # Guidance window over diffusion time and unconditional-prediction reuse
+    "cfg_interval": (0.0, 1.0),
+    "cfg_reuse": 1,
+    "f0_condition": False,
+    "auto_f0_adjust": True,
+    "fp16": False,
+}
+# Streamed conversions use a shorter prompt, so they are cached under their own key.
+STREAM_VC_PARAMS = dict(VC_PARAMS, chunk_seconds=STREAM_CHUNK_SECONDS, prompt_seconds=STREAM_PROMPT_SECONDS)
+
+# OpenAI speech settings; part of the utterance cache key together with VC_PARAMS.
+TTS_PARAMS = {
+    "model": "tts-1",
+    "voice": "alloy",
+}
 
 
 def text_to_speech_tts(text: str, output_path: str, language: str = "zh", api_key: str = None) -> bool:
@@ -17,11 +57,9 @@ def text_to_speech_tts(text: str, output_path: str, language: str = "zh", api_ke
         
         client = OpenAI(api_key=api_key)
         
-        voice = "alloy"
-        
         response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
+            model=TTS_PARAMS["model"],
+            voice=TTS_PARAMS["voice"],
             input=text,
         )
         
@@ -36,125 +74,456 @@ def text_to_speech_tts(text: str, output_path: str, language: str = "zh", api_ke
         return False
 
 
+def get_server_socket(socket_path: str = None) -> str:
+    if socket_path is None:
+        socket_path = os.getenv("SEED_VC_SOCKET", DEFAULT_SEED_VC_SOCKET)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    return socket_path
+
+
+def _build_request(op: str, reference_audio: str, profile_dir: str = None, **fields) -> dict:
+    request = {
+        "op": op,
+        "target": os.path.abspath(reference_audio),
+        "diffusion_steps": VC_PARAMS["diffusion_steps"],
+        "inference_cfg_rate": VC_PARAMS["inference_cfg_rate"],
+        "solver": VC_PARAMS["solver"],
+        "schedule": VC_PARAMS["schedule"],
+        "velocity_tol": VC_PARAMS["velocity_tol"],
+        "cfg_interval": list(VC_PARAMS["cfg_interval"]),
+        "cfg_reuse": VC_PARAMS["cfg_reuse"],
+        "f0_condition": VC_PARAMS["f0_condition"],
+        "auto_f0_adjust": VC_PARAMS["auto_f0_adjust"],
+    }
+    if profile_dir is not None:
+        request["profile"] = os.path.abspath(profile_dir)
+    request.update(fields)
+    return request
+
+
+def _request_server(request: dict, socket_path: str = None, timeout: float = 600) -> dict:
+    socket_path = get_server_socket(socket_path)
+    if socket_path is None:
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                line = reader.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    except OSError as e:
+        print(f"seed-vc server request failed: {e}")
+        return None
+
+    if not line:
+        print("seed-vc server closed the connection without a response")
+        return None
+    response = json.loads(line)
+    if response.get("status") != "ok":
+        print(f"seed-vc server {request['op']} failed: {response.get('error')}")
+        return None
+    return response
+
+
+def convert_with_server(source_audio: str, reference_audio: str, output_path: str,
+                        profile_dir: str = None, socket_path: str = None, timeout: float = 600) -> str:
+    request = _build_request("convert", reference_audio, profile_dir,
+                             source=os.path.abspath(source_audio),
+                             output_file=os.path.abspath(output_path))
+    response = _request_server(request, socket_path, timeout)
+    if response is None:
+        return None
+    return response["output"]
+
+
+def convert_batch_with_server(source_audios: list, reference_audio: str, output_paths: list,
+                              profile_dir: str = None, socket_path: str = None, timeout: float = 1800) -> list:
+    request = _build_request("convert_batch", reference_audio, profile_dir,
+                             sources=[os.path.abspath(path) for path in source_audios],
+                             output_files=[os.path.abspath(path) for path in output_paths])
+    response = _request_server(request, socket_path, timeout)
+    if response is None:
+        return None
+    return response["outputs"]
+
+
+def _read_exact(reader, size: int) -> bytes:
+    data = reader.read(size)
+    if data is None or len(data) != size:
+        raise ConnectionError("seed-vc server stream ended unexpectedly")
+    return data
+
+
+def _iter_pcm_frames(sock, reader, on_close=None):
+    try:
+        while True:
+            size = struct.unpack(">I", _read_exact(reader, 4))[0]
+            if size == 0:
+                return
+            yield _read_exact(reader, size)
+    finally:
+        reader.close()
+        sock.close()
+        if on_close is not None:
+            on_close()
+
+
+def stream_with_server(source_audio: str, reference_audio: str, profile_dir: str = None,
+                       socket_path: str = None, timeout: float = 600, on_close=None):
+    socket_path = get_server_socket(socket_path)
+    if socket_path is None:
+        return None
+
+    request = _build_request("stream", reference_audio, profile_dir,
+                             source=os.path.abspath(source_audio),
+                             chunk_seconds=STREAM_CHUNK_SECONDS,
+                             prompt_seconds=STREAM_PROMPT_SECONDS)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        reader = sock.makefile("rb")
+        line = reader.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        sock.close()
+        return None
+    except OSError as e:
+        print(f"seed-vc server request failed: {e}")
+        sock.close()
+        return None
+
+    response = json.loads(line) if line else {"status": "error", "error": "no response"}
+    if response.get("status") != "ok":
+        print(f"seed-vc server streaming failed: {response.get('error')}")
+        reader.close()
+        sock.close()
+        return None
+    return response["sample_rate"], _iter_pcm_frames(sock, reader, on_close=on_close)
+
+
+def resolve_seed_vc_path(seed_vc_path: str = None) -> str:
+    if seed_vc_path is None:
+        seed_vc_path = os.getenv("SEED_VC_PATH")
+        if seed_vc_path and ("/path/to/" in seed_vc_path or not os.path.exists(seed_vc_path)):
+            seed_vc_path = None
+    if seed_vc_path is None:
+        project_root = Path(__file__).resolve().parent
+        default_path = project_root / "seed-vc"
+        if default_path.exists():
+            seed_vc_path = str(default_path)
+    if seed_vc_path is None:
+        raise ValueError("Seed-VC path not found. Set SEED_VC_PATH or place seed-vc/ in project root.")
+    return seed_vc_path
+
+
+def resolve_reference_audio(seed_vc_path: str, reference_audio: str = None) -> str:
+    if reference_audio is not None:
+        return reference_audio
+
+    grandfather_dir = os.path.join(seed_vc_path, "data/grandfather")
+    checkpoints_dir = os.path.join(seed_vc_path, "checkpoints")
+    
+    reference_audio_options = [
+        os.path.join(checkpoints_dir, "grandfather_vc_model.pt"),
+        os.path.join(grandfather_dir, "Grandfather_ref_enhanced.wav"),
+        os.path.join(grandfather_dir, "Grandfather_ref_long.wav"),
+        os.path.join(grandfather_dir, "Grandfather_ref_rebuild.wav"),
+        os.path.join(grandfather_dir, "Grandfather_ref.wav"),
+        os.path.join(grandfather_dir, "Grandfather.wav"),
+        os.path.join(grandfather_dir, "WelcomeHome_ref.wav"),
+        os.path.join(grandfather_dir, "Hi_ref.wav"),
+    ]
+    
+    for option in reference_audio_options:
+        if os.path.exists(option):
+            return option
+    
+    if os.path.exists(grandfather_dir):
+        wav_files = list(Path(grandfather_dir).glob("*.wav"))
+        if wav_files:
+            ref_files = [f for f in wav_files if "ref" in f.name.lower() or "grandfather" in f.name.lower()]
+            if ref_files:
+                return str(ref_files[0])
+            return str(wav_files[0])
+    
+    return os.path.join(grandfather_dir, "Grandfather_ref.wav")
+
+
+def _inference_command(seed_vc_path: str, reference_audio: str, profile_dir: str) -> list:
+    python_executable = sys.executable
+    project_root = Path(__file__).resolve().parent
+    venv_python = project_root / ".venv" / "bin" / "python"
+    if venv_python.exists():
+        python_executable = str(venv_python)
+    
+    cmd = [
+        python_executable,
+        os.path.join(seed_vc_path, "inference.py"),
+        "--target", reference_audio,
+        "--diffusion-steps", str(VC_PARAMS["diffusion_steps"]),
+        "--inference-cfg-rate", str(VC_PARAMS["inference_cfg_rate"]),
+        "--solver", VC_PARAMS["solver"],
+        "--schedule", VC_PARAMS["schedule"],
+        "--cfg-interval", str(VC_PARAMS["cfg_interval"][0]), str(VC_PARAMS["cfg_interval"][1]),
+        "--cfg-reuse", str(VC_PARAMS["cfg_reuse"]),
+        "--f0-condition", str(int(VC_PARAMS["f0_condition"])),
+        "--auto-f0-adjust", str(int(VC_PARAMS["auto_f0_adjust"])),
+        "--fp16", str(VC_PARAMS["fp16"]),
+        "--profile", profile_dir
+    ]
+    if VC_PARAMS["velocity_tol"] is not None:
+        cmd += ["--velocity-tol", str(VC_PARAMS["velocity_tol"])]
+    return cmd
+
+
+def _run_inference(cmd: list, seed_vc_path: str) -> dict:
+    result = subprocess.run(cmd, cwd=seed_vc_path, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"seed-vc conversion failed: {result.stderr}")
+        return None
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith(INFERENCE_RESULT_PREFIX):
+            return json.loads(line[len(INFERENCE_RESULT_PREFIX):])
+    print("seed-vc conversion did not report its output")
+    return None
+
+
+def _synthesize_source(text: str, api_key: str = None, tts_fn=None) -> str:
+    if tts_fn is None:
+        tts_fn = text_to_speech_tts
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_source:
+        source_audio_path = tmp_source.name
+    
+    key = tts_key(text, TTS_PARAMS)
+    cached = lookup_utterance("tts", key)
+    if cached is not None:
+        return copy_utterance(cached, source_audio_path)
+    
+    if not tts_fn(text, source_audio_path, language="zh", api_key=api_key):
+        os.unlink(source_audio_path)
+        return None
+    store_utterance("tts", key, source_audio_path)
+    return source_audio_path
+
+
+def _cached_output(text: str, reference_audio: str, output_dir: str) -> str:
+    cached = lookup_utterance("vc", vc_key(text, reference_audio, TTS_PARAMS, VC_PARAMS))
+    if cached is None:
+        return None
+    print(f"Using cached conversion: {text}")
+    return copy_utterance(cached, allocate_output(output_dir))
+
+
+def _store_output(text: str, reference_audio: str, output_path: str, vc_params: dict = VC_PARAMS):
+    store_utterance("vc", vc_key(text, reference_audio, TTS_PARAMS, vc_params), output_path)
+
+
+def _iter_wav_frames(audio_path: str, block_seconds: float = 1.0):
+    with wave.open(audio_path, "rb") as reader:
+        block_frames = int(reader.getframerate() * block_seconds)
+        while True:
+            frames = reader.readframes(block_frames)
+            if not frames:
+                return
+            yield frames
+
+
+def _cache_stream(pcm_frames, sample_rate: int, text: str, reference_audio: str):
+    frames = []
+    for frame in pcm_frames:
+        frames.append(frame)
+        yield frame
+    # Only a stream that reached its end frame gets here
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_output:
+        output_path = tmp_output.name
+    try:
+        with wave.open(output_path, "wb") as writer:
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(sample_rate)
+            writer.writeframes(b"".join(frames))
+        _store_output(text, reference_audio, output_path, STREAM_VC_PARAMS)
+    finally:
+        os.unlink(output_path)
+
+
 def speak_with_seed_vc(text: str, 
                        seed_vc_path: str = None,
                        reference_audio: str = None,
                        output_dir: str = None,
                        api_key: str = None) -> str:
     try:
-        if seed_vc_path is None:
-            seed_vc_path = os.getenv("SEED_VC_PATH")
-            if seed_vc_path and ("/path/to/" in seed_vc_path or not os.path.exists(seed_vc_path)):
-                seed_vc_path = None
-        if seed_vc_path is None:
-            project_root = Path(__file__).resolve().parent
-            default_path = project_root / "seed-vc"
-            if default_path.exists():
-                seed_vc_path = str(default_path)
-        if seed_vc_path is None:
-            raise ValueError("Seed-VC path not found. Set SEED_VC_PATH or place seed-vc/ in project root.")
-        
-        if reference_audio is None:
-            grandfather_dir = os.path.join(seed_vc_path, "data/grandfather")
-            checkpoints_dir = os.path.join(seed_vc_path, "checkpoints")
-            
-            reference_audio_options = [
-                os.path.join(checkpoints_dir, "grandfather_vc_model.pt"),
-                os.path.join(grandfather_dir, "Grandfather_ref_enhanced.wav"),
-                os.path.join(grandfather_dir, "Grandfather_ref_long.wav"),
-                os.path.join(grandfather_dir, "Grandfather_ref_rebuild.wav"),
-                os.path.join(grandfather_dir, "Grandfather_ref.wav"),
-                os.path.join(grandfather_dir, "Grandfather.wav"),
-                os.path.join(grandfather_dir, "WelcomeHome_ref.wav"),
-                os.path.join(grandfather_dir, "Hi_ref.wav"),
-            ]
-            
-            reference_audio = None
-            for option in reference_audio_options:
-                if os.path.exists(option):
-                    reference_audio = option
-                    break
-            
-            if reference_audio is None:
-                if os.path.exists(grandfather_dir):
-                    wav_files = list(Path(grandfather_dir).glob("*.wav"))
-                    if wav_files:
-                        ref_files = [f for f in wav_files if "ref" in f.name.lower() or "grandfather" in f.name.lower()]
-                        if ref_files:
-                            reference_audio = str(ref_files[0])
-                        else:
-                            reference_audio = str(wav_files[0])
-                
-                if reference_audio is None:
-                    reference_audio = os.path.join(grandfather_dir, "Grandfather_ref.wav")
-        
-        if output_dir is None:
-            output_dir = os.path.join(os.path.dirname(__file__), "outputs")
+        seed_vc_path = resolve_seed_vc_path(seed_vc_path)
+        reference_audio = resolve_reference_audio(seed_vc_path, reference_audio)
         
+        output_dir = get_output_dir(output_dir)
         os.makedirs(output_dir, exist_ok=True)
         
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_source:
-            source_audio_path = tmp_source.name
+        if not os.path.exists(reference_audio):
+            print(f"Reference audio not found: {reference_audio}")
+            return None
+        
+        output_path = _cached_output(text, reference_audio, output_dir)
+        if output_path is not None:
+            return output_path
         
-        if not text_to_speech_tts(text, source_audio_path, language="zh", api_key=api_key):
+        source_audio_path = _synthesize_source(text, api_key=api_key)
+        if source_audio_path is None:
             print("TTS conversion failed")
+            return None
+        
+        profile_dir = os.path.join(seed_vc_path, "checkpoints", "profiles")
+        output_path = allocate_output(output_dir)
+        converted_path = convert_with_server(source_audio_path, reference_audio, output_path, profile_dir=profile_dir)
+        
+        if converted_path is None:
+            inference_script = os.path.join(seed_vc_path, "inference.py")
+            
+            if not os.path.exists(inference_script):
+                print(f"inference.py not found: {inference_script}")
+                os.unlink(source_audio_path)
+                return None
+            
+            cmd = _inference_command(seed_vc_path, reference_audio, profile_dir)
+            cmd += ["--source", source_audio_path, "--output-file", output_path]
+            result = _run_inference(cmd, seed_vc_path)
+            converted_path = result.get("output") if result is not None else None
+        
+        try:
             os.unlink(source_audio_path)
+        except:
+            pass
+        
+        if converted_path is None or not os.path.exists(converted_path):
+            print("Output file not found")
             return None
         
+        _store_output(text, reference_audio, converted_path)
+        rotate_outputs(output_dir)
+        return converted_path
+            
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def speak_batch_with_seed_vc(texts: list,
+                             seed_vc_path: str = None,
+                             reference_audio: str = None,
+                             output_dir: str = None,
+                             api_key: str = None) -> list:
+    outputs = [None] * len(texts)
+    source_audio_paths = []
+    try:
+        seed_vc_path = resolve_seed_vc_path(seed_vc_path)
+        reference_audio = resolve_reference_audio(seed_vc_path, reference_audio)
+        
+        output_dir = get_output_dir(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        
         if not os.path.exists(reference_audio):
             print(f"Reference audio not found: {reference_audio}")
-            os.unlink(source_audio_path)
-            return None
+            return outputs
         
-        inference_script = os.path.join(seed_vc_path, "inference.py")
+        converted = []
+        for i, text in enumerate(texts):
+            outputs[i] = _cached_output(text, reference_audio, output_dir)
+            if outputs[i] is not None:
+                continue
+            source_audio_path = _synthesize_source(text, api_key=api_key)
+            if source_audio_path is None:
+                print(f"TTS conversion failed: {text}")
+                continue
+            source_audio_paths.append(source_audio_path)
+            converted.append(i)
+        if not converted:
+            return outputs
+        sources = list(source_audio_paths)
         
-        if not os.path.exists(inference_script):
-            print(f"inference.py not found: {inference_script}")
-            os.unlink(source_audio_path)
+        profile_dir = os.path.join(seed_vc_path, "checkpoints", "profiles")
+        output_paths = [allocate_output(output_dir) for _ in sources]
+        converted_paths = convert_batch_with_server(sources, reference_audio, output_paths, profile_dir=profile_dir)
+        if converted_paths is None:
+            cmd = _inference_command(seed_vc_path, reference_audio, profile_dir)
+            cmd += ["--batch-sources"] + sources + ["--output-files"] + output_paths
+            result = _run_inference(cmd, seed_vc_path)
+            if result is None:
+                return outputs
+            converted_paths = result["outputs"]
+        
+        for i, output_path in zip(converted, converted_paths):
+            if os.path.exists(output_path):
+                outputs[i] = output_path
+                _store_output(texts[i], reference_audio, output_path)
+        rotate_outputs(output_dir)
+        return outputs
+        
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return outputs
+    finally:
+        for source_audio_path in source_audio_paths:
+            try:
+                os.unlink(source_audio_path)
+            except:
+                pass
+
+
+def stream_speak_with_seed_vc(text: str,
+                              seed_vc_path: str = None,
+                              reference_audio: str = None,
+                              api_key: str = None,
+                              tts_fn=None):
+    try:
+        seed_vc_path = resolve_seed_vc_path(seed_vc_path)
+        reference_audio = resolve_reference_audio(seed_vc_path, reference_audio)
+        
+        if not os.path.exists(reference_audio):
+            print(f"Reference audio not found: {reference_audio}")
             return None
         
-        python_executable = sys.executable
-        project_root = Path(__file__).resolve().parent
-        venv_python = project_root / ".venv" / "bin" / "python"
-        if venv_python.exists():
-            python_executable = str(venv_python)
-        
-        cmd = [
-            python_executable,
-            inference_script,
-            "--source", source_audio_path,
-            "--target", reference_audio,
-            "--output", output_dir,
-            "--diffusion-steps", "40",
-            "--inference-cfg-rate", "0.7",
-            "--f0-condition", "0",
-            "--auto-f0-adjust", "1",
-            "--fp16", "False"
-        ]
-        
-        result = subprocess.run(cmd, cwd=seed_vc_path, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print(f"seed-vc conversion failed: {result.stderr}")
-            os.unlink(source_audio_path)
+        # A full-prompt conversion is at least as good as a streamed one
+        cached = (lookup_utterance("vc", vc_key(text, reference_audio, TTS_PARAMS, VC_PARAMS))
+                  or lookup_utterance("vc", vc_key(text, reference_audio, TTS_PARAMS, STREAM_VC_PARAMS)))
+        if cached is not None:
+            print(f"Using cached conversion: {text}")
+            with wave.open(cached, "rb") as reader:
+                sample_rate = reader.getframerate()
+            return sample_rate, _iter_wav_frames(cached)
+        
+        # Streaming needs the resident server; let the caller fall back before spending a TTS call
+        if get_server_socket() is None:
             return None
         
-        output_files = sorted(Path(output_dir).glob("*.wav"), key=lambda x: x.stat().st_mtime, reverse=True)
+        source_audio_path = _synthesize_source(text, api_key=api_key, tts_fn=tts_fn)
+        if source_audio_path is None:
+            print("TTS conversion failed")
+            return None
         
-        if output_files:
-            output_path = str(output_files[0])
-            
+        def remove_source():
             try:
                 os.unlink(source_audio_path)
             except:
                 pass
-            
-            return output_path
-        else:
-            print("Output file not found")
-            os.unlink(source_audio_path)
+        
+        profile_dir = os.path.join(seed_vc_path, "checkpoints", "profiles")
+        stream = stream_with_server(source_audio_path, reference_audio, profile_dir=profile_dir,
+                                    on_close=remove_source)
+        if stream is None:
+            remove_source()
             return None
-            
+        sample_rate, pcm_frames = stream
+        return sample_rate, _cache_stream(pcm_frames, sample_rate, text, reference_audio)
+        
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -3,10 +3,12 @@ import time
 import random
 import os
 import json
+import threading
 from pathlib import Path
 from openai import OpenAI
-from SeedVCSpeaker import speak_with_seed_vc
-from AudioPlayer import play_audio
+from SeedVCSpeaker import speak_with_seed_vc, speak_batch_with_seed_vc, stream_speak_with_seed_vc
+from AudioPlayer import play_audio, play_stream
+from ClipBuffer import MAX_CLIPS_PER_PERIOD, add_clip, pop_clip, discard_clip, count_clips, prune_clips
 
 try:
     from dotenv import load_dotenv  # type: ignore
@@ -26,6 +28,14 @@ client = OpenAI(api_key=api_key)
 MIN_INTERVAL_HOURS = 0.01 
 MAX_INTERVAL_HOURS = 0.02
 
+# How often the background producer tops up the clip buffer, in seconds.
+REFILL_CHECK_SECONDS = 300
+
+PERIOD_START_HOURS = {"morning": 5, "noon": 12, "afternoon": 14, "evening": 18, "night": 22}
+
+# GPT/TTS/VC runs one pipeline at a time, whether for the buffer or an inline trigger.
+pipeline_lock = threading.Lock()
+
 
 def get_status_from_hour(hour):
     if 5 <= hour < 12:
@@ -40,13 +50,31 @@ def get_status_from_hour(hour):
         return "night"
 
 
-def generate_and_play_message():
-    try:
-        now = datetime.datetime.now()
-        hour = now.hour
-        status = get_status_from_hour(hour)
+def get_upcoming_periods(now):
+    current = get_status_from_hour(now.hour)
+    periods = [current]
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    for offset in range(1, 25):
+        status = get_status_from_hour((hour_start + datetime.timedelta(hours=offset)).hour)
+        if status != current:
+            periods.append(status)
+            break
+    return periods
+
+
+def get_period_datetime(period, now):
+    if get_status_from_hour(now.hour) == period:
+        return now
+    when = now.replace(hour=PERIOD_START_HOURS[period], minute=0, second=0, microsecond=0)
+    if when < now:
+        when += datetime.timedelta(days=1)
+    return when
+
 
-        prompt = f"""
+def generate_messages(now):
+    status = get_status_from_hour(now.hour)
+
+    prompt = f"""
 You are writing as a loving Chinese grandfather (外公/爷爷) talking to his grandchild.
 
 Current datetime: {now.strftime('%Y-%m-%d %H:%M')}
@@ -75,35 +103,118 @@ Output format:
   ["sentence1", "sentence2", "sentence3", "sentence4", "sentence5"]
 """
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that generates JSON arrays."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-        
-        content = response.choices[0].message.content.strip()
-        # Try to extract JSON array from the response
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that generates JSON arrays."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7
+    )
+    
+    content = response.choices[0].message.content.strip()
+    # Try to extract JSON array from the response
+    try:
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        content = content.strip()
+        messages = json.loads(content)
+        if isinstance(messages, list) and len(messages) > 0:
+            return messages
+        return [content]
+    except json.JSONDecodeError:
+        # If JSON parsing fails, use the content directly
+        return [content]
+
+
+def buffer_messages(period, texts):
+    # All candidates go through Seed-VC in one batched pass
+    buffered = 0
+    for text, audio_output in zip(texts, speak_batch_with_seed_vc(texts, api_key=api_key)):
+        if audio_output:
+            add_clip(period, audio_output, text)
+            print(f"Buffered clip for {period}: {text}")
+            buffered += 1
+    return buffered
+
+
+def produce_clips(period):
+    now = datetime.datetime.now()
+    texts = generate_messages(get_period_datetime(period, now))
+    random.shuffle(texts)
+    texts = texts[:MAX_CLIPS_PER_PERIOD - count_clips(period)]
+    if not buffer_messages(period, texts):
+        print(f"✗ Buffer refill failed for {period}")
+        return False
+    return True
+
+
+def refill_buffer():
+    for period in get_upcoming_periods(datetime.datetime.now()):
+        prune_clips(period)
+        while count_clips(period) < MAX_CLIPS_PER_PERIOD:
+            with pipeline_lock:
+                if not produce_clips(period):
+                    return
+
+
+def run_buffer_producer(stop_event):
+    while not stop_event.is_set():
         try:
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            messages = json.loads(content)
-            if isinstance(messages, list) and len(messages) > 0:
-                random_response = random.choice(messages)
-            else:
-                random_response = content
-        except json.JSONDecodeError:
-            # If JSON parsing fails, use the content directly
-            random_response = content
+            refill_buffer()
+        except Exception as e:
+            print(f"Error refilling clip buffer: {e}")
+        stop_event.wait(REFILL_CHECK_SECONDS)
 
-        audio_output = speak_with_seed_vc(random_response, api_key=api_key)
+
+def play_buffered_message(status):
+    clip = pop_clip(status)
+    if clip is None:
+        return False
+    audio_path, text = clip
+    print(f"Playing buffered clip: {text}")
+    try:
+        if play_audio(audio_path):
+            print("✓ Audio playback completed successfully")
+        else:
+            print("✗ Audio playback failed - check error messages above")
+    finally:
+        discard_clip(audio_path)
+    return True
+
+
+def generate_and_play_message():
+    try:
+        now = datetime.datetime.now()
+        status = get_status_from_hour(now.hour)
+
+        if play_buffered_message(status):
+            return
+
+        print(f"No buffered clip for {status}, generating now")
+        with pipeline_lock:
+            messages = generate_messages(now)
+            random_response = random.choice(messages)
+            # The other candidates are converted after playback so later triggers can use them
+            remaining = [message for message in messages if message != random_response]
+
+            stream = stream_speak_with_seed_vc(random_response, api_key=api_key)
+            if stream is not None:
+                sample_rate, pcm_blocks = stream
+                print("Streaming audio from Seed-VC server...")
+                if play_stream(pcm_blocks, sample_rate):
+                    print("✓ Audio playback completed successfully")
+                else:
+                    print("✗ Audio playback failed - check error messages above")
+                if remaining:
+                    buffer_messages(status, remaining[:MAX_CLIPS_PER_PERIOD])
+                return
+
+            audio_output = speak_with_seed_vc(random_response, api_key=api_key)
 
         if audio_output:
             print(f"Audio file generated: {audio_output}")
@@ -113,6 +224,9 @@ Output format:
                 print("✓ Audio playback completed successfully")
             else:
                 print("✗ Audio playback failed - check error messages above")
+            if remaining:
+                with pipeline_lock:
+                    buffer_messages(status, remaining[:MAX_CLIPS_PER_PERIOD])
         else:
             print("✗ Generation failed - no audio file was created")
 
@@ -129,6 +243,10 @@ def main():
     print(f"Random interval: {MIN_INTERVAL_HOURS}-{MAX_INTERVAL_HOURS} hours")
     print("Press Ctrl+C to stop")
     
+    stop_event = threading.Event()
+    producer = threading.Thread(target=run_buffer_producer, args=(stop_event,), daemon=True)
+    producer.start()
+    
     next_trigger_time = datetime.datetime.now() + datetime.timedelta(seconds=get_next_trigger_interval())
     print(f"Next trigger scheduled at: {next_trigger_time.strftime('%Y-%m-%d %H:%M:%S')}")
     
@@ -148,6 +266,7 @@ def main():
             time.sleep(60)
             
     except KeyboardInterrupt:
+        stop_event.set()
         print("\nScheduler stopped")
 
 
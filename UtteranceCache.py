@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+# Disk budget for cached TTS and converted clips; least recently used entries are evicted first.
+MAX_CACHE_MB = 500
+
+CACHE_KINDS = ("tts", "vc")
+
+_reference_digests = {}
+
+# Per cache directory: its entries least recently used first as path -> size, and their
+# total size. The directory is scanned once per process; after that stores and lookups
+# keep the index current, so eviction never has to stat the whole cache.
+_tracked = {}
+_tracked_lock = threading.Lock()
+
+
+def get_cache_dir(cache_dir: str = None) -> str:
+    if cache_dir is None:
+        cache_dir = os.getenv("UTTERANCE_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+    return cache_dir
+
+
+def normalize_text(text: str) -> str:
+    # Full-width/half-width variants and whitespace differences should hit the same entry
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def reference_digest(reference_audio: str) -> str:
+    stat = os.stat(reference_audio)
+    memo_key = (os.path.abspath(reference_audio), stat.st_size, stat.st_mtime_ns)
+    digest = _reference_digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(reference_audio, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _reference_digests[memo_key] = digest
+    return digest
+
+
+def _hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+
+def tts_key(text: str, tts_params: dict) -> str:
+    return _hash({"text": normalize_text(text), "tts": tts_params})
+
+
+def vc_key(text: str, reference_audio: str, tts_params: dict, vc_params: dict) -> str:
+    return _hash({
+        "text": normalize_text(text),
+        "tts": tts_params,
+        "reference": reference_digest(reference_audio),
+        "vc": vc_params,
+    })
+
+
+def _entry_path(kind: str, key: str, cache_dir: str = None) -> Path:
+    return Path(get_cache_dir(cache_dir)) / kind / f"{key}.wav"
+
+
+def _tracked_entries(cache_dir: str = None) -> dict:
+    cache_dir = os.path.abspath(get_cache_dir(cache_dir))
+    state = _tracked.get(cache_dir)
+    if state is None:
+        entries = []
+        for kind in CACHE_KINDS:
+            for entry_path in (Path(cache_dir) / kind).glob("*.wav"):
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, str(entry_path), stat.st_size))
+        entries.sort()
+        state = {
+            "entries": OrderedDict((path, size) for _, path, size in entries),
+            "total": sum(size for _, _, size in entries),
+        }
+        _tracked[cache_dir] = state
+    return state
+
+
+def lookup_utterance(kind: str, key: str, cache_dir: str = None) -> str:
+    entry_path = _entry_path(kind, key, cache_dir)
+    try:
+        # The mtime doubles as the last-used time for LRU eviction
+        os.utime(entry_path)
+    except FileNotFoundError:
+        return None
+    with _tracked_lock:
+        entries = _tracked_entries(cache_dir)["entries"]
+        if os.path.abspath(entry_path) in entries:
+            entries.move_to_end(os.path.abspath(entry_path))
+    return str(entry_path)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def store_utterance(kind: str, key: str, audio_path: str, cache_dir: str = None) -> str:
+    entry_path = _entry_path(kind, key, cache_dir)
+    entry_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        _link_or_copy(audio_path, tmp_path)
+        os.replace(tmp_path, entry_path)
+    except OSError as e:
+        print(f"Failed to cache {kind} clip: {e}")
+        try:
+            tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+        return None
+    try:
+        size = os.path.getsize(entry_path)
+    except FileNotFoundError:
+        return None
+    with _tracked_lock:
+        state = _tracked_entries(cache_dir)
+        # A re-stored key replaces its old entry and becomes the most recently used
+        state["total"] += size - state["entries"].pop(os.path.abspath(entry_path), 0)
+        state["entries"][os.path.abspath(entry_path)] = size
+    evict_utterances(cache_dir)
+    return str(entry_path)
+
+
+def copy_utterance(entry_path: str, output_path: str) -> str:
+    # Callers may move or delete what they get back, so they never receive the cache entry itself
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    _link_or_copy(entry_path, tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def evict_utterances(cache_dir: str = None, max_mb: float = None) -> int:
+    if max_mb is None:
+        max_mb = MAX_CACHE_MB
+    budget = max_mb * 1024 * 1024
+
+    with _tracked_lock:
+        state = _tracked_entries(cache_dir)
+        entries = state["entries"]
+        removed = 0
+        # The newest entry is always kept, store_utterance is about to return it
+        while len(entries) > 1 and state["total"] > budget:
+            entry_path, size = entries.popitem(last=False)
+            state["total"] -= size
+            try:
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+    return removed
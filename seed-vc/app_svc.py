@@ -1,12 +1,13 @@
 import os
-os.environ['HF_HUB_CACHE'] = './checkpoints/hf_cache'
+os.environ['HF_HUB_CACHE'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints', 'hf_cache')
 import gradio as gr
 import torch
 import torchaudio
 import librosa
-from modules.commons import build_model, load_checkpoint, recursive_munch, str2bool
-import yaml
-from hf_utils import load_custom_model_from_hf
+from modules.commons import str2bool
+from modules.model_registry import F0_DIT, dit_paths, get_registry
+from modules.content_windows import encode_windows
+from modules.resample import resample
 import numpy as np
 from pydub import AudioSegment
 import argparse
@@ -20,188 +21,14 @@ def load_models(args):
     print(f"Using device: {device}")
     print(f"Using fp16: {fp16}")
     # f0 conditioned model
-    if args.checkpoint is None or args.checkpoint == "":
-        dit_checkpoint_path, dit_config_path = load_custom_model_from_hf("Plachta/Seed-VC",
-                                                                         "DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema_v2.pth",
-                                                                         "config_dit_mel_seed_uvit_whisper_base_f0_44k.yml")
-    else:
+    if args.checkpoint is not None and args.checkpoint != "":
         print(f"Using custom checkpoint: {args.checkpoint}")
-        dit_checkpoint_path = args.checkpoint
-        dit_config_path = args.config
-    config = yaml.safe_load(open(dit_config_path, "r"))
-    model_params = recursive_munch(config["model_params"])
-    model_params.dit_type = 'DiT'
-    model = build_model(model_params, stage="DiT")
-    hop_length = config["preprocess_params"]["spect_params"]["hop_length"]
-    sr = config["preprocess_params"]["sr"]
-
-    # Load checkpoints
-    model, _, _, _ = load_checkpoint(
-        model,
-        None,
-        dit_checkpoint_path,
-        load_only_params=True,
-        ignore_modules=[],
-        is_distributed=False,
-    )
-    for key in model:
-        model[key].eval()
-        model[key].to(device)
-    model.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
-
-    # Load additional modules
-    from modules.campplus.DTDNN import CAMPPlus
-
-    campplus_ckpt_path = load_custom_model_from_hf(
-        "funasr/campplus", "campplus_cn_common.bin", config_filename=None
-    )
-    campplus_model = CAMPPlus(feat_dim=80, embedding_size=192)
-    campplus_model.load_state_dict(torch.load(campplus_ckpt_path, map_location="cpu"))
-    campplus_model.eval()
-    campplus_model.to(device)
-
-    vocoder_type = model_params.vocoder.type
-
-    if vocoder_type == 'bigvgan':
-        from modules.bigvgan import bigvgan
-        bigvgan_name = model_params.vocoder.name
-        bigvgan_model = bigvgan.BigVGAN.from_pretrained(bigvgan_name, use_cuda_kernel=False)
-        # remove weight norm in the model and set to eval mode
-        bigvgan_model.remove_weight_norm()
-        bigvgan_model = bigvgan_model.eval().to(device)
-        vocoder_fn = bigvgan_model
-    elif vocoder_type == 'hifigan':
-        from modules.hifigan.generator import HiFTGenerator
-        from modules.hifigan.f0_predictor import ConvRNNF0Predictor
-        hift_config = yaml.safe_load(open('configs/hifigan.yml', 'r'))
-        hift_gen = HiFTGenerator(**hift_config['hift'], f0_predictor=ConvRNNF0Predictor(**hift_config['f0_predictor']))
-        hift_path = load_custom_model_from_hf("FunAudioLLM/CosyVoice-300M", 'hift.pt', None)
-        hift_gen.load_state_dict(torch.load(hift_path, map_location='cpu'))
-        hift_gen.eval()
-        hift_gen.to(device)
-        vocoder_fn = hift_gen
-    elif vocoder_type == "vocos":
-        vocos_config = yaml.safe_load(open(model_params.vocoder.vocos.config, 'r'))
-        vocos_path = model_params.vocoder.vocos.path
-        vocos_model_params = recursive_munch(vocos_config['model_params'])
-        vocos = build_model(vocos_model_params, stage='mel_vocos')
-        vocos_checkpoint_path = vocos_path
-        vocos, _, _, _ = load_checkpoint(vocos, None, vocos_checkpoint_path,
-                                         load_only_params=True, ignore_modules=[], is_distributed=False)
-        _ = [vocos[key].eval().to(device) for key in vocos]
-        _ = [vocos[key].to(device) for key in vocos]
-        total_params = sum(sum(p.numel() for p in vocos[key].parameters() if p.requires_grad) for key in vocos.keys())
-        print(f"Vocoder model total parameters: {total_params / 1_000_000:.2f}M")
-        vocoder_fn = vocos.decoder
-    else:
-        raise ValueError(f"Unknown vocoder type: {vocoder_type}")
-
-    speech_tokenizer_type = model_params.speech_tokenizer.type
-    if speech_tokenizer_type == 'whisper':
-        # whisper
-        from transformers import AutoFeatureExtractor, WhisperModel
-        whisper_name = model_params.speech_tokenizer.name
-        whisper_model = WhisperModel.from_pretrained(whisper_name, torch_dtype=torch.float16).to(device)
-        del whisper_model.decoder
-        whisper_feature_extractor = AutoFeatureExtractor.from_pretrained(whisper_name)
-
-        def semantic_fn(waves_16k):
-            ori_inputs = whisper_feature_extractor([waves_16k.squeeze(0).cpu().numpy()],
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True)
-            ori_input_features = whisper_model._mask_input_features(
-                ori_inputs.input_features, attention_mask=ori_inputs.attention_mask).to(device)
-            with torch.no_grad():
-                ori_outputs = whisper_model.encoder(
-                    ori_input_features.to(whisper_model.encoder.dtype),
-                    head_mask=None,
-                    output_attentions=False,
-                    output_hidden_states=False,
-                    return_dict=True,
-                )
-            S_ori = ori_outputs.last_hidden_state.to(torch.float32)
-            S_ori = S_ori[:, :waves_16k.size(-1) // 320 + 1]
-            return S_ori
-    elif speech_tokenizer_type == 'cnhubert':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            HubertModel,
-        )
-        hubert_model_name = config['model_params']['speech_tokenizer']['name']
-        hubert_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(hubert_model_name)
-        hubert_model = HubertModel.from_pretrained(hubert_model_name)
-        hubert_model = hubert_model.to(device)
-        hubert_model = hubert_model.eval()
-        hubert_model = hubert_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = hubert_feature_extractor(ori_waves_16k_input_list,
-                                                  return_tensors="pt",
-                                                  return_attention_mask=True,
-                                                  padding=True,
-                                                  sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = hubert_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    elif speech_tokenizer_type == 'xlsr':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            Wav2Vec2Model,
-        )
-        model_name = config['model_params']['speech_tokenizer']['name']
-        output_layer = config['model_params']['speech_tokenizer']['output_layer']
-        wav2vec_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-        wav2vec_model = Wav2Vec2Model.from_pretrained(model_name)
-        wav2vec_model.encoder.layers = wav2vec_model.encoder.layers[:output_layer]
-        wav2vec_model = wav2vec_model.to(device)
-        wav2vec_model = wav2vec_model.eval()
-        wav2vec_model = wav2vec_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = wav2vec_feature_extractor(ori_waves_16k_input_list,
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True,
-                                                   padding=True,
-                                                   sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = wav2vec_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    else:
-        raise ValueError(f"Unknown speech tokenizer type: {speech_tokenizer_type}")
-    # Generate mel spectrograms
-    mel_fn_args = {
-        "n_fft": config['preprocess_params']['spect_params']['n_fft'],
-        "win_size": config['preprocess_params']['spect_params']['win_length'],
-        "hop_size": config['preprocess_params']['spect_params']['hop_length'],
-        "num_mels": config['preprocess_params']['spect_params']['n_mels'],
-        "sampling_rate": sr,
-        "fmin": config['preprocess_params']['spect_params'].get('fmin', 0),
-        "fmax": None if config['preprocess_params']['spect_params'].get('fmax', "None") == "None" else 8000,
-        "center": False
-    }
-    from modules.audio import mel_spectrogram
-
-    to_mel = lambda x: mel_spectrogram(x, **mel_fn_args)
-    # f0 extractor
-    from modules.rmvpe import RMVPE
-
-    model_path = load_custom_model_from_hf("lj1995/VoiceConversionWebUI", "rmvpe.pt", None)
-    rmvpe = RMVPE(model_path, is_half=False, device=device)
-    f0_fn = rmvpe.infer_from_audio
+    registry = get_registry(device)
+    dit_checkpoint_path, dit_config_path = dit_paths(F0_DIT, args.checkpoint, args.config, bundle=registry.bundle)
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, to_mel, mel_fn_args = registry.model_set(
+        dit_checkpoint_path, dit_config_path, f0_condition=True)
+    hop_length = mel_fn_args["hop_size"]
+    sr = mel_fn_args["sampling_rate"]
 
     return (
         model,
@@ -251,31 +78,12 @@ def voice_conversion(source, target, diffusion_steps, length_adjust, inference_c
     ref_audio = torch.tensor(ref_audio[:sr * 25]).unsqueeze(0).float().to(device)
 
     # Resample
-    ref_waves_16k = torchaudio.functional.resample(ref_audio, sr, 16000)
-    converted_waves_16k = torchaudio.functional.resample(source_audio, sr, 16000)
-    # if source audio less than 30 seconds, whisper can handle in one forward
-    if converted_waves_16k.size(-1) <= 16000 * 30:
-        S_alt = semantic_fn(converted_waves_16k)
-    else:
-        overlapping_time = 5  # 5 seconds
-        S_alt_list = []
-        buffer = None
-        traversed_time = 0
-        while traversed_time < converted_waves_16k.size(-1):
-            if buffer is None:  # first chunk
-                chunk = converted_waves_16k[:, traversed_time:traversed_time + 16000 * 30]
-            else:
-                chunk = torch.cat([buffer, converted_waves_16k[:, traversed_time:traversed_time + 16000 * (30 - overlapping_time)]], dim=-1)
-            S_alt = semantic_fn(chunk)
-            if traversed_time == 0:
-                S_alt_list.append(S_alt)
-            else:
-                S_alt_list.append(S_alt[:, 50 * overlapping_time:])
-            buffer = chunk[:, -16000 * overlapping_time:]
-            traversed_time += 30 * 16000 if traversed_time == 0 else chunk.size(-1) - 16000 * overlapping_time
-        S_alt = torch.cat(S_alt_list, dim=1)
+    ref_waves_16k = resample(ref_audio, sr, 16000)
+    converted_waves_16k = resample(source_audio, sr, 16000)
+    # 30 s windows with 5 s overlap, encoded in batches; audio up to 30 s is a single window
+    S_alt = encode_windows(semantic_fn, converted_waves_16k)
 
-    ori_waves_16k = torchaudio.functional.resample(ref_audio, sr, 16000)
+    ori_waves_16k = resample(ref_audio, sr, 16000)
     S_ori = semantic_fn(ori_waves_16k)
 
     mel = mel_fn(source_audio.to(device).float())
@@ -291,15 +99,8 @@ def voice_conversion(source, target, diffusion_steps, length_adjust, inference_c
     feat2 = feat2 - feat2.mean(dim=0, keepdim=True)
     style2 = campplus_model(feat2.unsqueeze(0))
 
-    F0_ori = f0_fn(ref_waves_16k[0], thred=0.03)
-    F0_alt = f0_fn(converted_waves_16k[0], thred=0.03)
-
-    if device.type == "mps":
-        F0_ori = torch.from_numpy(F0_ori).float().to(device)[None]
-        F0_alt = torch.from_numpy(F0_alt).float().to(device)[None]
-    else:
-        F0_ori = torch.from_numpy(F0_ori).to(device)[None]
-        F0_alt = torch.from_numpy(F0_alt).to(device)[None]
+    F0_ori = f0_fn(ref_waves_16k[0], thred=0.03, return_tensor=True).to(device)[None]
+    F0_alt = f0_fn(converted_waves_16k[0], thred=0.03, return_tensor=True).to(device)[None]
 
     voiced_F0_ori = F0_ori[F0_ori > 1]
     voiced_F0_alt = F0_alt[F0_alt > 1]
@@ -4,7 +4,7 @@ import numpy as np
 import random
 import os
 from torch.utils.data import DataLoader
-from modules.audio import mel_spectrogram
+from modules.audio import MelFrontend
 
 
 duration_setting = {
@@ -12,9 +12,6 @@ duration_setting = {
     "max": 30.0,
 }
 # assume single speaker
-def to_mel_fn(wave, mel_fn_args):
-    return mel_spectrogram(wave, **mel_fn_args)
-
 class FT_Dataset(torch.utils.data.Dataset):
     def __init__(
         self,
@@ -41,6 +38,7 @@ class FT_Dataset(torch.utils.data.Dataset):
             "fmax": None if spect_params['fmax'] == "None" else spect_params['fmax'],
             "center": False
         }
+        self.to_mel = MelFrontend(**self.mel_fn_args)
 
         assert len(self.data) != 0
         while len(self.data) < batch_size:
@@ -64,7 +62,7 @@ class FT_Dataset(torch.utils.data.Dataset):
             speech = librosa.resample(speech, orig_sr, self.sr)
 
         wave = torch.from_numpy(speech).float().unsqueeze(0)
-        mel = to_mel_fn(wave, self.mel_fn_args).squeeze(0)
+        mel = self.to_mel(wave).squeeze(0)
 
         return wave.squeeze(0), mel
 
@@ -1,12 +1,111 @@
+import hashlib
+import json
 import os
-from huggingface_hub import hf_hub_download
+from huggingface_hub import hf_hub_download, snapshot_download
+
+# Absolute, so checkpoints resolve the same way whatever the working directory is
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints")
+HF_CACHE_DIR = os.path.join(CHECKPOINT_DIR, "hf_cache")
+MANIFEST_PATH = os.environ.get("SEED_VC_MODEL_MANIFEST", os.path.join(CHECKPOINT_DIR, "model_manifest.json"))
+
+_manifest = None
+
+
+def is_offline():
+    return os.environ.get("SEED_VC_OFFLINE", "0") == "1" or os.environ.get("HF_HUB_OFFLINE", "0") == "1"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest():
+    """
+    Local model manifest: ``files`` maps ``repo_id/filename`` and ``snapshots`` maps a repo id
+    to absolute paths in the checkpoint cache, each with its sha256 and size.
+    """
+    global _manifest
+    if _manifest is None:
+        _manifest = {"files": {}, "snapshots": {}}
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH, "r") as f:
+                _manifest.update(json.load(f))
+    return _manifest
+
+
+def save_manifest():
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with open(MANIFEST_PATH + ".tmp", "w") as f:
+        json.dump(load_manifest(), f, indent=2, sort_keys=True)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+
+
+def file_entry(path):
+    path = os.path.realpath(path)
+    return {"path": path, "sha256": file_sha256(path), "size": os.path.getsize(path)}
+
+
+def entry_ok(entry, verify=False):
+    # Startup only compares sizes; the full hash check is tools/prefetch_models.py --verify
+    path = entry["path"]
+    if not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+        return False
+    return not verify or file_sha256(path) == entry["sha256"]
+
+
+def offline_error(name):
+    return FileNotFoundError(f"{name} is not in the model manifest {MANIFEST_PATH} and offline mode is on; "
+                             f"run tools/prefetch_models.py with network access first")
+
+
+def resolve_file(repo_id, filename):
+    """Return the absolute local path of ``filename`` in ``repo_id``, downloading it only if the manifest lacks it."""
+    key = f"{repo_id}/{filename}"
+    entry = load_manifest()["files"].get(key)
+    if entry is not None and entry_ok(entry):
+        return entry["path"]
+    if is_offline():
+        raise offline_error(key)
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = hf_hub_download(repo_id=repo_id, filename=filename, cache_dir=CHECKPOINT_DIR)
+    load_manifest()["files"][key] = file_entry(path)
+    save_manifest()
+    return load_manifest()["files"][key]["path"]
+
+
+def resolve_pretrained(repo_id, allow_patterns=None, download=False):
+    """
+    Return the local snapshot directory of a ``from_pretrained`` repo if the manifest has it.
+
+    Otherwise the repo id itself is returned for the library to resolve, unless offline
+    mode is on or ``download`` asks for the snapshot to be fetched and recorded.
+    """
+    entry = load_manifest()["snapshots"].get(repo_id)
+    if entry is not None and all(entry_ok(f) for f in entry["files"].values()):
+        return entry["path"]
+    if is_offline():
+        raise offline_error(repo_id)
+    if not download:
+        return repo_id
+    path = snapshot_download(repo_id=repo_id, cache_dir=HF_CACHE_DIR, allow_patterns=allow_patterns)
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            full_path = os.path.join(root, name)
+            files[os.path.relpath(full_path, path)] = file_entry(full_path)
+    load_manifest()["snapshots"][repo_id] = {"path": os.path.abspath(path), "files": files}
+    save_manifest()
+    return os.path.abspath(path)
 
 
 def load_custom_model_from_hf(repo_id, model_filename="pytorch_model.bin", config_filename=None):
-    os.makedirs("./checkpoints", exist_ok=True)
-    model_path = hf_hub_download(repo_id=repo_id, filename=model_filename, cache_dir="./checkpoints")
+    model_path = resolve_file(repo_id, model_filename)
     if config_filename is None:
         return model_path
-    config_path = hf_hub_download(repo_id=repo_id, filename=config_filename, cache_dir="./checkpoints")
+    config_path = resolve_file(repo_id, config_filename)
 
-    return model_path, config_path
\ No newline at end of file
+    return model_path, config_path
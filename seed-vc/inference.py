@@ -33,26 +33,30 @@ torch.backends.mps.is_built = lambda : False
 
 import numpy as np
 
-os.environ['HF_HUB_CACHE'] = './checkpoints/hf_cache'
+os.environ['HF_HUB_CACHE'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints', 'hf_cache')
 import shutil
 import warnings
 import argparse
+import json
 import torch
-import yaml
 
 warnings.simplefilter('ignore')
 
 # load packages
 import random
-
-from modules.commons import *
 import time
 
-import torchaudio
 import librosa
 from modules.commons import str2bool
 
-from hf_utils import load_custom_model_from_hf
+from modules.voice_profile import compute_profile, get_profile
+from modules.content_windows import encode_windows
+from modules.resample import resample
+from modules.model_registry import BASE_DIT, F0_DIT, dit_paths, get_registry
+from modules.quantization import QUANTIZABLE, DEFAULT_QUANTIZE
+from modules.precision import COMPONENTS, PRECISIONS, format_policy, parse_policy
+from modules.export import BACKENDS, apply_backend
+from modules.flow_matching import SOLVERS, SCHEDULES
 
 
 # Load model and configuration
@@ -65,211 +69,41 @@ else:
     device = torch.device("cpu")
 
 fp16 = False
-def load_models(args):
-    global fp16
-    fp16 = args.fp16
-    if not args.f0_condition:
-        if args.checkpoint is None:
-            dit_checkpoint_path, dit_config_path = load_custom_model_from_hf("Plachta/Seed-VC",
-                                                                            "DiT_seed_v2_uvit_whisper_small_wavenet_bigvgan_pruned.pth",
-                                                                            "config_dit_mel_seed_uvit_whisper_small_wavenet.yml")
-        else:
-            dit_checkpoint_path = args.checkpoint
-            dit_config_path = args.config
-        f0_fn = None
-    else:
-        if args.checkpoint is None:
-            dit_checkpoint_path, dit_config_path = load_custom_model_from_hf("Plachta/Seed-VC",
-                                                                             "DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema_v2.pth",
-                                                                             "config_dit_mel_seed_uvit_whisper_base_f0_44k.yml")
-        else:
-            dit_checkpoint_path = args.checkpoint
-            dit_config_path = args.config
-        # f0 extractor
-        from modules.rmvpe import RMVPE
-
-        model_path = load_custom_model_from_hf("lj1995/VoiceConversionWebUI", "rmvpe.pt", None)
-        f0_extractor = RMVPE(model_path, is_half=False, device=device)
-        f0_fn = f0_extractor.infer_from_audio
-
-    config = yaml.safe_load(open(dit_config_path, "r"))
-    model_params = recursive_munch(config["model_params"])
-    model_params.dit_type = 'DiT'
-    model = build_model(model_params, stage="DiT")
-    hop_length = config["preprocess_params"]["spect_params"]["hop_length"]
-    sr = config["preprocess_params"]["sr"]
-
-    # Load checkpoints
-    model, _, _, _ = load_checkpoint(
-        model,
-        None,
-        dit_checkpoint_path,
-        load_only_params=True,
-        ignore_modules=[],
-        is_distributed=False,
-    )
-    for key in model:
-        model[key].eval()
-        model[key].to(device)
-    model.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
-
-    # Load additional modules
-    from modules.campplus.DTDNN import CAMPPlus
-
-    campplus_ckpt_path = load_custom_model_from_hf(
-        "funasr/campplus", "campplus_cn_common.bin", config_filename=None
-    )
-    campplus_model = CAMPPlus(feat_dim=80, embedding_size=192)
-    campplus_model.load_state_dict(torch.load(campplus_ckpt_path, map_location="cpu"))
-    campplus_model.eval()
-    campplus_model.to(device)
-
-    vocoder_type = model_params.vocoder.type
-
-    if vocoder_type == 'bigvgan':
-        from modules.bigvgan import bigvgan
-        bigvgan_name = model_params.vocoder.name
-        bigvgan_model = bigvgan.BigVGAN.from_pretrained(bigvgan_name, use_cuda_kernel=False)
-        # remove weight norm in the model and set to eval mode
-        bigvgan_model.remove_weight_norm()
-        bigvgan_model = bigvgan_model.eval().to(device)
-        vocoder_fn = bigvgan_model
-    elif vocoder_type == 'hifigan':
-        from modules.hifigan.generator import HiFTGenerator
-        from modules.hifigan.f0_predictor import ConvRNNF0Predictor
-        hift_config = yaml.safe_load(open('configs/hifigan.yml', 'r'))
-        hift_gen = HiFTGenerator(**hift_config['hift'], f0_predictor=ConvRNNF0Predictor(**hift_config['f0_predictor']))
-        hift_path = load_custom_model_from_hf("FunAudioLLM/CosyVoice-300M", 'hift.pt', None)
-        hift_gen.load_state_dict(torch.load(hift_path, map_location='cpu'))
-        hift_gen.eval()
-        hift_gen.to(device)
-        vocoder_fn = hift_gen
-    elif vocoder_type == "vocos":
-        vocos_config = yaml.safe_load(open(model_params.vocoder.vocos.config, 'r'))
-        vocos_path = model_params.vocoder.vocos.path
-        vocos_model_params = recursive_munch(vocos_config['model_params'])
-        vocos = build_model(vocos_model_params, stage='mel_vocos')
-        vocos_checkpoint_path = vocos_path
-        vocos, _, _, _ = load_checkpoint(vocos, None, vocos_checkpoint_path,
-                                         load_only_params=True, ignore_modules=[], is_distributed=False)
-        _ = [vocos[key].eval().to(device) for key in vocos]
-        _ = [vocos[key].to(device) for key in vocos]
-        total_params = sum(sum(p.numel() for p in vocos[key].parameters() if p.requires_grad) for key in vocos.keys())
-        print(f"Vocoder model total parameters: {total_params / 1_000_000:.2f}M")
-        vocoder_fn = vocos.decoder
-    else:
-        raise ValueError(f"Unknown vocoder type: {vocoder_type}")
-
-    speech_tokenizer_type = model_params.speech_tokenizer.type
-    if speech_tokenizer_type == 'whisper':
-        # whisper
-        from transformers import AutoFeatureExtractor, WhisperModel
-        whisper_name = model_params.speech_tokenizer.name
-        whisper_model = WhisperModel.from_pretrained(whisper_name, torch_dtype=torch.float16).to(device)
-        del whisper_model.decoder
-        whisper_feature_extractor = AutoFeatureExtractor.from_pretrained(whisper_name)
-
-        def semantic_fn(waves_16k):
-            ori_inputs = whisper_feature_extractor([waves_16k.squeeze(0).cpu().numpy()],
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True)
-            ori_input_features = whisper_model._mask_input_features(
-                ori_inputs.input_features, attention_mask=ori_inputs.attention_mask).to(device)
-            with torch.no_grad():
-                ori_outputs = whisper_model.encoder(
-                    ori_input_features.to(whisper_model.encoder.dtype),
-                    head_mask=None,
-                    output_attentions=False,
-                    output_hidden_states=False,
-                    return_dict=True,
-                )
-            S_ori = ori_outputs.last_hidden_state.to(torch.float32)
-            S_ori = S_ori[:, :waves_16k.size(-1) // 320 + 1]
-            return S_ori
-    elif speech_tokenizer_type == 'cnhubert':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            HubertModel,
-        )
-        hubert_model_name = config['model_params']['speech_tokenizer']['name']
-        hubert_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(hubert_model_name)
-        hubert_model = HubertModel.from_pretrained(hubert_model_name)
-        hubert_model = hubert_model.to(device)
-        hubert_model = hubert_model.eval()
-        hubert_model = hubert_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = hubert_feature_extractor(ori_waves_16k_input_list,
-                                                  return_tensors="pt",
-                                                  return_attention_mask=True,
-                                                  padding=True,
-                                                  sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = hubert_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    elif speech_tokenizer_type == 'xlsr':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            Wav2Vec2Model,
-        )
-        model_name = config['model_params']['speech_tokenizer']['name']
-        output_layer = config['model_params']['speech_tokenizer']['output_layer']
-        wav2vec_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-        wav2vec_model = Wav2Vec2Model.from_pretrained(model_name)
-        wav2vec_model.encoder.layers = wav2vec_model.encoder.layers[:output_layer]
-        wav2vec_model = wav2vec_model.to(device)
-        wav2vec_model = wav2vec_model.eval()
-        wav2vec_model = wav2vec_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = wav2vec_feature_extractor(ori_waves_16k_input_list,
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True,
-                                                   padding=True,
-                                                   sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = wav2vec_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    else:
-        raise ValueError(f"Unknown speech tokenizer type: {speech_tokenizer_type}")
-    # Generate mel spectrograms
-    mel_fn_args = {
-        "n_fft": config['preprocess_params']['spect_params']['n_fft'],
-        "win_size": config['preprocess_params']['spect_params']['win_length'],
-        "hop_size": config['preprocess_params']['spect_params']['hop_length'],
-        "num_mels": config['preprocess_params']['spect_params']['n_mels'],
-        "sampling_rate": sr,
-        "fmin": config['preprocess_params']['spect_params'].get('fmin', 0),
-        "fmax": None if config['preprocess_params']['spect_params'].get('fmax', "None") == "None" else 8000,
-        "center": False
-    }
-    from modules.audio import mel_spectrogram
+# Autocast dtype of the DiT, from the registry's precision policy
+dit_dtype = torch.float32
 
-    to_mel = lambda x: mel_spectrogram(x, **mel_fn_args)
-
-    return (
-        model,
-        semantic_fn,
-        f0_fn,
-        vocoder_fn,
-        campplus_model,
-        to_mel,
-        mel_fn_args,
-    )
+# Prefix of the JSON line main() prints with the output path(s)
+RESULT_PREFIX = "SEED_VC_RESULT "
+def load_models(args):
+    global fp16, dit_dtype
+    registry = get_registry(device, getattr(args, "bundle", None), get_quantize(args),
+                            getattr(args, "whisper_trim", None), get_precision(args))
+    dit_dtype = registry.dtype("dit")
+    fp16 = dit_dtype == torch.float16
+    dit_checkpoint_path, dit_config_path = dit_paths(F0_DIT if args.f0_condition else BASE_DIT,
+                                                     args.checkpoint, args.config, registry.bundle)
+    model_set = registry.model_set(dit_checkpoint_path, dit_config_path, f0_condition=args.f0_condition)
+    backend = getattr(args, "backend", "torch")
+    if backend != "torch":
+        # estimator steps, length regulator and vocoder run as exported graphs on the CPU runtime
+        model_set = apply_backend(model_set, backend, args.export_dir, dit_checkpoint_path)
+    return model_set
+
+def get_precision(args):
+    precision = getattr(args, "precision", None)
+    if precision is None and not args.fp16:
+        return None
+    precision = parse_policy(precision or os.environ.get("SEED_VC_PRECISION", ""))
+    if args.fp16:
+        # --fp16 is the older spelling of dit=fp16
+        precision.setdefault("dit", "fp16")
+    return precision
+
+def get_quantize(args):
+    quantize = getattr(args, "quantize", None)
+    if quantize is not None and len(quantize) == 0:
+        return DEFAULT_QUANTIZE
+    return quantize
 
 def adjust_f0_semitones(f0_sequence, n_semitones):
     factor = 2 ** (n_semitones / 12)
@@ -284,81 +118,64 @@ def crossfade(chunk1, chunk2, overlap):
         chunk2[:overlap] = chunk2[:overlap] * fade_in + chunk1[-overlap:] * fade_out
     return chunk2
 
+def get_sampler_kwargs(args):
+    """Solver options forwarded to ``cfm.inference``."""
+    return {"solver": args.solver, "schedule": args.schedule, "velocity_tol": args.velocity_tol,
+            "cfg_interval": tuple(args.cfg_interval), "cfg_reuse": args.cfg_reuse}
+
+def get_reference_profile(model_set, args):
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = model_set
+    sr = mel_fn_args['sampling_rate']
+
+    def compute():
+        ref_audio = librosa.load(args.target, sr=sr)[0]
+        ref_audio = torch.tensor(ref_audio[:sr * 25]).unsqueeze(0).float().to(device)
+        return compute_profile(ref_audio, sr, semantic_fn, campplus_model, mel_fn, model.length_regulator,
+                               f0_fn=f0_fn if args.f0_condition else None)
+
+    if args.profile is None:
+        return compute()
+    fingerprint = {
+        "checkpoint": args.checkpoint,
+        "config": args.config,
+        "f0_condition": bool(args.f0_condition),
+        "mel_fn_args": mel_fn_args,
+        "max_reference_seconds": 25,
+    }
+    registry = get_registry(device)
+    # per-component precision (int8 included) changes content features, style and prompt condition
+    fingerprint["precision"] = format_policy(registry.precision)
+    if registry.whisper_trim:
+        # trimmed content features differ from full-window ones; untrimmed keys stay as they were
+        fingerprint["whisper_trim"] = True
+    return get_profile(args.profile, args.target, fingerprint, compute, device)
+
 @torch.no_grad()
-def main(args):
-    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = load_models(args)
+def prepare_source(model_set, args, profile):
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = model_set
     sr = mel_fn_args['sampling_rate']
     f0_condition = args.f0_condition
     auto_f0_adjust = args.auto_f0_adjust
     pitch_shift = args.semi_tone_shift
-
-    source = args.source
-    target_name = args.target
-    diffusion_steps = args.diffusion_steps
     length_adjust = args.length_adjust
-    inference_cfg_rate = args.inference_cfg_rate
-    source_audio = librosa.load(source, sr=sr)[0]
-    ref_audio = librosa.load(target_name, sr=sr)[0]
+    F0_ori = profile["F0_ori"]
 
+    source_audio = librosa.load(args.source, sr=sr)[0]
     sr = 22050 if not f0_condition else 44100
-    hop_length = 256 if not f0_condition else 512
-    max_context_window = sr // hop_length * 30
-    overlap_frame_len = 16
-    overlap_wave_len = overlap_frame_len * hop_length
 
     # Process audio
     source_audio = torch.tensor(source_audio).unsqueeze(0).float().to(device)
-    ref_audio = torch.tensor(ref_audio[:sr * 25]).unsqueeze(0).float().to(device)
 
-    time_vc_start = time.time()
     # Resample
-    converted_waves_16k = torchaudio.functional.resample(source_audio, sr, 16000)
-    # if source audio less than 30 seconds, whisper can handle in one forward
-    if converted_waves_16k.size(-1) <= 16000 * 30:
-        S_alt = semantic_fn(converted_waves_16k)
-    else:
-        overlapping_time = 5  # 5 seconds
-        S_alt_list = []
-        buffer = None
-        traversed_time = 0
-        while traversed_time < converted_waves_16k.size(-1):
-            if buffer is None:  # first chunk
-                chunk = converted_waves_16k[:, traversed_time:traversed_time + 16000 * 30]
-            else:
-                chunk = torch.cat(
-                    [buffer, converted_waves_16k[:, traversed_time:traversed_time + 16000 * (30 - overlapping_time)]],
-                    dim=-1)
-            S_alt = semantic_fn(chunk)
-            if traversed_time == 0:
-                S_alt_list.append(S_alt)
-            else:
-                S_alt_list.append(S_alt[:, 50 * overlapping_time:])
-            buffer = chunk[:, -16000 * overlapping_time:]
-            traversed_time += 30 * 16000 if traversed_time == 0 else chunk.size(-1) - 16000 * overlapping_time
-        S_alt = torch.cat(S_alt_list, dim=1)
-
-    ori_waves_16k = torchaudio.functional.resample(ref_audio, sr, 16000)
-    S_ori = semantic_fn(ori_waves_16k)
-
-    mel = mel_fn(source_audio.to(device).float())
-    mel2 = mel_fn(ref_audio.to(device).float())
-
-    target_lengths = torch.LongTensor([int(mel.size(2) * length_adjust)]).to(mel.device)
-    target2_lengths = torch.LongTensor([mel2.size(2)]).to(mel2.device)
-
-    feat2 = torchaudio.compliance.kaldi.fbank(ori_waves_16k,
-                                              num_mel_bins=80,
-                                              dither=0,
-                                              sample_frequency=16000)
-    feat2 = feat2 - feat2.mean(dim=0, keepdim=True)
-    style2 = campplus_model(feat2.unsqueeze(0))
+    converted_waves_16k = resample(source_audio, sr, 16000)
+    # 30 s windows with 5 s overlap, encoded in batches; audio up to 30 s is a single window
+    S_alt = encode_windows(semantic_fn, converted_waves_16k, getattr(args, "content_batch_size", 8))
 
-    if f0_condition:
-        F0_ori = f0_fn(ori_waves_16k[0], thred=0.03)
-        F0_alt = f0_fn(converted_waves_16k[0], thred=0.03)
+    # only the length of the source mel is needed
+    target_lengths = torch.LongTensor([int(mel_fn.num_frames(source_audio.size(-1)) * length_adjust)]).to(device)
 
-        F0_ori = torch.from_numpy(F0_ori).to(device)[None]
-        F0_alt = torch.from_numpy(F0_alt).to(device)[None]
+    if f0_condition:
+        F0_alt = f0_fn(converted_waves_16k[0], thred=0.03, return_tensor=True).to(device)[None]
 
         voiced_F0_ori = F0_ori[F0_ori > 1]
         voiced_F0_alt = F0_alt[F0_alt > 1]
@@ -377,7 +194,6 @@ def main(args):
         if pitch_shift != 0:
             shifted_f0_alt[F0_alt > 1] = adjust_f0_semitones(shifted_f0_alt[F0_alt > 1], pitch_shift)
     else:
-        F0_ori = None
         F0_alt = None
         shifted_f0_alt = None
 
@@ -385,78 +201,259 @@ def main(args):
     cond, _, codes, commitment_loss, codebook_loss = model.length_regulator(S_alt, ylens=target_lengths,
                                                                                        n_quantizers=3,
                                                                                        f0=shifted_f0_alt)
-    prompt_condition, _, codes, commitment_loss, codebook_loss = model.length_regulator(S_ori,
-                                                                                       ylens=target2_lengths,
-                                                                                       n_quantizers=3,
-                                                                                       f0=F0_ori)
+    return cond
+
+def get_chunk_starts(total_frames, max_source_window, overlap_frame_len):
+    """Start frame of every source chunk; consecutive chunks overlap by ``overlap_frame_len`` frames."""
+    starts = [0]
+    while starts[-1] + max_source_window < total_frames:
+        starts.append(starts[-1] + max_source_window - overlap_frame_len)
+    return starts
+
+def stitch_wave_chunks(chunks, overlap_wave_len):
+    """Crossfade consecutive ``(wave, is_last_chunk)`` chunks and yield each block once it is final."""
+    previous_chunk = None
+    for vc_wave, is_last_chunk in chunks:
+        if previous_chunk is None:
+            output_wave = vc_wave if is_last_chunk else vc_wave[:-overlap_wave_len]
+        elif is_last_chunk:
+            output_wave = crossfade(previous_chunk, vc_wave, overlap_wave_len)
+        else:
+            output_wave = crossfade(previous_chunk, vc_wave[:-overlap_wave_len], overlap_wave_len)
+        yield output_wave
+        if is_last_chunk:
+            break
+        previous_chunk = vc_wave[-overlap_wave_len:]
 
-    max_source_window = max_context_window - mel2.size(2)
+@torch.no_grad()
+def generate_wave_chunks(model_set, args, cond, profile, max_source_window=None):
+    """
+    Yield converted audio blocks as each source chunk finishes; the blocks are already crossfaded.
+
+    Chunks only depend on the shared prompt and their own slice of ``cond``, so with
+    ``args.chunk_batch_size`` > 1 that many chunks go through one batched diffusion call.
+    """
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = model_set
+    mel2 = profile["mel2"]
+    style2 = profile["style2"]
+    prompt_condition = profile["prompt_condition"]
+
+    sr = 22050 if not args.f0_condition else 44100
+    hop_length = 256 if not args.f0_condition else 512
+    max_context_window = sr // hop_length * 30
+    overlap_frame_len = 16
+    overlap_wave_len = overlap_frame_len * hop_length
+
+    if max_source_window is None:
+        max_source_window = max_context_window - mel2.size(2)
+    else:
+        max_source_window = max(min(max_source_window, max_context_window - mel2.size(2)), overlap_frame_len + 1)
     # split source condition (cond) into chunks
-    processed_frames = 0
-    generated_wave_chunks = []
+    starts = get_chunk_starts(cond.size(1), max_source_window, overlap_frame_len)
+    chunk_batch_size = max(1, getattr(args, "chunk_batch_size", 1))
+
+    def convert_chunks():
+        for first in range(0, len(starts), chunk_batch_size):
+            batch_starts = starts[first:first + chunk_batch_size]
+            chunk_conds = [cond[:, start:start + max_source_window] for start in batch_starts]
+            with torch.autocast(device_type=device.type, dtype=dit_dtype):
+                # Voice Conversion
+                vc_targets = model.cfm.inference_chunks(prompt_condition, chunk_conds, mel2, style2,
+                                                        args.diffusion_steps,
+                                                        inference_cfg_rate=args.inference_cfg_rate,
+                                                        **get_sampler_kwargs(args))
+            for i, vc_target in enumerate(vc_targets):
+                vc_wave = vocoder_fn(vc_target.float()).squeeze()
+                yield vc_wave.cpu().numpy(), first + i == len(starts) - 1
+
     # generate chunk by chunk and stream the output
-    while processed_frames < cond.size(1):
-        chunk_cond = cond[:, processed_frames:processed_frames + max_source_window]
-        is_last_chunk = processed_frames + max_source_window >= cond.size(1)
-        cat_condition = torch.cat([prompt_condition, chunk_cond], dim=1)
-        with torch.autocast(device_type=device.type, dtype=torch.float16 if fp16 else torch.float32):
-            # Voice Conversion
-            vc_target = model.cfm.inference(cat_condition,
-                                                       torch.LongTensor([cat_condition.size(1)]).to(mel2.device),
-                                                       mel2, style2, None, diffusion_steps,
-                                                       inference_cfg_rate=inference_cfg_rate)
-            vc_target = vc_target[:, :, mel2.size(-1):]
-        vc_wave = vocoder_fn(vc_target.float()).squeeze()
-        vc_wave = vc_wave[None, :]
-        if processed_frames == 0:
-            if is_last_chunk:
-                output_wave = vc_wave[0].cpu().numpy()
-                generated_wave_chunks.append(output_wave)
-                break
-            output_wave = vc_wave[0, :-overlap_wave_len].cpu().numpy()
-            generated_wave_chunks.append(output_wave)
-            previous_chunk = vc_wave[0, -overlap_wave_len:]
-            processed_frames += vc_target.size(2) - overlap_frame_len
-        elif is_last_chunk:
-            output_wave = crossfade(previous_chunk.cpu().numpy(), vc_wave[0].cpu().numpy(), overlap_wave_len)
-            generated_wave_chunks.append(output_wave)
-            processed_frames += vc_target.size(2) - overlap_frame_len
-            break
-        else:
-            output_wave = crossfade(previous_chunk.cpu().numpy(), vc_wave[0, :-overlap_wave_len].cpu().numpy(),
-                                    overlap_wave_len)
-            generated_wave_chunks.append(output_wave)
-            previous_chunk = vc_wave[0, -overlap_wave_len:]
-            processed_frames += vc_target.size(2) - overlap_frame_len
+    yield from stitch_wave_chunks(convert_chunks(), overlap_wave_len)
+
+def trim_prompt(profile, max_frames):
+    """Profile whose prompt (mel2 and prompt_condition) is cut to its first ``max_frames`` frames."""
+    return dict(profile, mel2=profile["mel2"][:, :, :max_frames],
+                prompt_condition=profile["prompt_condition"][:, :max_frames])
+
+def stream_voice(model_set, args, chunk_seconds=None, prompt_seconds=None):
+    """
+    Convert ``args.source`` and yield audio blocks as soon as each chunk is vocoded.
+
+    With ``chunk_seconds`` set, the source is split into windows of at most that length so
+    the first block is ready after converting a single short window.
+
+    Every chunk attends over the whole reference prompt as well as itself, so with a long
+    reference (up to 25 s) a 3 s chunk costs several times its own length. ``prompt_seconds``
+    keeps only that much of the prompt: the first block arrives sooner and the total work
+    no longer grows with the number of chunks times the reference length, at some cost in
+    speaker similarity. The style embedding still comes from the whole reference.
+    """
+    sr = model_set[-1]["sampling_rate"]
+    hop_length = model_set[-1]["hop_size"]
+    profile = get_reference_profile(model_set, args)
+    if prompt_seconds is not None:
+        profile = trim_prompt(profile, int(prompt_seconds * sr / hop_length))
+    cond = prepare_source(model_set, args, profile)
+    max_source_window = None if chunk_seconds is None else int(chunk_seconds * sr / hop_length)
+    yield from generate_wave_chunks(model_set, args, cond, profile, max_source_window)
+
+@torch.no_grad()
+def convert_voice(model_set, args):
+    sr = 22050 if not args.f0_condition else 44100
+    time_vc_start = time.time()
+    profile = get_reference_profile(model_set, args)
+    cond = prepare_source(model_set, args, profile)
+    generated_wave_chunks = list(generate_wave_chunks(model_set, args, cond, profile))
     vc_wave = torch.tensor(np.concatenate(generated_wave_chunks))[None, :].float()
     time_vc_end = time.time()
     print(f"RTF: {(time_vc_end - time_vc_start) / vc_wave.size(-1) * sr}")
 
+    output_path = args.output_file or get_output_path(args, args.source)
+    write_output(output_path, vc_wave.cpu().numpy().T, sr)
+    return output_path
+
+def get_output_path(args, source):
     source_name = os.path.basename(source).split(".")[0]
-    target_name = os.path.basename(target_name).split(".")[0]
-    os.makedirs(args.output, exist_ok=True)
+    target_name = os.path.basename(args.target).split(".")[0]
+    return os.path.join(args.output, f"vc_{source_name}_{target_name}_{args.length_adjust}_{args.diffusion_steps}_{args.inference_cfg_rate}.wav")
+
+def write_output(output_path, wave, sr):
+    """Write through a temporary file so a reader never sees a partially written wav."""
     import soundfile as sf
-    sf.write(
-        os.path.join(args.output, f"vc_{source_name}_{target_name}_{length_adjust}_{diffusion_steps}_{inference_cfg_rate}.wav"),
-        vc_wave.cpu().numpy().T,
-        sr
-    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    sf.write(tmp_path, wave, sr, format="WAV")
+    os.replace(tmp_path, output_path)
+
+def group_by_length(lengths, max_batch_size, max_length_ratio=1.5):
+    """Group item indices so that each group can share one padded batch without wasting much compute."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    groups = []
+    for i in order:
+        if groups and len(groups[-1]) < max_batch_size and lengths[i] <= lengths[groups[-1][0]] * max_length_ratio:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
 
+@torch.no_grad()
+def convert_batch(model_set, args, sources):
+    """
+    Convert several sources against the same reference with one model load.
+    Sources that fit into a single context window share batched ``cfm.inference`` calls;
+    longer ones fall back to the chunked path. Returns output paths in the order of ``sources``.
+    """
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = model_set
+    sr = 22050 if not args.f0_condition else 44100
+    hop_length = 256 if not args.f0_condition else 512
+    max_context_window = sr // hop_length * 30
 
+    if args.output_files and len(args.output_files) != len(sources):
+        raise ValueError(f"Got {len(args.output_files)} output files for {len(sources)} sources")
 
-if __name__ == "__main__":
+    time_vc_start = time.time()
+    profile = get_reference_profile(model_set, args)
+    mel2 = profile["mel2"]
+    style2 = profile["style2"]
+    prompt_condition = profile["prompt_condition"]
+    max_source_window = max_context_window - mel2.size(2)
+
+    conds = []
+    for source in sources:
+        source_args = argparse.Namespace(**vars(args))
+        source_args.source = source
+        conds.append(prepare_source(model_set, source_args, profile))
+
+    waves = [None] * len(sources)
+    batchable = [i for i, cond in enumerate(conds) if cond.size(1) <= max_source_window]
+    for i in range(len(sources)):
+        if i not in batchable:
+            waves[i] = np.concatenate(list(generate_wave_chunks(model_set, args, conds[i], profile)))
+
+    lengths = [conds[i].size(1) for i in batchable]
+    model.cfm.estimator.setup_caches(max_batch_size=2 * args.batch_size, max_seq_length=8192)
+    for group in group_by_length(lengths, args.batch_size):
+        items = [batchable[j] for j in group]
+        with torch.autocast(device_type=device.type, dtype=dit_dtype):
+            vc_targets = model.cfm.inference_chunks(prompt_condition, [conds[i] for i in items], mel2, style2,
+                                                    args.diffusion_steps,
+                                                    inference_cfg_rate=args.inference_cfg_rate,
+                                                    **get_sampler_kwargs(args))
+        for i, vc_target in zip(items, vc_targets):
+            waves[i] = vocoder_fn(vc_target.float()).squeeze().cpu().numpy()
+
+    output_paths = args.output_files or [get_output_path(args, source) for source in sources]
+    for output_path, wave in zip(output_paths, waves):
+        write_output(output_path, wave, sr)
+    time_vc_end = time.time()
+    print(f"RTF: {(time_vc_end - time_vc_start) / sum(len(wave) for wave in waves) * sr}")
+    return output_paths
+
+def main(args):
+    model_set = load_models(args)
+    if args.batch_sources:
+        result = {"outputs": [os.path.abspath(path) for path in convert_batch(model_set, args, args.batch_sources)]}
+    else:
+        result = {"output": os.path.abspath(convert_voice(model_set, args))}
+    # Last line of stdout, for callers that run this script as a subprocess
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def get_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--source", type=str, default="./examples/source/source_s1.wav")
     parser.add_argument("--target", type=str, default="./examples/reference/s1p1.wav")
     parser.add_argument("--output", type=str, default="./reconstructed")
+    parser.add_argument("--output-file", type=str, default=None,
+                        help="Exact path of the converted wav; overrides the name derived from --output")
     parser.add_argument("--diffusion-steps", type=int, default=30)
     parser.add_argument("--length-adjust", type=float, default=1.0)
     parser.add_argument("--inference-cfg-rate", type=float, default=0.7)
+    parser.add_argument("--solver", type=str, default="euler", choices=SOLVERS,
+                        help="ODE solver; midpoint and heun cost two estimator calls per step")
+    parser.add_argument("--schedule", type=str, default="uniform", choices=SCHEDULES,
+                        help="Timestep spacing; cosine takes smaller steps near the noise end")
+    parser.add_argument("--velocity-tol", type=float, default=None,
+                        help="Finish early once the velocity changes by less than this relative amount per step")
+    parser.add_argument("--cfg-interval", type=float, nargs=2, default=[0.0, 1.0], metavar=("START", "END"),
+                        help="Apply classifier-free guidance only for START <= t <= END")
+    parser.add_argument("--cfg-reuse", type=int, default=1,
+                        help="Estimator evaluations sharing one unconditional prediction (1 = no reuse)")
     parser.add_argument("--f0-condition", type=str2bool, default=False)
     parser.add_argument("--auto-f0-adjust", type=str2bool, default=False)
     parser.add_argument("--semi-tone-shift", type=int, default=0)
     parser.add_argument("--checkpoint", type=str, help="Path to the checkpoint file", default=None)
     parser.add_argument("--config", type=str, help="Path to the config file", default=None)
-    parser.add_argument("--fp16", type=str2bool, default=False)
-    args = parser.parse_args()
+    parser.add_argument("--bundle", type=str, default=None,
+                        help="Model bundle directory from tools/build_bundle.py (default: $SEED_VC_BUNDLE)")
+    parser.add_argument("--quantize", type=str, nargs="*", default=None, choices=QUANTIZABLE,
+                        help="Int8 quantization on CPU for the given components; "
+                             f"bare --quantize means {' '.join(DEFAULT_QUANTIZE)} (default: $SEED_VC_QUANTIZE)")
+    parser.add_argument("--whisper-trim", type=str2bool, default=None,
+                        help="Run Whisper over the audio length only, not a padded 30 s window "
+                             "(default: $SEED_VC_WHISPER_TRIM)")
+    parser.add_argument("--backend", type=str, default="torch", choices=BACKENDS,
+                        help="Run the DiT, length regulator and vocoder as graphs from tools/export_models.py")
+    parser.add_argument("--export-dir", type=str, default="./checkpoints/export",
+                        help="Export directory for --backend onnx / torchscript")
+    parser.add_argument("--fp16", type=str2bool, default=False, help="Same as --precision dit=fp16")
+    parser.add_argument("--precision", type=str, nargs="+", default=None, metavar="COMPONENT=PRECISION",
+                        help=f"Per-component precision ({', '.join(PRECISIONS)}) of {', '.join(COMPONENTS)}; "
+                             "unset components keep the device default (default: $SEED_VC_PRECISION)")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Directory for cached reference voice profiles (mel2, style2, prompt condition, F0)")
+    parser.add_argument("--batch-sources", type=str, nargs="+", default=None,
+                        help="Convert several source files with one model load; overrides --source")
+    parser.add_argument("--batch-size", type=int, default=5,
+                        help="Maximum number of sources sharing one batched diffusion call")
+    parser.add_argument("--output-files", type=str, nargs="+", default=None,
+                        help="Exact output paths for --batch-sources, in the same order")
+    parser.add_argument("--content-batch-size", type=int, default=8,
+                        help="Most 30 s windows of a long source sharing one content encoder call")
+    parser.add_argument("--chunk-batch-size", type=int, default=1,
+                        help="Independent chunks of a long source converted together in one batched diffusion call")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
     main(args)
@@ -1,9 +1,13 @@
+import math
+
 import numpy as np
 import torch
 import torch.utils.data
 from librosa.filters import mel as librosa_mel_fn
 from scipy.io.wavfile import read
 
+from modules.commons import sequence_mask
+
 MAX_WAV_VALUE = 32768.0
 
 
@@ -38,45 +42,82 @@ def spectral_de_normalize_torch(magnitudes):
     return output
 
 
-mel_basis = {}
-hann_window = {}
+class MelFrontend(torch.nn.Module):
+    """
+    Log-mel spectrogram that owns its mel basis and window.
 
+    The basis and window are built once and follow the module across ``.to(device)``;
+    a call on another device moves them there once. Frames match ``mel_spectrogram``:
+    the signal is reflect-padded by ``(n_fft - hop_size) // 2`` on both sides and
+    framed without centering.
 
-def mel_spectrogram(y, n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax, center=False):
-    if torch.min(y) < -1.0:
-        print("min value is ", torch.min(y))
-    if torch.max(y) > 1.0:
-        print("max value is ", torch.max(y))
+    Besides single signals it takes a zero-padded batch with per-item lengths.
+    """
 
-    global mel_basis, hann_window  # pylint: disable=global-statement
-    if f"{str(sampling_rate)}_{str(fmax)}_{str(y.device)}" not in mel_basis:
+    def __init__(self, n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax, center=False):
+        super().__init__()
+        self.n_fft = n_fft
+        self.hop_size = hop_size
+        self.win_size = win_size
+        self.center = center
+        self.pad = (n_fft - hop_size) // 2
         mel = librosa_mel_fn(sr=sampling_rate, n_fft=n_fft, n_mels=num_mels, fmin=fmin, fmax=fmax)
-        mel_basis[str(sampling_rate) + "_" + str(fmax) + "_" + str(y.device)] = torch.from_numpy(mel).float().to(y.device)
-        hann_window[str(sampling_rate) + "_" + str(y.device)] = torch.hann_window(win_size).to(y.device)
-
-    y = torch.nn.functional.pad(
-        y.unsqueeze(1), (int((n_fft - hop_size) / 2), int((n_fft - hop_size) / 2)), mode="reflect"
-    )
-    y = y.squeeze(1)
-
-    spec = torch.view_as_real(
-        torch.stft(
+        self.register_buffer("mel_basis", torch.from_numpy(mel).float(), persistent=False)
+        self.register_buffer("window", torch.hann_window(win_size), persistent=False)
+
+    def num_frames(self, num_samples):
+        """Number of mel frames of a signal ``num_samples`` long (an int or a LongTensor)."""
+        return (num_samples + 2 * self.pad - self.n_fft) // self.hop_size + 1
+
+    def spectrogram(self, y):
+        """Log-mel frames of (B, samples) audio that is already padded."""
+        if self.mel_basis.device != y.device:
+            self.to(y.device)
+        spec = torch.stft(
             y,
-            n_fft,
-            hop_length=hop_size,
-            win_length=win_size,
-            window=hann_window[str(sampling_rate) + "_" + str(y.device)],
-            center=center,
+            self.n_fft,
+            hop_length=self.hop_size,
+            win_length=self.win_size,
+            window=self.window,
+            center=self.center,
             pad_mode="reflect",
             normalized=False,
             onesided=True,
             return_complex=True,
         )
-    )
-
-    spec = torch.sqrt(spec.pow(2).sum(-1) + (1e-9))
+        spec = torch.view_as_real(spec).pow(2).sum(-1).add(1e-9).sqrt()
+        return spectral_normalize_torch(torch.matmul(self.mel_basis, spec))
+
+    def forward(self, y, lengths=None, pad_value=None):
+        """
+        Args:
+            y: (B, samples) audio in [-1, 1]
+            lengths: Optional (B,) valid samples per item of a zero-padded batch. Each item
+                is then reflect-padded at its own end, so its frames match a separate call.
+            pad_value: Value of the frames past each item's length, defaults to the log floor
+
+        Returns:
+            (B, num_mels, frames) log-mel, and with ``lengths`` also the (B,) frame counts
+        """
+        if lengths is None:
+            return self.spectrogram(torch.nn.functional.pad(y, (self.pad, self.pad), mode="reflect"))
+        lengths = lengths.to(y.device)
+        # reflect every item around its own last sample: gather indices -pad .. samples + pad
+        index = torch.arange(-self.pad, y.size(-1) + self.pad, device=y.device)[None]
+        last = (lengths - 1)[:, None]
+        index = torch.where(index > last, 2 * last - index, index.abs()).clamp(0, y.size(-1) - 1)
+        mel = self.spectrogram(torch.gather(y, 1, index))
+        mel_lengths = self.num_frames(lengths)
+        mask = sequence_mask(mel_lengths, mel.size(-1))
+        return mel.masked_fill(~mask[:, None], math.log(1e-5) if pad_value is None else pad_value), mel_lengths
+
+
+_frontends = {}
 
-    spec = torch.matmul(mel_basis[str(sampling_rate) + "_" + str(fmax) + "_" + str(y.device)], spec)
-    spec = spectral_normalize_torch(spec)
 
-    return spec
+def mel_spectrogram(y, n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax, center=False):
+    key = (n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax, center, str(y.device))
+    if key not in _frontends:
+        _frontends[key] = MelFrontend(n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax,
+                                      center).to(y.device)
+    return _frontends[key](y)
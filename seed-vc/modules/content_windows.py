@@ -0,0 +1,60 @@
+"""
+Content encoding of audio longer than the encoder's 30 s window.
+
+Long 16 kHz audio is cut into 30 s windows that start every 25 s, so consecutive
+windows overlap by 5 s. Every window after the first drops its first 5 s of
+frames, and the rest are concatenated. All windows are planned up front and
+encoded in batches: windows of equal length share one encoder call, so no
+padding enters and the result matches encoding the windows one by one.
+"""
+from collections import defaultdict
+
+import torch
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+OVERLAP_SECONDS = 5
+FRAMES_PER_SECOND = 50
+
+
+def plan_windows(num_samples, window_seconds=WINDOW_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Return the ``(start, end, skip_frames)`` of every window covering ``num_samples`` of 16 kHz audio.
+
+    ``skip_frames`` content frames at the start of a window repeat the previous window's tail.
+    """
+    window, hop = window_seconds * SAMPLE_RATE, (window_seconds - overlap_seconds) * SAMPLE_RATE
+    windows = [(0, min(window, num_samples), 0)]
+    start = hop
+    while start + overlap_seconds * SAMPLE_RATE < num_samples:
+        windows.append((start, min(start + window, num_samples), FRAMES_PER_SECOND * overlap_seconds))
+        start += hop
+    return windows
+
+
+def encode_windows(encode_fn, waves_16k, max_batch_size=8):
+    """
+    Encode (1, samples) 16 kHz audio of any length window by window.
+
+    Args:
+        encode_fn: Content encoder taking a (B, samples) batch of equal-length windows and
+            returning features with frames on dim 1, e.g. ``semantic_fn``
+        waves_16k: (1, samples) audio
+        max_batch_size: Most windows sharing one ``encode_fn`` call
+
+    Returns:
+        The window features stitched along dim 1
+    """
+    windows = plan_windows(waves_16k.size(-1))
+    by_length = defaultdict(list)
+    for i, (start, end, _) in enumerate(windows):
+        by_length[end - start].append(i)
+    features = [None] * len(windows)
+    for indices in by_length.values():
+        for i in range(0, len(indices), max_batch_size):
+            group = indices[i:i + max_batch_size]
+            batch = torch.cat([waves_16k[:, windows[k][0]:windows[k][1]] for k in group], dim=0)
+            outputs = encode_fn(batch)
+            for j, k in enumerate(group):
+                features[k] = outputs[j:j + 1]
+    return torch.cat([feature[:, skip:] for feature, (_, _, skip) in zip(features, windows)], dim=1)
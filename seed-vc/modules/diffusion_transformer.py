@@ -117,15 +117,23 @@ class Transformer(nn.Module):
                 context: Optional[Tensor] = None,
                 context_input_pos: Optional[Tensor] = None,
                 cross_attention_mask: Optional[Tensor] = None,
+                causal: bool = True,
                 ) -> Tensor:
+        """
+        input_pos=None means positions 0..T-1, for which the RoPE table and causal mask are sliced
+        as views instead of gathered. With causal=False and no mask, attention is unmasked.
+        """
         assert self.freqs_cis is not None, "Caches must be initialized first"
-        if mask is None: # in case of non-causal model
-            if not self.training and self.use_kv_cache:
+        seqlen = x.size(1)
+        if mask is None and causal:
+            if input_pos is None:
+                mask = self.causal_mask[None, None, :seqlen, :seqlen]
+            elif not self.training and self.use_kv_cache:
                 mask = self.causal_mask[None, None, input_pos]
             else:
                 mask = self.causal_mask[None, None, input_pos]
                 mask = mask[..., input_pos]
-        freqs_cis = self.freqs_cis[input_pos]
+        freqs_cis = self.freqs_cis[:seqlen] if input_pos is None else self.freqs_cis[input_pos]
         if context is not None:
             context_freqs_cis = self.freqs_cis[context_input_pos]
         else:
@@ -250,8 +258,9 @@ class Attention(nn.Module):
         if self.kv_cache is not None:
             k, v = self.kv_cache.update(input_pos, k, v)
 
-        k = k.repeat_interleave(self.n_head // self.n_local_heads, dim=1)
-        v = v.repeat_interleave(self.n_head // self.n_local_heads, dim=1)
+        if self.n_head != self.n_local_heads:
+            k = k.repeat_interleave(self.n_head // self.n_local_heads, dim=1)
+            v = v.repeat_interleave(self.n_head // self.n_local_heads, dim=1)
         y = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, dropout_p=0.0)
 
         y = y.transpose(1, 2).contiguous().view(bsz, seqlen, self.head_dim * self.n_head)
@@ -481,33 +490,79 @@ class DiT(torch.nn.Module):
         if self.style_as_token:
             self.style_in = nn.Linear(args.style_encoder.dim, args.DiT.hidden_dim)
 
+        # (batch, length) -> (x_lens, x_mask, attention mask), see get_masks
+        self.mask_cache = {}
+
     def setup_caches(self, max_batch_size, max_seq_length):
         self.transformer.setup_caches(max_batch_size, max_seq_length, use_kv_cache=False)
-    def forward(self, x, prompt_x, x_lens, t, style, cond, mask_content=False):
+
+    def get_masks(self, x_lens, length):
+        """
+        Padding mask (B, 1, length) and attention mask for one batch.
+
+        The attention mask is a (B, 1, 1, length) key-padding mask that broadcasts over queries, or
+        None when nothing is padded. During inference the result is cached per (batch, length) and
+        reused as long as the same x_lens tensor comes back, i.e. for every step of one sampling run.
+        While tracing for export the attention mask is always built, so the graph holds for any x_lens.
+        """
+        tracing = torch.jit.is_tracing()
+        key = (x_lens.size(0), length)
+        cached = self.mask_cache.get(key)
+        if cached is not None and cached[0] is x_lens and not self.training and not tracing:
+            return cached[1], cached[2]
+        lens = x_lens + self.style_as_token + self.time_as_token
+        x_mask = sequence_mask(lens, max_length=length).to(x_lens.device).unsqueeze(1)
+        if self.is_causal or (not tracing and bool((lens >= length).all())):
+            attention_mask = None
+        else:
+            attention_mask = x_mask[:, None, :, :]
+        if not self.training and not tracing:
+            if len(self.mask_cache) >= 16:
+                self.mask_cache.clear()
+            self.mask_cache[key] = (x_lens, x_mask, attention_mask)
+        return x_mask, attention_mask
+    def merge_condition(self, prompt_x, style, cond, mask_content=False):
+        """
+        Step-invariant part of cond_x_merge_linear.
+
+        The merge projection acts on [x, prompt_x, cond_projection(cond), style]; everything but x
+        stays fixed while sampling, so its contribution (plus the bias) can be computed once per
+        inference and passed to forward as merged_cond. Style is projected once per item and
+        broadcast over time instead of being repeated T times.
+
+        Returns:
+            (B, T, hidden_dim) tensor to add to the projection of x
+        """
+        weight, bias = self.cond_x_merge_linear.weight, self.cond_x_merge_linear.bias
+        if mask_content:
+            return bias.expand(prompt_x.size(0), prompt_x.size(2), -1)
+        # cond_in_module = self.cond_embedder if self.content_type == 'discrete' else self.cond_projection
+        cond_in_module = self.cond_projection
+        cond = cond_in_module(cond)
+        split = 2 * self.in_channels + cond.size(-1)
+        merged = F.linear(torch.cat([prompt_x.transpose(1, 2), cond], dim=-1), weight[:, self.in_channels:split], bias)
+        if self.transformer_style_condition and not self.style_as_token:
+            merged = merged + F.linear(style, weight[:, split:])[:, None, :]
+        return merged
+
+    def forward(self, x, prompt_x, x_lens, t, style, cond, mask_content=False, merged_cond=None):
         class_dropout = False
         if self.training and torch.rand(1) < self.class_dropout_prob:
             class_dropout = True
         if not self.training and mask_content:
             class_dropout = True
-        # cond_in_module = self.cond_embedder if self.content_type == 'discrete' else self.cond_projection
-        cond_in_module = self.cond_projection
 
         B, _, T = x.size()
 
 
         t1 = self.t_embedder(t)  # (N, D)
 
-        cond = cond_in_module(cond)
+        if merged_cond is None or class_dropout:
+            merged_cond = self.merge_condition(prompt_x, style, cond, mask_content=class_dropout)
 
         x = x.transpose(1, 2)
-        prompt_x = prompt_x.transpose(1, 2)
 
-        x_in = torch.cat([x, prompt_x, cond], dim=-1)
-        if self.transformer_style_condition and not self.style_as_token:
-            x_in = torch.cat([x_in, style[:, None, :].repeat(1, T, 1)], dim=-1)
-        if class_dropout:
-            x_in[..., self.in_channels:] = x_in[..., self.in_channels:] * 0
-        x_in = self.cond_x_merge_linear(x_in)  # (N, T, D)
+        x_in = F.linear(x, self.cond_x_merge_linear.weight[:, :self.in_channels]) + merged_cond  # (N, T, D)
 
         if self.style_as_token:
             style = self.style_in(style)
@@ -515,10 +570,9 @@ class DiT(torch.nn.Module):
             x_in = torch.cat([style.unsqueeze(1), x_in], dim=1)
         if self.time_as_token:
             x_in = torch.cat([t1.unsqueeze(1), x_in], dim=1)
-        x_mask = sequence_mask(x_lens + self.style_as_token + self.time_as_token).to(x.device).unsqueeze(1)
-        input_pos = self.input_pos[:x_in.size(1)]  # (T,)
-        x_mask_expanded = x_mask[:, None, :].repeat(1, 1, x_in.size(1), 1) if not self.is_causal else None
-        x_res = self.transformer(x_in, t1.unsqueeze(1), input_pos, x_mask_expanded)
+        x_mask, attention_mask = self.get_masks(x_lens, x_in.size(1))
+        # positions are 0..T-1, so the transformer slices its RoPE table instead of gathering it
+        x_res = self.transformer(x_in, t1.unsqueeze(1), None, attention_mask, causal=self.is_causal)
         x_res = x_res[:, 1:] if self.time_as_token else x_res
         x_res = x_res[:, 1:] if self.style_as_token else x_res
         if self.long_skip_connection:
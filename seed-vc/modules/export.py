@@ -0,0 +1,227 @@
+"""
+Export of the v1 inference graphs (DiT estimator, InterpolateRegulator, BigVGAN) to ONNX or
+TorchScript, and drop-in replacements that run the exported graphs on CPU in place of the
+PyTorch modules. See tools/export_models.py.
+"""
+import copy
+import json
+import os
+
+import torch
+import torch.nn as nn
+from munch import Munch
+
+from modules.length_regulator import f0_to_coarse
+
+EXPORT_FORMATS = ("onnx", "torchscript")
+BACKENDS = ("torch",) + EXPORT_FORMATS
+MANIFEST_NAME = "export.json"
+SUFFIXES = {"onnx": ".onnx", "torchscript": ".pt"}
+
+
+class EstimatorStep(nn.Module):
+    """
+    One DiT evaluation with the step-invariant condition already merged.
+
+    ``DiT.merge_condition`` runs once per sampling run and stays in PyTorch; only the per-step
+    part is exported. Batch and sequence length are dynamic.
+    """
+
+    def __init__(self, dit):
+        super().__init__()
+        self.dit = dit
+
+    def forward(self, x, x_lens, t, style, merged_cond):
+        return self.dit(x, None, x_lens, t, style, None, merged_cond=merged_cond)
+
+
+def nearest_resize(x, length):
+    """
+    Resize (B, T, D) to (B, length, D), picking the same frames as F.interpolate(mode='nearest').
+
+    Written as a gather so ``length`` can be a tensor that stays dynamic in exported graphs.
+    """
+    scale = x.size(1) / length.float()
+    index = (torch.arange(length, device=x.device).float() * scale).floor().long()
+    return x.index_select(1, index.clamp(max=x.size(1) - 1))
+
+
+class RegulatorStep(nn.Module):
+    """Inference path of an InterpolateRegulator with continuous input and no VQ; returns the masked output."""
+
+    def __init__(self, regulator):
+        super().__init__()
+        if regulator.is_discrete or not regulator.interpolate or hasattr(regulator, "vq"):
+            raise ValueError("Only continuous, interpolating length regulators without VQ can be exported")
+        self.regulator = regulator
+
+    def forward(self, x, ylens, f0=None):
+        regulator = self.regulator
+        length = ylens.max()
+        mask = (torch.arange(length, device=x.device)[None, :] < ylens[:, None]).unsqueeze(-1)
+        x = nearest_resize(regulator.content_in_proj(x), length)
+        if regulator.f0_condition:
+            if f0 is None:
+                x = x + regulator.f0_mask
+            else:
+                quantized_f0 = f0_to_coarse(f0, regulator.n_f0_bins).clamp(0, regulator.n_f0_bins - 1)
+                x = x + nearest_resize(regulator.f0_embedding(quantized_f0), length)
+        out = regulator.model(x.transpose(1, 2)).transpose(1, 2)
+        return out * mask
+
+
+def export_graph(module, inputs, dynamic_axes, path, export_format, opset=17):
+    """
+    Export ``module`` called with the example ``inputs`` (an ordered name -> tensor dict).
+
+    ``dynamic_axes`` maps input names and "output" to their dynamic dimensions, as in torch.onnx.export.
+    TorchScript graphs are traced and frozen; their dynamic shapes come from the traced size ops.
+    """
+    module = module.eval()
+    args = tuple(inputs.values())
+    with torch.no_grad():
+        if export_format == "onnx":
+            torch.onnx.export(module, args, path, input_names=list(inputs), output_names=["output"],
+                              dynamic_axes=dynamic_axes, opset_version=opset)
+        elif export_format == "torchscript":
+            traced = torch.jit.trace(module, args, check_trace=False)
+            torch.jit.save(torch.jit.freeze(traced), path)
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+
+
+def as_cpu(tensor):
+    # graphs are exported in fp32
+    tensor = tensor.detach().cpu()
+    return tensor.float() if tensor.is_floating_point() else tensor
+
+
+class OnnxGraph:
+    """An exported ONNX graph run by onnxruntime on CPU, called with named torch tensors."""
+
+    def __init__(self, path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime") from e
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        # Inputs the graph does not use (e.g. style without style tokens) are dropped by the exporter
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        feeds = {name: as_cpu(inputs[name]).contiguous().numpy() for name in self.input_names}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+class TorchScriptGraph:
+    """An exported TorchScript graph, optimized for CPU inference, called with named torch tensors."""
+
+    def __init__(self, path, input_names):
+        self.module = torch.jit.optimize_for_inference(torch.jit.load(path, map_location="cpu"))
+        self.input_names = input_names
+
+    @torch.no_grad()
+    def __call__(self, **inputs):
+        return self.module(*[as_cpu(inputs[name]) for name in self.input_names])
+
+
+class ExportedEstimator(nn.Module):
+    """Stands in for ``model.cfm.estimator``: condition merging in PyTorch, every step in the exported graph."""
+
+    def __init__(self, dit, graph):
+        super().__init__()
+        self.dit = dit
+        self.graph = graph
+
+    def setup_caches(self, max_batch_size, max_seq_length):
+        self.dit.setup_caches(max_batch_size, max_seq_length)
+
+    def merge_condition(self, prompt_x, style, cond, mask_content=False):
+        return self.dit.merge_condition(prompt_x, style, cond, mask_content=mask_content)
+
+    def forward(self, x, prompt_x, x_lens, t, style, cond, mask_content=False, merged_cond=None):
+        if merged_cond is None or mask_content:
+            merged_cond = self.merge_condition(prompt_x, style, cond, mask_content=mask_content)
+        return self.graph(x=x, x_lens=x_lens, t=t, style=style, merged_cond=merged_cond).to(x.device)
+
+
+class ExportedRegulator(nn.Module):
+    """Stands in for ``model.length_regulator`` with the InterpolateRegulator return signature."""
+
+    def __init__(self, regulator, graph):
+        super().__init__()
+        self.regulator = regulator
+        self.graph = graph
+
+    def forward(self, x, ylens=None, n_quantizers=None, f0=None):
+        if self.regulator.f0_condition and f0 is None:
+            # the graph is exported with an F0 input; the f0_mask path stays in PyTorch
+            return self.regulator(x, ylens, n_quantizers, f0)
+        inputs = {"x": x, "ylens": ylens}
+        if f0 is not None:
+            inputs["f0"] = f0
+        return self.graph(**inputs).to(x.device), ylens, None, None, None
+
+
+class ExportedVocoder:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __call__(self, mel):
+        return self.graph(mel=mel).to(mel.device)
+
+
+def load_manifest(export_dir):
+    with open(os.path.join(export_dir, MANIFEST_NAME), "r") as f:
+        return json.load(f)
+
+
+def save_manifest(export_dir, manifest):
+    path = os.path.join(export_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_graph(export_dir, entry, export_format, num_threads=None):
+    path = os.path.join(export_dir, entry["file"])
+    if export_format == "onnx":
+        return OnnxGraph(path, num_threads)
+    return TorchScriptGraph(path, entry["inputs"])
+
+
+def apply_backend(model_set, backend, export_dir, checkpoint_path=None, num_threads=None):
+    """
+    Return ``model_set`` with the estimator, length regulator and vocoder replaced by the graphs
+    exported to ``export_dir``; components missing from the export stay in PyTorch.
+
+    The registry's modules are left untouched, so other callers keep the PyTorch path.
+    """
+    if backend == "torch":
+        return model_set
+    manifest = load_manifest(export_dir)
+    if manifest["format"] != backend:
+        raise ValueError(f"{export_dir} holds a {manifest['format']} export, not {backend}")
+    if checkpoint_path is not None and manifest["checkpoint"] != os.path.basename(checkpoint_path):
+        raise ValueError(f"{export_dir} was exported from {manifest['checkpoint']}, "
+                         f"not {os.path.basename(checkpoint_path)}")
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, to_mel, mel_fn_args = model_set
+    components = manifest["components"]
+    model = Munch(model)
+    if "dit" in components:
+        # a shallow copy of the CFM with its own module dict, so only this model set sees the swap
+        cfm = copy.copy(model.cfm)
+        cfm._modules = dict(cfm._modules)
+        cfm.estimator = ExportedEstimator(model.cfm.estimator,
+                                          load_graph(export_dir, components["dit"], backend, num_threads))
+        model.cfm = cfm
+    if "length_regulator" in components:
+        model.length_regulator = ExportedRegulator(
+            model.length_regulator, load_graph(export_dir, components["length_regulator"], backend, num_threads))
+    if "vocoder" in components:
+        vocoder_fn = ExportedVocoder(load_graph(export_dir, components["vocoder"], backend, num_threads))
+    return model, semantic_fn, f0_fn, vocoder_fn, campplus_model, to_mel, mel_fn_args
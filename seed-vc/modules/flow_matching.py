@@ -4,10 +4,23 @@ import torch
 import torch.nn.functional as F
 
 from modules.diffusion_transformer import DiT
-from modules.commons import sequence_mask
 
 from tqdm import tqdm
 
+SOLVERS = ("euler", "midpoint", "heun", "multistep")
+SCHEDULES = ("uniform", "cosine")
+
+
+def get_t_span(n_timesteps, schedule="uniform", device=None):
+    t_span = torch.linspace(0, 1, n_timesteps + 1, device=device)
+    if schedule == "cosine":
+        # smaller steps near the noise end, where the velocity changes fastest
+        t_span = t_span + (-1) * (torch.cos(torch.pi / 2 * t_span) - 1 + t_span)
+    elif schedule != "uniform":
+        raise ValueError(f"Unknown schedule {schedule}, expected one of {SCHEDULES}")
+    return t_span
+
+
 class BASECFM(torch.nn.Module, ABC):
     def __init__(
         self,
@@ -28,7 +41,8 @@ class BASECFM(torch.nn.Module, ABC):
             self.zero_prompt_speech_token = False
 
     @torch.inference_mode()
-    def inference(self, mu, x_lens, prompt, style, f0, n_timesteps, temperature=1.0, inference_cfg_rate=0.5):
+    def inference(self, mu, x_lens, prompt, style, f0, n_timesteps, temperature=1.0, inference_cfg_rate=0.5,
+                  solver="euler", schedule="uniform", velocity_tol=None, cfg_interval=(0.0, 1.0), cfg_reuse=1):
         """Forward diffusion
 
         Args:
@@ -41,6 +55,14 @@ class BASECFM(torch.nn.Module, ABC):
             spks (torch.Tensor, optional): speaker ids. Defaults to None.
                 shape: (batch_size, spk_emb_dim)
             cond: Not used but kept for future purposes
+            solver (str, optional): one of SOLVERS. Defaults to "euler".
+            schedule (str, optional): one of SCHEDULES. Defaults to "uniform".
+            velocity_tol (float, optional): stop early once the velocity changes by less than this
+                relative amount between steps. Defaults to None (always run every step).
+            cfg_interval (tuple, optional): (start, end) range of t where guidance is applied; the
+                unconditional branch is not run outside it. Defaults to (0.0, 1.0).
+            cfg_reuse (int, optional): number of consecutive estimator evaluations sharing one
+                unconditional prediction. Defaults to 1 (recomputed every time).
 
         Returns:
             sample: generated mel-spectrogram
@@ -48,13 +70,46 @@ class BASECFM(torch.nn.Module, ABC):
         """
         B, T = mu.size(0), mu.size(1)
         z = torch.randn([B, self.in_channels, T], device=mu.device) * temperature
-        t_span = torch.linspace(0, 1, n_timesteps + 1, device=mu.device)
-        # t_span = t_span + (-1) * (torch.cos(torch.pi / 2 * t_span) - 1 + t_span)
-        return self.solve_euler(z, x_lens, prompt, mu, style, f0, t_span, inference_cfg_rate)
+        t_span = get_t_span(n_timesteps, schedule, device=mu.device)
+        return self.solve_euler(z, x_lens, prompt, mu, style, f0, t_span, inference_cfg_rate,
+                                solver=solver, velocity_tol=velocity_tol,
+                                cfg_interval=cfg_interval, cfg_reuse=cfg_reuse)
+
+    @torch.inference_mode()
+    def inference_chunks(self, prompt_mu, chunk_mus, prompt, style, n_timesteps, **kwargs):
+        """Convert independent chunks that share one prompt in a single batched call
+
+        Each chunk is prefixed with prompt_mu and padded to the longest one; x_lens masks the padding.
+
+        Args:
+            prompt_mu (torch.Tensor): encoder output of the prompt
+                shape: (1, prompt_len, n_feats)
+            chunk_mus (list): encoder outputs of the chunks, each of shape (1, chunk_len, n_feats)
+            prompt (torch.Tensor): prompt mel-spectrogram
+                shape: (1, n_feats, prompt_len)
+            style (torch.Tensor): speaker embedding
+                shape: (1, spk_emb_dim)
+            n_timesteps (int): number of diffusion steps
+            **kwargs: forwarded to inference (inference_cfg_rate, solver, ...)
 
-    def solve_euler(self, x, x_lens, prompt, mu, style, f0, t_span, inference_cfg_rate=0.5):
+        Returns:
+            list of generated mel-spectrograms without the prompt part, each of shape (1, n_feats, chunk_len)
+        """
+        prompt_len = prompt_mu.size(1)
+        lengths = [chunk_mu.size(1) for chunk_mu in chunk_mus]
+        max_len = max(lengths)
+        mu = torch.cat([
+            torch.cat([prompt_mu, F.pad(chunk_mu, (0, 0, 0, max_len - chunk_mu.size(1)))], dim=1)
+            for chunk_mu in chunk_mus
+        ], dim=0)
+        x_lens = torch.LongTensor([prompt_len + length for length in lengths]).to(mu.device)
+        mel = self.inference(mu, x_lens, prompt, style, None, n_timesteps, **kwargs)
+        return [mel[i:i + 1, :, prompt_len:prompt_len + length] for i, length in enumerate(lengths)]
+
+    def solve_euler(self, x, x_lens, prompt, mu, style, f0, t_span, inference_cfg_rate=0.5,
+                    solver="euler", velocity_tol=None, cfg_interval=(0.0, 1.0), cfg_reuse=1):
         """
-        Fixed euler solver for ODEs.
+        Fixed-step solver for ODEs, Euler unless another of SOLVERS is given.
         Args:
             x (torch.Tensor): random noise
             t_span (torch.Tensor): n_timesteps interpolated
@@ -66,12 +121,16 @@ class BASECFM(torch.nn.Module, ABC):
             spks (torch.Tensor, optional): speaker ids. Defaults to None.
                 shape: (batch_size, spk_emb_dim)
             cond: Not used but kept for future purposes
+            solver (str): "euler" and "multistep" cost one estimator call per step,
+                "midpoint" and "heun" cost two
+            velocity_tol (float, optional): relative velocity change below which the remaining
+                interval is covered by a single Euler step
+            cfg_interval (tuple): (start, end) range of t where guidance is applied
+            cfg_reuse (int): consecutive estimator evaluations sharing one unconditional prediction
         """
-        t, _, _ = t_span[0], t_span[-1], t_span[1] - t_span[0]
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver}, expected one of {SOLVERS}")
 
-        # I am storing this because I can later plot it by putting a debugger here and saving it to a file
-        # Or in future might add like a return_all_steps flag
-        sol = []
         # apply prompt
         prompt_len = prompt.size(-1)
         prompt_x = torch.zeros_like(x)
@@ -79,37 +138,92 @@ class BASECFM(torch.nn.Module, ABC):
         x[..., :prompt_len] = 0
         if self.zero_prompt_speech_token:
             mu[..., :prompt_len] = 0
-        for step in tqdm(range(1, len(t_span))):
-            dt = t_span[step] - t_span[step - 1]
-            if inference_cfg_rate > 0:
-                # Stack original and CFG (null) inputs for batched processing
-                stacked_prompt_x = torch.cat([prompt_x, torch.zeros_like(prompt_x)], dim=0)
-                stacked_style = torch.cat([style, torch.zeros_like(style)], dim=0)
-                stacked_mu = torch.cat([mu, torch.zeros_like(mu)], dim=0)
-                stacked_x = torch.cat([x, x], dim=0)
-                stacked_t = torch.cat([t.unsqueeze(0), t.unsqueeze(0)], dim=0)
-
-                # Perform a single forward pass for both original and CFG inputs
+        # prompt and style may be shared by every item of a batch
+        B = x.size(0)
+        style = style.expand(B, -1)
+
+        # Conditioning never changes across steps, so the batched inputs are built once; x and t
+        # are copied into preallocated buffers on every evaluation
+        t_buffer = torch.empty(B, device=x.device, dtype=t_span.dtype)
+        x_buffer = torch.empty_like(x)
+        # The estimator's projection of prompt, content and style is step-invariant as well
+        merged_cond = self.estimator.merge_condition(prompt_x, style, mu)
+        if inference_cfg_rate > 0:
+            stacked_x_lens = torch.cat([x_lens, x_lens], dim=0)
+            stacked_prompt_x = torch.cat([prompt_x, torch.zeros_like(prompt_x)], dim=0)
+            stacked_style = torch.cat([style, torch.zeros_like(style)], dim=0)
+            stacked_mu = torch.cat([mu, torch.zeros_like(mu)], dim=0)
+            stacked_merged_cond = self.estimator.merge_condition(stacked_prompt_x, stacked_style, stacked_mu)
+            stacked_x = torch.empty((2 * B,) + tuple(x.shape[1:]), device=x.device, dtype=x.dtype)
+            stacked_t = torch.empty(2 * B, device=x.device, dtype=t_span.dtype)
+
+        # Unconditional prediction and the number of evaluations it has been used for
+        cfg_cache = {"dphi_dt": None, "uses": 0}
+
+        def velocity(x, t):
+            use_cfg = inference_cfg_rate > 0 and cfg_interval[0] <= t <= cfg_interval[1]
+            if use_cfg and cfg_cache["dphi_dt"] is not None and cfg_cache["uses"] < cfg_reuse:
+                # Only the conditional branch runs; the unconditional one changes slowly between steps
+                dphi_dt = self.estimator(x, prompt_x, x_lens, t_buffer.fill_(t), style, mu, merged_cond=merged_cond)
+                cfg_cache["uses"] += 1
+                return dphi_dt.mul_(1.0 + inference_cfg_rate).sub_(cfg_cache["dphi_dt"], alpha=inference_cfg_rate)
+            if use_cfg:
+                # Original and CFG (null) inputs share one batched forward pass
+                stacked_x[:B].copy_(x)
+                stacked_x[B:].copy_(x)
                 stacked_dphi_dt = self.estimator(
-                    stacked_x, stacked_prompt_x, x_lens, stacked_t, stacked_style, stacked_mu,
+                    stacked_x, stacked_prompt_x, stacked_x_lens, stacked_t.fill_(t), stacked_style, stacked_mu,
+                    merged_cond=stacked_merged_cond,
                 )
 
                 # Split the output back into the original and CFG components
                 dphi_dt, cfg_dphi_dt = stacked_dphi_dt.chunk(2, dim=0)
+                if cfg_reuse > 1:
+                    cfg_cache["dphi_dt"], cfg_cache["uses"] = cfg_dphi_dt, 1
 
                 # Apply CFG formula
-                dphi_dt = (1.0 + inference_cfg_rate) * dphi_dt - inference_cfg_rate * cfg_dphi_dt
-            else:
-                dphi_dt = self.estimator(x, prompt_x, x_lens, t.unsqueeze(0), style, mu)
+                return dphi_dt.mul_(1.0 + inference_cfg_rate).sub_(cfg_dphi_dt, alpha=inference_cfg_rate)
+            return self.estimator(x, prompt_x, x_lens, t_buffer.fill_(t), style, mu, merged_cond=merged_cond)
+
+        # Step sizes and interval checks use host copies of the timesteps, no device sync per step
+        t_host = t_span.tolist()
+        prev_dphi_dt, prev_dt = None, None
+        for step in tqdm(range(1, len(t_host))):
+            t = t_host[step - 1]
+            dt = t_host[step] - t
+            dphi_dt = velocity(x, t)
 
-            x = x + dt * dphi_dt
-            t = t + dt
-            sol.append(x)
-            if step < len(t_span) - 1:
-                dt = t_span[step + 1] - t
+            if velocity_tol is not None and prev_dphi_dt is not None:
+                change = (dphi_dt - prev_dphi_dt).norm() / prev_dphi_dt.norm().clamp_min(1e-8)
+                if change < velocity_tol:
+                    # The flow is close to straight from here on, so finish the interval in one step
+                    x.add_(dphi_dt, alpha=t_host[-1] - t)
+                    x[:, :, :prompt_len] = 0
+                    break
+
+            if solver == "euler":
+                x.add_(dphi_dt, alpha=dt)
+            elif solver == "midpoint":
+                torch.add(x, dphi_dt, alpha=0.5 * dt, out=x_buffer)
+                x_buffer[:, :, :prompt_len] = 0
+                x.add_(velocity(x_buffer, t + 0.5 * dt), alpha=dt)
+            elif solver == "heun":
+                torch.add(x, dphi_dt, alpha=dt, out=x_buffer)
+                x_buffer[:, :, :prompt_len] = 0
+                x.add_(dphi_dt, alpha=0.5 * dt).add_(velocity(x_buffer, t + dt), alpha=0.5 * dt)
+            elif prev_dphi_dt is None:
+                # multistep starts with an Euler step
+                x.add_(dphi_dt, alpha=dt)
+            else:
+                # Second-order Adams-Bashforth with variable step size (the DPM-Solver++(2M) update
+                # for a velocity-predicting model), reusing the previous step's velocity
+                r = dt / prev_dt
+                x.add_(dphi_dt, alpha=dt * (1 + 0.5 * r)).add_(prev_dphi_dt, alpha=-dt * 0.5 * r)
             x[:, :, :prompt_len] = 0
+            # Only the velocity the next step needs is kept alive, never the whole trajectory
+            prev_dphi_dt, prev_dt = (dphi_dt, dt) if solver == "multistep" or velocity_tol is not None else (None, dt)
 
-        return sol[-1]
+        return x
     def forward(self, x1, x_lens, prompt_lens, mu, style):
         """Computes diffusion loss
 
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import time
+
+import torch
+from safetensors.torch import load_file, save_file
+
+BUNDLE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def remove_weight_norms(module):
+    """Fold every ``weight_norm`` hook under ``module`` into a plain weight."""
+    for m in module.modules():
+        if hasattr(m, "weight_g") and hasattr(m, "weight_v"):
+            torch.nn.utils.remove_weight_norm(m)
+    return module
+
+
+def save_state(state, path):
+    # safetensors refuses tensors that share storage, so shared ones are stored as copies
+    seen = set()
+    tensors = {}
+    for k, v in state.items():
+        v = v.detach().contiguous()
+        ptr = v.untyped_storage().data_ptr()
+        if ptr in seen:
+            v = v.clone()
+        seen.add(ptr)
+        tensors[k] = v
+    save_file(tensors, path)
+
+
+def load_state(path):
+    # The file is memory-mapped: tensors are paged in on first touch instead of unpickled up front
+    return load_file(path)
+
+
+def flatten_munch_state(model):
+    return {f"{key}.{k}": v for key in model for k, v in model[key].state_dict().items()}
+
+
+def split_munch_state(state):
+    states = {}
+    for k, v in state.items():
+        key, name = k.split(".", 1)
+        states.setdefault(key, {})[name] = v
+    return states
+
+
+class ModelBundle:
+    """
+    Read side of a model bundle directory written by ``tools/build_bundle.py``.
+
+    The manifest maps ``kind/name`` (e.g. ``bigvgan/nvidia/bigvgan_v2_22khz_80band_256x``)
+    to a safetensors file holding the weights exactly as the live module expects them:
+    DDP prefixes stripped, shape-filtered and with weight norm already removed.
+    """
+
+    def __init__(self, bundle_dir):
+        self.bundle_dir = os.path.abspath(bundle_dir)
+        with open(os.path.join(self.bundle_dir, MANIFEST_NAME), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {manifest.get('version')} in {self.bundle_dir}")
+        self.components = manifest["components"]
+
+    def get(self, kind, name):
+        return self.components.get(f"{kind}/{name}")
+
+    def path(self, filename):
+        return os.path.join(self.bundle_dir, filename)
+
+    def state(self, entry):
+        return load_state(self.path(entry["file"]))
+
+
+class BundleWriter:
+    def __init__(self, bundle_dir):
+        self.bundle_dir = os.path.abspath(bundle_dir)
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        self.components = {}
+
+    def filename(self, kind, name, suffix=".safetensors"):
+        return f"{kind}_{re.sub(r'[^A-Za-z0-9._-]+', '_', name)}{suffix}"
+
+    def add(self, kind, name, state, **fields):
+        filename = self.filename(kind, name)
+        save_state(state, os.path.join(self.bundle_dir, filename))
+        self.components[f"{kind}/{name}"] = dict(
+            fields, file=filename, bytes=os.path.getsize(os.path.join(self.bundle_dir, filename)))
+        print(f"Bundled {kind}/{name} -> {filename}")
+
+    def close(self):
+        manifest = {"version": BUNDLE_VERSION, "created": time.time(), "components": self.components}
+        manifest_path = os.path.join(self.bundle_dir, MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
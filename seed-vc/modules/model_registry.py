@@ -0,0 +1,404 @@
+import os
+import time
+
+import torch
+import yaml
+
+from hf_utils import load_custom_model_from_hf, resolve_pretrained
+from modules.commons import build_model, load_checkpoint, recursive_munch
+from modules.model_bundle import ModelBundle, load_state, remove_weight_norms, split_munch_state
+from modules.precision import TORCH_DTYPES, CastModule, parse_policy, quantized, resolve_policy
+from modules.quantization import quantize_campplus, quantize_dit, quantize_vocoder_weights, quantize_whisper
+from modules.whisper_encoder import encode_trimmed, encoder_frames
+
+# (checkpoint, config) of the released v1 models in Plachta/Seed-VC
+BASE_DIT = ("DiT_seed_v2_uvit_whisper_small_wavenet_bigvgan_pruned.pth",
+            "config_dit_mel_seed_uvit_whisper_small_wavenet.yml")
+F0_DIT = ("DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema_v2.pth",
+          "config_dit_mel_seed_uvit_whisper_base_f0_44k.yml")
+REALTIME_DIT = ("DiT_uvit_tat_xlsr_ema.pth", "config_dit_mel_seed_uvit_xlsr_tiny.yml")
+
+SEED_VC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def dit_paths(default, checkpoint=None, config=None, bundle=None):
+    """
+    Return (checkpoint_path, config_path) of a DiT.
+
+    Without an explicit checkpoint, ``default`` is taken from ``bundle`` when it holds it
+    and downloaded otherwise.
+    """
+    if checkpoint is None or checkpoint == "":
+        entry = bundle.get("dit", default[0]) if bundle is not None else None
+        if entry is not None:
+            return bundle.path(entry["file"]), bundle.path(entry["config"])
+        return load_custom_model_from_hf("Plachta/Seed-VC", *default)
+    return checkpoint, config
+
+
+def get_mel_fn_args(config):
+    spect_params = config['preprocess_params']['spect_params']
+    return {
+        "n_fft": spect_params['n_fft'],
+        "win_size": spect_params['win_length'],
+        "hop_size": spect_params['hop_length'],
+        "num_mels": spect_params['n_mels'],
+        "sampling_rate": config['preprocess_params']['sr'],
+        "fmin": spect_params.get('fmin', 0),
+        "fmax": None if spect_params.get('fmax', "None") == "None" else 8000,
+        "center": False
+    }
+
+
+def _rss_mb():
+    if not os.path.exists("/proc/self/statm"):
+        return 0.0
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _weights_mb(component):
+    if isinstance(component, (tuple, list)):
+        return sum(_weights_mb(c) for c in component)
+    if isinstance(component, dict):
+        return sum(_weights_mb(c) for c in component.values())
+    if isinstance(component, torch.nn.Module):
+        tensors = list(component.parameters()) + list(component.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors) / 2 ** 20
+    if hasattr(component, "model") and isinstance(component.model, torch.nn.Module):
+        return _weights_mb(component.model)
+    return 0.0
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, shared model components for one device.
+
+    Every component is built on first request and cached under a key naming the
+    weights it was loaded from, so two model variants that use the same Whisper
+    encoder, CAMPPlus or vocoder share a single instance. Load time, weight size
+    and the resident memory added by each load are recorded in ``stats``.
+
+    With a ``bundle`` (see ``modules/model_bundle.py``), components it holds are
+    built from its memory-mapped weights instead of the original checkpoints.
+
+    ``precision`` overrides the device's default precision per component (see
+    ``modules/precision.py``). ``quantize`` names components (see
+    ``modules/quantization.py``) to convert to int8 right after loading, the same
+    as an ``int8`` entry in ``precision``; it only applies on CPU.
+
+    ``whisper_trim`` runs the Whisper encoder over the audio length only instead of
+    the padded 30 s window (see ``modules/whisper_encoder.py``).
+    """
+
+    def __init__(self, device, bundle=None, quantize=(), whisper_trim=False, precision=None):
+        self.device = device
+        self.bundle = bundle
+        self.whisper_trim = whisper_trim
+        self.precision = resolve_policy(device, precision, quantize)
+        self.quantize = quantized(self.precision)
+        self.components = {}
+        self.stats = {}
+
+    def get(self, key, loader):
+        if key in self.components:
+            return self.components[key]
+        rss = _rss_mb()
+        cuda = torch.cuda.memory_allocated() if self.device.type == "cuda" else 0
+        start = time.time()
+        component = loader()
+        stats = {
+            "seconds": time.time() - start,
+            "weights_mb": _weights_mb(component),
+            "rss_mb": _rss_mb() - rss,
+        }
+        if self.device.type == "cuda":
+            stats["cuda_mb"] = (torch.cuda.memory_allocated() - cuda) / 2 ** 20
+        self.components[key] = component
+        self.stats[key] = stats
+        print(f"Loaded {key[0]} ({key[-1]}) in {stats['seconds']:.2f}s: "
+              f"{stats['weights_mb']:.1f} MB weights, +{stats['rss_mb']:.1f} MB RSS"
+              + (f", +{stats['cuda_mb']:.1f} MB CUDA" if "cuda_mb" in stats else ""))
+        return component
+
+    def report(self):
+        lines = [f"{'component':<60}{'load s':>8}{'weights MB':>12}{'RSS MB':>9}"]
+        for key, stats in self.stats.items():
+            lines.append(f"{key[0] + ' ' + str(key[-1]):<60.60}{stats['seconds']:>8.2f}"
+                         f"{stats['weights_mb']:>12.1f}{stats['rss_mb']:>9.1f}")
+        lines.append(f"{'total':<60}{sum(s['seconds'] for s in self.stats.values()):>8.2f}"
+                     f"{sum(s['weights_mb'] for s in self.stats.values()):>12.1f}"
+                     f"{sum(s['rss_mb'] for s in self.stats.values()):>9.1f}")
+        return "\n".join(lines)
+
+    def dtype(self, component):
+        """Compute dtype of ``component``; int8 components compute in fp32."""
+        return TORCH_DTYPES[self.precision[component]]
+
+    def cast(self, component, module):
+        dtype = self.dtype(component)
+        return module if dtype == torch.float32 else CastModule(module, dtype)
+
+    def dit(self, checkpoint_path, config_path):
+        """
+        Return ``(model, config)`` for a DiT checkpoint, with every submodule in eval mode on the device.
+
+        A ``.safetensors`` checkpoint is a bundled one: weight norm is removed from the
+        fresh model and the mapped weights are assigned without copying.
+        """
+        def load():
+            config = yaml.safe_load(open(config_path, "r"))
+            model_params = recursive_munch(config["model_params"])
+            model_params.dit_type = 'DiT'
+            model = build_model(model_params, stage="DiT")
+            if checkpoint_path.endswith(".safetensors"):
+                states = split_munch_state(load_state(checkpoint_path))
+                for key in model:
+                    remove_weight_norms(model[key])
+                    model[key].load_state_dict(states[key], assign=True)
+            else:
+                model, _, _, _ = load_checkpoint(
+                    model,
+                    None,
+                    checkpoint_path,
+                    load_only_params=True,
+                    ignore_modules=[],
+                    is_distributed=False,
+                )
+            for key in model:
+                model[key].eval()
+                model[key].to(self.device)
+            model.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
+            if "dit" in self.quantize:
+                quantize_dit(model.cfm.estimator)
+            return model, config
+        return self.get(("dit", os.path.abspath(checkpoint_path)), load)
+
+    def campplus(self):
+        def load():
+            from modules.campplus.DTDNN import CAMPPlus
+
+            campplus_model = CAMPPlus(feat_dim=80, embedding_size=192)
+            entry = self.bundle.get("campplus", "campplus_cn_common.bin") if self.bundle is not None else None
+            if entry is not None:
+                campplus_model.load_state_dict(self.bundle.state(entry), assign=True)
+            else:
+                campplus_ckpt_path = load_custom_model_from_hf(
+                    "funasr/campplus", "campplus_cn_common.bin", config_filename=None
+                )
+                campplus_model.load_state_dict(torch.load(campplus_ckpt_path, map_location="cpu"))
+            campplus_model.eval()
+            campplus_model.to(self.device)
+            if "campplus" in self.quantize:
+                quantize_campplus(campplus_model)
+            return self.cast("campplus", campplus_model)
+        return self.get(("campplus", "campplus_cn_common.bin"), load)
+
+    def rmvpe(self):
+        def load():
+            from modules.rmvpe import RMVPE
+
+            entry = self.bundle.get("rmvpe", "rmvpe.pt") if self.bundle is not None else None
+            if entry is not None:
+                model_path = self.bundle.path(entry["file"])
+            else:
+                model_path = load_custom_model_from_hf("lj1995/VoiceConversionWebUI", "rmvpe.pt", None)
+            return RMVPE(model_path, is_half=self.precision["rmvpe"] == "fp16", device=self.device)
+        return self.get(("rmvpe", "rmvpe.pt"), load)
+
+    def bigvgan(self, name):
+        def load():
+            from modules.bigvgan import bigvgan
+            from modules.bigvgan.env import AttrDict
+
+            entry = self.bundle.get("bigvgan", name) if self.bundle is not None else None
+            if entry is not None:
+                bigvgan_model = bigvgan.BigVGAN(AttrDict(entry["config"]), use_cuda_kernel=False)
+                bigvgan_model.remove_weight_norm()
+                bigvgan_model.load_state_dict(self.bundle.state(entry), assign=True)
+            else:
+                bigvgan_model = bigvgan.BigVGAN.from_pretrained(resolve_pretrained(name), use_cuda_kernel=False)
+                # remove weight norm in the model and set to eval mode
+                bigvgan_model.remove_weight_norm()
+            bigvgan_model = bigvgan_model.eval().to(self.device)
+            if "vocoder" in self.quantize:
+                quantize_vocoder_weights(bigvgan_model)
+            return self.cast("vocoder", bigvgan_model)
+        return self.get(("bigvgan", name), load)
+
+    def vocoder(self, model_params):
+        vocoder_type = model_params.vocoder.type
+        if vocoder_type == 'bigvgan':
+            return self.bigvgan(model_params.vocoder.name)
+        elif vocoder_type == 'hifigan':
+            def load():
+                from modules.hifigan.generator import HiFTGenerator
+                from modules.hifigan.f0_predictor import ConvRNNF0Predictor
+                hift_config = yaml.safe_load(open(os.path.join(SEED_VC_DIR, 'configs', 'hifigan.yml'), 'r'))
+                hift_gen = HiFTGenerator(**hift_config['hift'],
+                                         f0_predictor=ConvRNNF0Predictor(**hift_config['f0_predictor']))
+                hift_path = load_custom_model_from_hf("FunAudioLLM/CosyVoice-300M", 'hift.pt', None)
+                hift_gen.load_state_dict(torch.load(hift_path, map_location='cpu'))
+                hift_gen.eval()
+                hift_gen.to(self.device)
+                return hift_gen
+            return self.get(("hifigan", "hift.pt"), load)
+        elif vocoder_type == "vocos":
+            def load():
+                vocos_config = yaml.safe_load(open(model_params.vocoder.vocos.config, 'r'))
+                vocos_model_params = recursive_munch(vocos_config['model_params'])
+                vocos = build_model(vocos_model_params, stage='mel_vocos')
+                vocos, _, _, _ = load_checkpoint(vocos, None, model_params.vocoder.vocos.path,
+                                                 load_only_params=True, ignore_modules=[], is_distributed=False)
+                _ = [vocos[key].eval().to(self.device) for key in vocos]
+                return vocos.decoder
+            return self.get(("vocos", os.path.abspath(model_params.vocoder.vocos.path)), load)
+        raise ValueError(f"Unknown vocoder type: {vocoder_type}")
+
+    def whisper(self, name):
+        """Return ``(encoder_model, feature_extractor)``; the decoder is dropped."""
+        def load():
+            from transformers import AutoFeatureExtractor, WhisperConfig, WhisperModel
+
+            entry = self.bundle.get("whisper", name) if self.bundle is not None else None
+            if entry is not None:
+                # Built on the meta device, so no time goes into initializing weights that are replaced anyway
+                with torch.device("meta"):
+                    whisper_model = WhisperModel(WhisperConfig.from_dict(entry["config"]))
+                del whisper_model.decoder
+                whisper_model.load_state_dict(self.bundle.state(entry), assign=True)
+                whisper_model = whisper_model.eval().to(self.device, self.dtype("content"))
+                feature_extractor = AutoFeatureExtractor.from_pretrained(self.bundle.path(entry["feature_extractor"]))
+            else:
+                source = resolve_pretrained(name)
+                whisper_model = WhisperModel.from_pretrained(source, torch_dtype=self.dtype("content")).to(self.device)
+                del whisper_model.decoder
+                feature_extractor = AutoFeatureExtractor.from_pretrained(source)
+            if "whisper" in self.quantize:
+                quantize_whisper(whisper_model)
+            return whisper_model, feature_extractor
+        return self.get(("whisper", name), load)
+
+    def semantic_fn(self, model_params):
+        """Build the content encoder function of a DiT config; the underlying model is shared."""
+        device = self.device
+        speech_tokenizer_type = model_params.speech_tokenizer.type
+        if speech_tokenizer_type == 'whisper':
+            whisper_model, whisper_feature_extractor = self.whisper(model_params.speech_tokenizer.name)
+
+            def semantic_fn(waves_16k):
+                ori_inputs = whisper_feature_extractor([wave.cpu().numpy() for wave in waves_16k],
+                                                       return_tensors="pt",
+                                                       return_attention_mask=True)
+                ori_input_features = whisper_model._mask_input_features(
+                    ori_inputs.input_features, attention_mask=ori_inputs.attention_mask).to(device)
+                if self.whisper_trim:
+                    return encode_trimmed(whisper_model.encoder, ori_input_features,
+                                          encoder_frames(waves_16k.size(-1))).to(torch.float32)
+                with torch.no_grad():
+                    ori_outputs = whisper_model.encoder(
+                        ori_input_features.to(whisper_model.encoder.dtype),
+                        head_mask=None,
+                        output_attentions=False,
+                        output_hidden_states=False,
+                        return_dict=True,
+                    )
+                S_ori = ori_outputs.last_hidden_state.to(torch.float32)
+                S_ori = S_ori[:, :waves_16k.size(-1) // 320 + 1]
+                return S_ori
+            return semantic_fn
+
+        model_name = model_params.speech_tokenizer.name
+        if speech_tokenizer_type == 'cnhubert':
+            def load():
+                from transformers import Wav2Vec2FeatureExtractor, HubertModel
+
+                source = resolve_pretrained(model_name)
+                hubert_model = HubertModel.from_pretrained(source)
+                return (hubert_model.to(device, self.dtype("content")).eval(),
+                        Wav2Vec2FeatureExtractor.from_pretrained(source))
+            encoder, feature_extractor = self.get(("cnhubert", model_name), load)
+        elif speech_tokenizer_type == 'xlsr':
+            output_layer = model_params.speech_tokenizer.output_layer
+
+            def load():
+                from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2Model
+
+                source = resolve_pretrained(model_name)
+                wav2vec_model = Wav2Vec2Model.from_pretrained(source)
+                wav2vec_model.encoder.layers = wav2vec_model.encoder.layers[:output_layer]
+                return (wav2vec_model.to(device, self.dtype("content")).eval(),
+                        Wav2Vec2FeatureExtractor.from_pretrained(source))
+            encoder, feature_extractor = self.get(("xlsr", f"{model_name}[:{output_layer}]"), load)
+        else:
+            raise ValueError(f"Unknown speech tokenizer type: {speech_tokenizer_type}")
+
+        def semantic_fn(waves_16k):
+            ori_waves_16k_input_list = [
+                waves_16k[bib].cpu().numpy()
+                for bib in range(len(waves_16k))
+            ]
+            ori_inputs = feature_extractor(ori_waves_16k_input_list,
+                                           return_tensors="pt",
+                                           return_attention_mask=True,
+                                           padding=True,
+                                           sampling_rate=16000).to(device)
+            with torch.no_grad():
+                ori_outputs = encoder(
+                    ori_inputs.input_values.to(encoder.dtype),
+                )
+            S_ori = ori_outputs.last_hidden_state.float()
+            return S_ori
+        return semantic_fn
+
+    def mel_frontend(self, mel_fn_args):
+        from modules.audio import MelFrontend
+
+        key = ("mel_frontend", ",".join(f"{name}={value}" for name, value in sorted(mel_fn_args.items())))
+        return self.get(key, lambda: MelFrontend(**mel_fn_args).to(self.device))
+
+    def model_set(self, checkpoint_path, config_path, f0_condition=False):
+        """
+        Load (or reuse) everything one DiT checkpoint needs for inference.
+
+        Returns:
+            Tuple of ``(model, semantic_fn, f0_fn, vocoder_fn, campplus_model, to_mel, mel_fn_args)``,
+            with ``f0_fn`` None unless ``f0_condition``
+        """
+        model, config = self.dit(checkpoint_path, config_path)
+        model_params = recursive_munch(config["model_params"])
+        mel_fn_args = get_mel_fn_args(config)
+        return (
+            model,
+            self.semantic_fn(model_params),
+            self.rmvpe().infer_from_audio if f0_condition else None,
+            self.vocoder(model_params),
+            self.campplus(),
+            self.mel_frontend(mel_fn_args),
+            mel_fn_args,
+        )
+
+
+_registries = {}
+
+
+def get_registry(device, bundle_dir=None, quantize=None, whisper_trim=None, precision=None):
+    """
+    Return the process-wide registry for ``device``, so every caller shares loaded models.
+
+    ``bundle_dir``, ``quantize``, ``whisper_trim`` and ``precision`` (defaults: the
+    ``SEED_VC_BUNDLE``, comma-separated ``SEED_VC_QUANTIZE``, ``SEED_VC_WHISPER_TRIM`` and
+    ``SEED_VC_PRECISION`` environment variables) only take effect when the registry is first created.
+    """
+    device = torch.device(device)
+    if str(device) not in _registries:
+        bundle_dir = bundle_dir or os.environ.get("SEED_VC_BUNDLE")
+        bundle = ModelBundle(bundle_dir) if bundle_dir else None
+        if quantize is None:
+            quantize = [name for name in os.environ.get("SEED_VC_QUANTIZE", "").split(",") if name]
+        if whisper_trim is None:
+            whisper_trim = os.environ.get("SEED_VC_WHISPER_TRIM", "0") == "1"
+        if precision is None:
+            precision = parse_policy(os.environ.get("SEED_VC_PRECISION", ""))
+        _registries[str(device)] = ModelRegistry(device, bundle, quantize, whisper_trim, precision)
+    return _registries[str(device)]
@@ -0,0 +1,94 @@
+"""
+Per-component precision policy for the v1 inference stack.
+
+A policy maps each component to one of ``fp32``, ``bf16``, ``fp16`` or ``int8``:
+  content   the speech tokenizer (Whisper / cnhubert / xlsr), weights in that dtype
+  dit       the CFM estimator: fp32 weights run under autocast to bf16 / fp16
+  vocoder   BigVGAN (or the configured vocoder), weights and input in that dtype
+  campplus  the speaker encoder, weights and input in that dtype
+  rmvpe     the F0 extractor; only fp32 and fp16 (its is_half mode)
+``int8`` is the CPU-only dynamic quantization of ``modules/quantization.py``.
+
+Defaults depend on the device. On CPU everything is fp32, because fp16 matmuls are
+emulated on most CPUs and end up slower than fp32 plus the casts around them.
+On GPU the content encoder runs in fp16, as it always has.
+"""
+import torch
+import torch.nn as nn
+
+from modules.quantization import QUANTIZABLE
+
+COMPONENTS = ("content", "dit", "vocoder", "campplus", "rmvpe")
+PRECISIONS = ("fp32", "bf16", "fp16", "int8")
+TORCH_DTYPES = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16, "int8": torch.float32}
+# quantization.QUANTIZABLE names the content encoder after the model it quantizes
+QUANTIZE_NAMES = {"content": "whisper", "dit": "dit", "vocoder": "vocoder", "campplus": "campplus"}
+SUPPORTED = {"rmvpe": ("fp32", "fp16")}
+
+
+def default_policy(device):
+    policy = dict.fromkeys(COMPONENTS, "fp32")
+    if device.type != "cpu":
+        policy["content"] = "fp16"
+    return policy
+
+
+def parse_policy(spec):
+    """Parse ``component=precision`` items, given as a list or one comma-separated string."""
+    if isinstance(spec, str):
+        spec = [item for item in spec.split(",") if item]
+    policy = {}
+    for item in spec:
+        component, sep, precision = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected component=precision, got {item!r}")
+        policy[component.strip()] = precision.strip()
+    return policy
+
+
+def resolve_policy(device, overrides=None, quantize=()):
+    """
+    Return the full policy for ``device``: its defaults, then int8 for every component in
+    ``quantize`` (names from ``modules.quantization.QUANTIZABLE``), then ``overrides``.
+    """
+    policy = default_policy(device)
+    by_quantize_name = {name: component for component, name in QUANTIZE_NAMES.items()}
+    for name in quantize:
+        if name not in by_quantize_name:
+            raise ValueError(f"Unknown component to quantize: {name}")
+        policy[by_quantize_name[name]] = "int8"
+    for component, precision in (overrides or {}).items():
+        if component not in COMPONENTS:
+            raise ValueError(f"Unknown component {component!r}, expected one of {', '.join(COMPONENTS)}")
+        if precision not in SUPPORTED.get(component, PRECISIONS):
+            raise ValueError(f"{component} does not support {precision}")
+        policy[component] = precision
+    if device.type != "cpu":
+        for component, precision in policy.items():
+            if precision == "int8":
+                print(f"Int8 dynamic quantization is CPU only, running {component} in fp32 on {device}")
+                policy[component] = "fp32"
+    return policy
+
+
+def quantized(policy):
+    """Components of ``policy`` in int8, named as in ``modules.quantization.QUANTIZABLE``."""
+    names = tuple(QUANTIZE_NAMES[component] for component, precision in policy.items() if precision == "int8")
+    assert set(names) <= set(QUANTIZABLE)
+    return names
+
+
+def format_policy(policy):
+    return ",".join(f"{component}={precision}" for component, precision in policy.items())
+
+
+class CastModule(nn.Module):
+    """Runs ``module`` in ``dtype`` behind an fp32 interface: inputs are cast in, the output back to fp32."""
+
+    def __init__(self, module, dtype):
+        super().__init__()
+        self.module = module.to(dtype)
+        self.dtype = dtype
+
+    def forward(self, x):
+        return self.module(x.to(self.dtype)).float()
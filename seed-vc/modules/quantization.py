@@ -0,0 +1,96 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+QUANTIZABLE = ("dit", "whisper", "campplus", "vocoder")
+# The vocoder is opt-in: weight-only int8 saves memory there but not time
+DEFAULT_QUANTIZE = ("dit", "whisper", "campplus")
+
+
+def quantize_linear(module):
+    """Int8 dynamic quantization of every nn.Linear under ``module``, in place (CPU only)."""
+    return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def replace_modules(root, predicate, factory):
+    for name, child in root.named_children():
+        if predicate(child):
+            setattr(root, name, factory(child))
+        else:
+            replace_modules(child, predicate, factory)
+    return root
+
+
+def quantize_dit(estimator):
+    # Only the transformer blocks: the final norm keeps a float weight for setup_caches,
+    # and cond_x_merge_linear has its weight sliced in DiT.forward / merge_condition
+    quantize_linear(estimator.transformer.layers)
+    return estimator
+
+
+def quantize_whisper(whisper_model):
+    # Dynamic quantization needs fp32 Linears; the encoder is loaded in fp16
+    whisper_model.encoder.float()
+    quantize_linear(whisper_model.encoder.layers)
+    return whisper_model
+
+
+class PointwiseConv1d(nn.Module):
+    """A kernel-size-1 Conv1d as an nn.Linear over channels, so dynamic quantization can reach it."""
+
+    def __init__(self, conv):
+        super().__init__()
+        self.linear = nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        with torch.no_grad():
+            self.linear.weight.copy_(conv.weight[:, :, 0])
+            if conv.bias is not None:
+                self.linear.bias.copy_(conv.bias)
+
+    def forward(self, x):
+        return self.linear(x.transpose(1, 2)).transpose(1, 2)
+
+
+def is_pointwise_conv(module):
+    return (isinstance(module, nn.Conv1d) and module.kernel_size == (1,) and module.stride == (1,)
+            and module.padding == (0,) and module.dilation == (1,) and module.groups == 1)
+
+
+def quantize_campplus(campplus_model):
+    # CAMPPlus has no Linear layers; its dense TDNN layers are 1x1 convs
+    replace_modules(campplus_model, is_pointwise_conv, PointwiseConv1d)
+    quantize_linear(campplus_model)
+    return campplus_model
+
+
+class Int8WeightConv1d(nn.Module):
+    """
+    Conv1d / ConvTranspose1d with an int8 weight and a per-output-channel scale.
+
+    The weight is dequantized on every call, so this cuts weight memory by 4x
+    without speeding up the convolution itself.
+    """
+
+    def __init__(self, conv):
+        super().__init__()
+        self.transposed = isinstance(conv, nn.ConvTranspose1d)
+        self.stride, self.padding, self.dilation, self.groups = conv.stride, conv.padding, conv.dilation, conv.groups
+        self.output_padding = getattr(conv, "output_padding", 0)
+        weight = conv.weight.detach().float()
+        # ConvTranspose1d weights are (in, out / groups, k)
+        dims = (0, 2) if self.transposed else (1, 2)
+        scale = weight.abs().amax(dim=dims, keepdim=True).clamp(min=1e-8) / 127
+        self.register_buffer("weight_int8", torch.round(weight / scale).to(torch.int8))
+        self.register_buffer("scale", scale)
+        self.bias = conv.bias
+
+    def forward(self, x):
+        weight = self.weight_int8.to(x.dtype) * self.scale.to(x.dtype)
+        if self.transposed:
+            return F.conv_transpose1d(x, weight, self.bias, self.stride, self.padding, self.output_padding,
+                                      self.groups, self.dilation)
+        return F.conv1d(x, weight, self.bias, self.stride, self.padding, self.dilation, self.groups)
+
+
+def quantize_vocoder_weights(vocoder):
+    """Weight-only int8 for every Conv1d / ConvTranspose1d; weight norm must already be removed."""
+    return replace_modules(vocoder, lambda m: isinstance(m, (nn.Conv1d, nn.ConvTranspose1d)), Int8WeightConv1d)
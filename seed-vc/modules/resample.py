@@ -0,0 +1,134 @@
+"""
+Polyphase sinc resampling with cached kernels.
+
+``resample`` applies the filter of ``torchaudio.functional.resample`` with its
+defaults (Hann-windowed sinc, lowpass_filter_width=6, rolloff=0.99), but builds
+the kernel once per rate pair, device and dtype instead of on every call.
+
+``StreamResampler`` applies the same filter to audio that arrives block by block.
+It keeps the input samples the next output samples still need, so every input
+sample is filtered once, and the concatenated output of ``push`` and ``flush``
+equals ``resample`` of the whole signal.
+"""
+import math
+
+import torch
+import torch.nn.functional as F
+
+LOWPASS_FILTER_WIDTH = 6
+ROLLOFF = 0.99
+
+_kernels = {}
+
+
+def reduced_rates(orig_freq, new_freq):
+    gcd = math.gcd(int(orig_freq), int(new_freq))
+    return int(orig_freq) // gcd, int(new_freq) // gcd
+
+
+def sinc_kernel(orig_freq, new_freq, device, dtype=torch.float32):
+    """
+    Return the cached ``(kernel, width)`` for resampling ``orig_freq`` to ``new_freq``.
+
+    ``kernel`` is (new, 1, 2 * width + orig) for the gcd-reduced rates: row ``k``
+    computes output phase ``k`` of every block of ``orig`` input samples.
+    """
+    orig, new = reduced_rates(orig_freq, new_freq)
+    key = (orig, new, str(device), dtype)
+    if key not in _kernels:
+        base_freq = min(orig, new) * ROLLOFF
+        width = math.ceil(LOWPASS_FILTER_WIDTH * orig / base_freq)
+        idx = torch.arange(-width, width + orig, dtype=torch.float64)[None, None] / orig
+        t = torch.arange(0, -new, -1, dtype=torch.float64)[:, None, None] / new + idx
+        t = (t * base_freq).clamp(-LOWPASS_FILTER_WIDTH, LOWPASS_FILTER_WIDTH)
+        window = torch.cos(t * math.pi / LOWPASS_FILTER_WIDTH / 2) ** 2
+        t = t * math.pi
+        kernel = torch.where(t == 0, torch.ones_like(t), t.sin() / t) * window * (base_freq / orig)
+        _kernels[key] = (kernel.to(device=device, dtype=dtype), width)
+    return _kernels[key]
+
+
+def _apply_kernel(padded, kernel, orig):
+    """Filter (N, samples) input that already holds its padding; returns (N, blocks * new)."""
+    resampled = F.conv1d(padded[:, None], kernel, stride=orig)
+    return resampled.transpose(1, 2).reshape(padded.size(0), -1)
+
+
+def resample(waveform, orig_freq, new_freq):
+    """Resample (..., samples) audio from ``orig_freq`` to ``new_freq``."""
+    if orig_freq == new_freq:
+        return waveform
+    orig, new = reduced_rates(orig_freq, new_freq)
+    kernel, width = sinc_kernel(orig_freq, new_freq, waveform.device, waveform.dtype)
+    shape = waveform.shape
+    waveform = waveform.reshape(-1, shape[-1])
+    resampled = _apply_kernel(F.pad(waveform, (width, width + orig)), kernel, orig)
+    resampled = resampled[:, :math.ceil(new * shape[-1] / orig)]
+    return resampled.reshape(shape[:-1] + resampled.shape[-1:])
+
+
+class StreamResampler:
+    """
+    Block-wise ``resample`` of (samples,) or (N, samples) audio.
+
+    ``push`` returns the output samples that no longer depend on future input, about
+    ``width + orig`` input samples behind the newest one. ``pending`` returns the rest
+    as if the signal ended now, without changing the state; a real-time caller can
+    play those and replace them with the next ``push`` output.
+    """
+
+    def __init__(self, orig_freq, new_freq, device="cpu", dtype=torch.float32):
+        self.orig, self.new = reduced_rates(orig_freq, new_freq)
+        self.kernel, self.width = sinc_kernel(orig_freq, new_freq, device, dtype)
+        self.reset()
+
+    def reset(self):
+        self.buffer = None
+        self.squeeze = False
+        self.num_inputs = 0
+        self.num_outputs = 0
+
+    def _filter(self, buffer):
+        """Output of every block whose input window lies inside ``buffer``, and the block count."""
+        blocks = max((buffer.size(-1) - 2 * self.width - self.orig) // self.orig + 1, 0)
+        if not blocks:
+            return buffer.new_zeros(buffer.size(0), 0), 0
+        window = buffer[:, :(blocks - 1) * self.orig + 2 * self.width + self.orig]
+        return _apply_kernel(window, self.kernel, self.orig), blocks
+
+    def _target_length(self):
+        return math.ceil(self.new * self.num_inputs / self.orig)
+
+    def push(self, x):
+        """
+        Args:
+            x: (samples,) or (N, samples) next block of audio
+
+        Returns:
+            Output samples completed by ``x``, shaped like ``x``
+        """
+        self.squeeze = x.dim() == 1
+        x = x.reshape(-1, x.size(-1))
+        if self.buffer is None:
+            # the signal starts after ``width`` zeros, like the padding of ``resample``
+            self.buffer = x.new_zeros(x.size(0), self.width)
+        self.buffer = torch.cat([self.buffer, x], dim=-1)
+        self.num_inputs += x.size(-1)
+        output, blocks = self._filter(self.buffer)
+        self.buffer = self.buffer[:, blocks * self.orig:]
+        self.num_outputs += output.size(-1)
+        return output[0] if self.squeeze else output
+
+    def pending(self):
+        """Output samples still owed for the input so far, as if the signal ended now."""
+        if self.buffer is None:
+            return self.kernel.new_zeros(0)
+        output, _ = self._filter(F.pad(self.buffer, (0, self.width + self.orig)))
+        output = output[:, :self._target_length() - self.num_outputs]
+        return output[0] if self.squeeze else output
+
+    def flush(self):
+        """Return the output still owed for the whole signal, then reset."""
+        output = self.pending()
+        self.reset()
+        return output
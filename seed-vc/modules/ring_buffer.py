@@ -0,0 +1,50 @@
+"""
+Fixed-length audio history for the real-time engine.
+
+``RingBuffer`` holds the most recent ``size`` samples. Pushing a block writes only
+that block instead of shifting the whole history. The storage is mirrored (every
+sample is kept at ``i`` and ``i + size`` of a ``2 * size`` tensor), so the history
+from oldest to newest is always one contiguous slice: ``view()`` hands it to the
+models without a copy. The buffer is written from the audio callback only, so it
+needs no locking.
+"""
+import torch
+
+
+class RingBuffer:
+    def __init__(self, size, device=None, dtype=torch.float32):
+        self.size = size
+        self.data = torch.zeros(2 * size, device=device, dtype=dtype)
+        # index of the oldest sample, which the next push overwrites first
+        self.start = 0
+
+    def _write(self, position, x):
+        self.data[position:position + x.shape[0]] = x
+        self.data[position + self.size:position + self.size + x.shape[0]] = x
+
+    def push(self, x, overwrite=0):
+        """
+        Append ``x``, dropping the oldest samples.
+
+        Args:
+            x: (samples,) new audio on any device
+            overwrite: Number of newest samples that ``x`` replaces instead of following,
+                at most ``len(x)``, e.g. a provisional tail from the previous block
+        """
+        assert overwrite <= x.shape[0]
+        x = x.to(self.data.device, self.data.dtype)
+        if x.shape[0] > self.size:
+            x, overwrite = x[x.shape[0] - self.size:], max(overwrite - (x.shape[0] - self.size), 0)
+        start = (self.start - overwrite) % self.size
+        first = min(x.shape[0], self.size - start)
+        self._write(start, x[:first])
+        self._write(0, x[first:])
+        self.start = (start + x.shape[0]) % self.size
+
+    def view(self):
+        """The ``size`` samples from oldest to newest, a view that the next push changes."""
+        return self.data[self.start:self.start + self.size]
+
+    def zero_(self):
+        self.data.zero_()
+        self.start = 0
@@ -511,8 +511,13 @@ class RMVPE:
 
             def get_default_model():
                 model = E2E(4, 1, (2, 2))
-                ckpt = torch.load(model_path, map_location="cpu")
-                model.load_state_dict(ckpt)
+                if model_path.endswith(".safetensors"):
+                    # bundled weights (modules/model_bundle.py), memory-mapped and assigned without a copy
+                    from safetensors.torch import load_file
+                    model.load_state_dict(load_file(model_path), assign=True)
+                else:
+                    ckpt = torch.load(model_path, map_location="cpu")
+                    model.load_state_dict(ckpt)
                 model.eval()
                 if is_half:
                     model = model.half()
@@ -525,6 +530,7 @@ class RMVPE:
             self.model = self.model.to(device)
         cents_mapping = 20 * np.arange(360) + 1997.3794084376191
         self.cents_mapping = np.pad(cents_mapping, (4, 4))  # 368
+        self.cents_mapping_tensor = torch.from_numpy(self.cents_mapping).float()
 
     def mel2hidden(self, mel):
         with torch.no_grad():
@@ -551,7 +557,18 @@ class RMVPE:
         # f0 = np.array([10 * (2 ** (cent_pred / 1200)) if cent_pred else 0 for cent_pred in cents_pred])
         return f0
 
-    def infer_from_audio(self, audio, thred=0.03):
+    def decode_tensor(self, hidden, thred=0.03):
+        """``decode`` on the device of ``hidden``, for salience of shape (..., frames, 360)."""
+        cents_pred = self.to_local_average_cents_tensor(hidden.float(), thred=thred)
+        f0 = 10 * (2 ** (cents_pred / 1200))
+        return f0.masked_fill(cents_pred == 0, 0)
+
+    def infer_from_audio(self, audio, thred=0.03, return_tensor=False):
+        """
+        F0 in Hz of one 16 kHz waveform, 100 frames per second.
+
+        Returned as a numpy array, or with ``return_tensor`` as a float32 tensor left on the model device.
+        """
         # torch.cuda.synchronize()
         # t0 = ttime()
         if not torch.is_tensor(audio):
@@ -567,13 +584,15 @@ class RMVPE:
         # t2 = ttime()
         # print(234234,hidden.device.type)
         if "privateuseone" not in str(self.device):
-            hidden = hidden.squeeze(0).cpu().numpy()
-        else:
-            hidden = hidden[0]
+            f0 = self.decode_tensor(hidden[0], thred=thred)
+            return f0 if return_tensor else f0.cpu().numpy()
+        hidden = hidden[0]
         if self.is_half == True:
             hidden = hidden.astype("float32")
 
         f0 = self.decode(hidden, thred=thred)
+        if return_tensor:
+            return torch.from_numpy(f0).float()
         # torch.cuda.synchronize()
         # t3 = ttime()
         # print("hmvpe:%s\t%s\t%s\t%s"%(t1-t0,t2-t1,t3-t2,t3-t0))
@@ -594,9 +613,7 @@ class RMVPE:
         # t2 = ttime()
         # print(234234,hidden.device.type)
         if "privateuseone" not in str(self.device):
-            hidden = hidden.cpu().numpy()
-        else:
-            pass
+            return self.decode_tensor(hidden, thred=thred)
         if self.is_half == True:
             hidden = hidden.astype("float32")
 
@@ -615,17 +632,11 @@ class RMVPE:
         center = np.argmax(salience, axis=1)  # 帧长#index
         salience = np.pad(salience, ((0, 0), (4, 4)))  # 帧长,368
         # t1 = ttime()
-        center += 4
-        todo_salience = []
-        todo_cents_mapping = []
-        starts = center - 4
-        ends = center + 5
-        for idx in range(salience.shape[0]):
-            todo_salience.append(salience[:, starts[idx] : ends[idx]][idx])
-            todo_cents_mapping.append(self.cents_mapping[starts[idx] : ends[idx]])
+        # the 9-bin window around each peak, as indices into the padded salience and cents mapping
+        window = center[:, None] + np.arange(9)  # 帧长，9
         # t2 = ttime()
-        todo_salience = np.array(todo_salience)  # 帧长，9
-        todo_cents_mapping = np.array(todo_cents_mapping)  # 帧长，9
+        todo_salience = np.take_along_axis(salience, window, axis=1)  # 帧长，9
+        todo_cents_mapping = self.cents_mapping[window]  # 帧长，9
         product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
         weight_sum = np.sum(todo_salience, 1)  # 帧长
         devided = product_sum / weight_sum  # 帧长
@@ -635,3 +646,18 @@ class RMVPE:
         # t4 = ttime()
         # print("decode:%s\t%s\t%s\t%s" % (t1 - t0, t2 - t1, t3 - t2, t4 - t3))
         return devided
+
+    def to_local_average_cents_tensor(self, salience, thred=0.05):
+        """
+        Vectorized ``to_local_average_cents`` in torch: one gather of the 9-bin window around
+        each frame's peak, for salience of shape (..., frames, 360) on any device.
+        """
+        center = salience.argmax(dim=-1, keepdim=True)
+        window = center + torch.arange(9, device=salience.device)
+        todo_salience = F.pad(salience, (4, 4)).gather(-1, window)
+        cents_mapping = self.cents_mapping_tensor.to(salience.device)
+        product_sum = (todo_salience * cents_mapping[window]).sum(-1)
+        weight_sum = todo_salience.sum(-1)
+        devided = product_sum / weight_sum
+        maxx = salience.amax(dim=-1)
+        return devided.masked_fill(maxx <= thred, 0)
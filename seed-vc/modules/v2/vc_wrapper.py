@@ -4,6 +4,7 @@ import torchaudio
 import numpy as np
 from pydub import AudioSegment
 from hf_utils import load_custom_model_from_hf
+from modules.content_windows import encode_windows
 
 DEFAULT_REPO_ID = "Plachta/Seed-VC"
 DEFAULT_CFM_CHECKPOINT = "v2/cfm_small.pth"
@@ -462,31 +463,14 @@ class VoiceConversionWrapper(torch.nn.Module):
     def _process_content_features(self, audio_16k_tensor, is_narrow=False):
         """Process audio through Whisper model to extract features."""
         content_extractor_fn = self.content_extractor_narrow if is_narrow else self.content_extractor_wide
-        if audio_16k_tensor.size(-1) <= 16000 * 30:
-            # Compute content features
-            _, content_indices, _ = content_extractor_fn(audio_16k_tensor, [audio_16k_tensor.size(-1)], ssl_model=self.content_extractor_wide.ssl_model)
-        else:
-            # Process long audio in chunks
-            overlapping_time = 5  # 5 seconds
-            features_list = []
-            buffer = None
-            traversed_time = 0
-            while traversed_time < audio_16k_tensor.size(-1):
-                if buffer is None:  # first chunk
-                    chunk = audio_16k_tensor[:, traversed_time:traversed_time + 16000 * 30]
-                else:
-                    chunk = torch.cat([
-                        buffer,
-                        audio_16k_tensor[:, traversed_time:traversed_time + 16000 * (30 - overlapping_time)]
-                    ], dim=-1)
-                _, chunk_content_indices, _ = content_extractor_fn(chunk, [chunk.size(-1)], ssl_model=self.content_extractor_wide.ssl_model)
-                if traversed_time == 0:
-                    features_list.append(chunk_content_indices)
-                else:
-                    features_list.append(chunk_content_indices[:, 50 * overlapping_time:])
-                buffer = chunk[:, -16000 * overlapping_time:]
-                traversed_time += 30 * 16000 if traversed_time == 0 else chunk.size(-1) - 16000 * overlapping_time
-            content_indices = torch.cat(features_list, dim=1)
+
+        def encode_fn(waves_16k):
+            _, indices, _ = content_extractor_fn(waves_16k, [waves_16k.size(-1)] * waves_16k.size(0),
+                                                 ssl_model=self.content_extractor_wide.ssl_model)
+            return indices
+
+        # 30 s windows with 5 s overlap, encoded in batches; audio up to 30 s is a single window
+        content_indices = encode_windows(encode_fn, audio_16k_tensor)
 
         return content_indices
 
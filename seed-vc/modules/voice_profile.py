@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+
+import torch
+import torchaudio
+
+from modules.resample import resample
+
+PROFILE_VERSION = 1
+PROFILE_TENSORS = ("S_ori", "mel2", "style2", "prompt_condition", "F0_ori")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def profile_key(reference_path, fingerprint):
+    """
+    Key a voice profile by the reference audio content and the model configuration.
+
+    Args:
+        reference_path: Path to the reference audio file
+        fingerprint: JSON-serializable dict describing everything that affects the
+            profile tensors (checkpoint, config, sampling rate, f0 flag, ...)
+    """
+    h = hashlib.sha256()
+    h.update(file_digest(reference_path).encode("utf-8"))
+    h.update(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8"))
+    h.update(str(PROFILE_VERSION).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+@torch.no_grad()
+def compute_profile(ref_audio, sr, semantic_fn, campplus_model, mel_fn, length_regulator, f0_fn=None):
+    """
+    Compute the reference-side conditioning used by every conversion.
+
+    Args:
+        ref_audio: Reference waveform tensor of shape (1, samples) at ``sr``
+        sr: Sampling rate of ``ref_audio``
+        semantic_fn: Content encoder taking 16 kHz audio of shape (1, samples)
+        campplus_model: CAMPPlus speaker encoder
+        mel_fn: Mel spectrogram function matching the DiT model
+        length_regulator: The model's length regulator
+        f0_fn: F0 extractor (e.g. ``RMVPE.infer_from_audio``), or None without F0 conditioning
+
+    Returns:
+        Dict with ``S_ori``, ``mel2``, ``style2``, ``prompt_condition`` and ``F0_ori``
+    """
+    ori_waves_16k = resample(ref_audio, sr, 16000)
+    S_ori = semantic_fn(ori_waves_16k)
+    mel2 = mel_fn(ref_audio.float())
+    target2_lengths = torch.LongTensor([mel2.size(2)]).to(mel2.device)
+
+    feat2 = torchaudio.compliance.kaldi.fbank(ori_waves_16k,
+                                              num_mel_bins=80,
+                                              dither=0,
+                                              sample_frequency=16000)
+    feat2 = feat2 - feat2.mean(dim=0, keepdim=True)
+    style2 = campplus_model(feat2.unsqueeze(0))
+
+    if f0_fn is not None:
+        F0_ori = f0_fn(ori_waves_16k[0], thred=0.03, return_tensor=True).to(ref_audio.device)[None]
+    else:
+        F0_ori = None
+
+    prompt_condition = length_regulator(S_ori, ylens=target2_lengths, n_quantizers=3, f0=F0_ori)[0]
+    return {
+        "S_ori": S_ori,
+        "mel2": mel2,
+        "style2": style2,
+        "prompt_condition": prompt_condition,
+        "F0_ori": F0_ori,
+    }
+
+
+def load_profile(profile_dir, key, device):
+    path = os.path.join(profile_dir, f"{key}.pt")
+    if not os.path.exists(path):
+        return None
+    try:
+        state = torch.load(path, map_location="cpu")
+    except Exception as e:
+        print(f"Ignoring unreadable voice profile {path}: {e}")
+        return None
+    if state.get("key") != key or state.get("version") != PROFILE_VERSION:
+        return None
+    return {
+        name: state["tensors"][name].to(device) if state["tensors"].get(name) is not None else None
+        for name in PROFILE_TENSORS
+    }
+
+
+def save_profile(profile_dir, key, profile):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"{key}.pt")
+    state = {
+        "key": key,
+        "version": PROFILE_VERSION,
+        "tensors": {
+            name: profile[name].detach().cpu() if profile.get(name) is not None else None
+            for name in PROFILE_TENSORS
+        },
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_profile(profile_dir, reference_path, fingerprint, compute_fn, device):
+    """
+    Load the cached profile for ``reference_path``, computing and persisting it on a miss.
+
+    Args:
+        profile_dir: Directory holding ``<key>.pt`` profile files
+        reference_path: Path to the reference audio file
+        fingerprint: Model configuration dict, see ``profile_key``
+        compute_fn: Zero-argument callable returning a fresh profile dict
+        device: Device to place the loaded tensors on
+    """
+    key = profile_key(reference_path, fingerprint)
+    profile = load_profile(profile_dir, key, device)
+    if profile is not None:
+        print(f"Loaded voice profile {key}")
+        return profile
+    profile = compute_fn()
+    save_profile(profile_dir, key, profile)
+    print(f"Saved voice profile {key}")
+    return profile
@@ -0,0 +1,41 @@
+"""
+Length-aware forward pass of a transformers WhisperEncoder.
+
+WhisperEncoder.forward insists on 3000 mel frames (30 s), so a 3 s clip pays for
+self-attention over 1500 frames and everything past the audio is sliced off
+afterwards. ``encode_trimmed`` runs the same layers over the frames that are kept,
+with the positional embeddings sliced to match. The padding frames no longer take
+part in attention, so its output is close to, but not identical with, the
+full-window encoder.
+"""
+import torch
+import torch.nn.functional as F
+
+# 16 kHz samples and Whisper mel frames per encoder output frame
+SAMPLES_PER_FRAME = 320
+MEL_FRAMES_PER_FRAME = 2
+
+
+def encoder_frames(num_samples, max_frames=1500):
+    """Number of encoder frames the content features keep for ``num_samples`` of 16 kHz audio."""
+    return min(num_samples // SAMPLES_PER_FRAME + 1, max_frames)
+
+
+@torch.no_grad()
+def encode_trimmed(encoder, input_features, num_frames):
+    """
+    Args:
+        encoder: transformers WhisperEncoder, optionally with int8 quantized layers
+        input_features: (B, n_mels, 3000) features from the Whisper feature extractor
+        num_frames: Number of encoder frames to compute, see ``encoder_frames``
+
+    Returns:
+        (B, num_frames, d_model) last hidden state
+    """
+    input_features = input_features[..., :MEL_FRAMES_PER_FRAME * num_frames].to(encoder.conv1.weight.dtype)
+    hidden_states = F.gelu(encoder.conv1(input_features))
+    hidden_states = F.gelu(encoder.conv2(hidden_states)).permute(0, 2, 1)
+    hidden_states = hidden_states + encoder.embed_positions.weight[:hidden_states.size(1)]
+    for layer in encoder.layers:
+        hidden_states = layer(hidden_states, None, layer_head_mask=None)[0]
+    return encoder.layer_norm(hidden_states)
@@ -13,17 +13,18 @@ now_dir = os.getcwd()
 sys.path.append(now_dir)
 import multiprocessing
 import warnings
-import yaml
 
 warnings.simplefilter("ignore")
 
 from tqdm import tqdm
 from modules.commons import *
 import librosa
-import torchaudio
-import torchaudio.compliance.kaldi as kaldi
 
-from hf_utils import load_custom_model_from_hf
+from modules.model_registry import REALTIME_DIT, dit_paths, get_registry
+from modules.precision import format_policy
+from modules.resample import StreamResampler
+from modules.ring_buffer import RingBuffer
+from modules.voice_profile import compute_profile, get_profile
 
 import os
 import sys
@@ -40,6 +41,7 @@ reference_wav_name = ""
 prompt_len = 3  # in seconds
 ce_dit_difference = 2.0  # 2 seconds
 fp16 = False
+model_fingerprint = {}
 @torch.no_grad()
 def custom_infer(model_set,
                  reference_wav,
@@ -53,6 +55,7 @@ def custom_infer(model_set,
                  inference_cfg_rate,
                  max_prompt_length,
                  cd_difference=2.0,
+                 profile_dir=None,
                  ):
     global prompt_condition, mel2, style2
     global reference_wav_name
@@ -77,19 +80,20 @@ def custom_infer(model_set,
         reference_wav = reference_wav[:int(sr * prompt_len)]
         reference_wav_tensor = torch.from_numpy(reference_wav).to(device)
 
-        ori_waves_16k = torchaudio.functional.resample(reference_wav_tensor, sr, 16000)
-        S_ori = semantic_fn(ori_waves_16k.unsqueeze(0))
-        feat2 = torchaudio.compliance.kaldi.fbank(
-            ori_waves_16k.unsqueeze(0), num_mel_bins=80, dither=0, sample_frequency=16000
-        )
-        feat2 = feat2 - feat2.mean(dim=0, keepdim=True)
-        style2 = campplus_model(feat2.unsqueeze(0))
+        def compute():
+            return compute_profile(
+                reference_wav_tensor.unsqueeze(0), sr, semantic_fn, campplus_model, to_mel,
+                model.length_regulator, f0_fn=None
+            )
 
-        mel2 = to_mel(reference_wav_tensor.unsqueeze(0))
-        target2_lengths = torch.LongTensor([mel2.size(2)]).to(mel2.device)
-        prompt_condition = model.length_regulator(
-            S_ori, ylens=target2_lengths, n_quantizers=3, f0=None
-        )[0]
+        if profile_dir:
+            fingerprint = dict(model_fingerprint, max_prompt_length=prompt_len)
+            profile = get_profile(profile_dir, new_reference_wav_name, fingerprint, compute, device)
+        else:
+            profile = compute()
+        mel2 = profile["mel2"]
+        style2 = profile["style2"]
+        prompt_condition = profile["prompt_condition"]
 
         reference_wav_name = new_reference_wav_name
 
@@ -141,184 +145,19 @@ def custom_infer(model_set,
     return output
 
 def load_models(args):
-    global fp16
+    global fp16, model_fingerprint
     fp16 = args.fp16
     print(f"Using fp16: {fp16}")
-    if args.checkpoint_path is None or args.checkpoint_path == "":
-        dit_checkpoint_path, dit_config_path = load_custom_model_from_hf("Plachta/Seed-VC",
-                                                                         "DiT_uvit_tat_xlsr_ema.pth",
-                                                                         "config_dit_mel_seed_uvit_xlsr_tiny.yml")
-    else:
-        dit_checkpoint_path = args.checkpoint_path
-        dit_config_path = args.config_path
-    config = yaml.safe_load(open(dit_config_path, "r"))
-    model_params = recursive_munch(config["model_params"])
-    model_params.dit_type = 'DiT'
-    model = build_model(model_params, stage="DiT")
-    hop_length = config["preprocess_params"]["spect_params"]["hop_length"]
-    sr = config["preprocess_params"]["sr"]
-
-    # Load checkpoints
-    model, _, _, _ = load_checkpoint(
-        model,
-        None,
-        dit_checkpoint_path,
-        load_only_params=True,
-        ignore_modules=[],
-        is_distributed=False,
-    )
-    for key in model:
-        model[key].eval()
-        model[key].to(device)
-    model.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
-
-    # Load additional modules
-    from modules.campplus.DTDNN import CAMPPlus
-
-    campplus_ckpt_path = load_custom_model_from_hf(
-        "funasr/campplus", "campplus_cn_common.bin", config_filename=None
-    )
-    campplus_model = CAMPPlus(feat_dim=80, embedding_size=192)
-    campplus_model.load_state_dict(torch.load(campplus_ckpt_path, map_location="cpu"))
-    campplus_model.eval()
-    campplus_model.to(device)
-
-    vocoder_type = model_params.vocoder.type
-
-    if vocoder_type == 'bigvgan':
-        from modules.bigvgan import bigvgan
-        bigvgan_name = model_params.vocoder.name
-        bigvgan_model = bigvgan.BigVGAN.from_pretrained(bigvgan_name, use_cuda_kernel=False)
-        # remove weight norm in the model and set to eval mode
-        bigvgan_model.remove_weight_norm()
-        bigvgan_model = bigvgan_model.eval().to(device)
-        vocoder_fn = bigvgan_model
-    elif vocoder_type == 'hifigan':
-        from modules.hifigan.generator import HiFTGenerator
-        from modules.hifigan.f0_predictor import ConvRNNF0Predictor
-        hift_config = yaml.safe_load(open('configs/hifigan.yml', 'r'))
-        hift_gen = HiFTGenerator(**hift_config['hift'], f0_predictor=ConvRNNF0Predictor(**hift_config['f0_predictor']))
-        hift_path = load_custom_model_from_hf("FunAudioLLM/CosyVoice-300M", 'hift.pt', None)
-        hift_gen.load_state_dict(torch.load(hift_path, map_location='cpu'))
-        hift_gen.eval()
-        hift_gen.to(device)
-        vocoder_fn = hift_gen
-    elif vocoder_type == "vocos":
-        vocos_config = yaml.safe_load(open(model_params.vocoder.vocos.config, 'r'))
-        vocos_path = model_params.vocoder.vocos.path
-        vocos_model_params = recursive_munch(vocos_config['model_params'])
-        vocos = build_model(vocos_model_params, stage='mel_vocos')
-        vocos_checkpoint_path = vocos_path
-        vocos, _, _, _ = load_checkpoint(vocos, None, vocos_checkpoint_path,
-                                         load_only_params=True, ignore_modules=[], is_distributed=False)
-        _ = [vocos[key].eval().to(device) for key in vocos]
-        _ = [vocos[key].to(device) for key in vocos]
-        total_params = sum(sum(p.numel() for p in vocos[key].parameters() if p.requires_grad) for key in vocos.keys())
-        print(f"Vocoder model total parameters: {total_params / 1_000_000:.2f}M")
-        vocoder_fn = vocos.decoder
-    else:
-        raise ValueError(f"Unknown vocoder type: {vocoder_type}")
-
-    speech_tokenizer_type = model_params.speech_tokenizer.type
-    if speech_tokenizer_type == 'whisper':
-        # whisper
-        from transformers import AutoFeatureExtractor, WhisperModel
-        whisper_name = model_params.speech_tokenizer.name
-        whisper_model = WhisperModel.from_pretrained(whisper_name, torch_dtype=torch.float16).to(device)
-        del whisper_model.decoder
-        whisper_feature_extractor = AutoFeatureExtractor.from_pretrained(whisper_name)
-
-        def semantic_fn(waves_16k):
-            ori_inputs = whisper_feature_extractor([waves_16k.squeeze(0).cpu().numpy()],
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True)
-            ori_input_features = whisper_model._mask_input_features(
-                ori_inputs.input_features, attention_mask=ori_inputs.attention_mask).to(device)
-            with torch.no_grad():
-                ori_outputs = whisper_model.encoder(
-                    ori_input_features.to(whisper_model.encoder.dtype),
-                    head_mask=None,
-                    output_attentions=False,
-                    output_hidden_states=False,
-                    return_dict=True,
-                )
-            S_ori = ori_outputs.last_hidden_state.to(torch.float32)
-            S_ori = S_ori[:, :waves_16k.size(-1) // 320 + 1]
-            return S_ori
-    elif speech_tokenizer_type == 'cnhubert':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            HubertModel,
-        )
-        hubert_model_name = config['model_params']['speech_tokenizer']['name']
-        hubert_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(hubert_model_name)
-        hubert_model = HubertModel.from_pretrained(hubert_model_name)
-        hubert_model = hubert_model.to(device)
-        hubert_model = hubert_model.eval()
-        hubert_model = hubert_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = hubert_feature_extractor(ori_waves_16k_input_list,
-                                                  return_tensors="pt",
-                                                  return_attention_mask=True,
-                                                  padding=True,
-                                                  sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = hubert_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    elif speech_tokenizer_type == 'xlsr':
-        from transformers import (
-            Wav2Vec2FeatureExtractor,
-            Wav2Vec2Model,
-        )
-        model_name = config['model_params']['speech_tokenizer']['name']
-        output_layer = config['model_params']['speech_tokenizer']['output_layer']
-        wav2vec_feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-        wav2vec_model = Wav2Vec2Model.from_pretrained(model_name)
-        wav2vec_model.encoder.layers = wav2vec_model.encoder.layers[:output_layer]
-        wav2vec_model = wav2vec_model.to(device)
-        wav2vec_model = wav2vec_model.eval()
-        wav2vec_model = wav2vec_model.half()
-
-        def semantic_fn(waves_16k):
-            ori_waves_16k_input_list = [
-                waves_16k[bib].cpu().numpy()
-                for bib in range(len(waves_16k))
-            ]
-            ori_inputs = wav2vec_feature_extractor(ori_waves_16k_input_list,
-                                                   return_tensors="pt",
-                                                   return_attention_mask=True,
-                                                   padding=True,
-                                                   sampling_rate=16000).to(device)
-            with torch.no_grad():
-                ori_outputs = wav2vec_model(
-                    ori_inputs.input_values.half(),
-                )
-            S_ori = ori_outputs.last_hidden_state.float()
-            return S_ori
-    else:
-        raise ValueError(f"Unknown speech tokenizer type: {speech_tokenizer_type}")
-    # Generate mel spectrograms
-    mel_fn_args = {
-        "n_fft": config['preprocess_params']['spect_params']['n_fft'],
-        "win_size": config['preprocess_params']['spect_params']['win_length'],
-        "hop_size": config['preprocess_params']['spect_params']['hop_length'],
-        "num_mels": config['preprocess_params']['spect_params']['n_mels'],
-        "sampling_rate": sr,
-        "fmin": config['preprocess_params']['spect_params'].get('fmin', 0),
-        "fmax": None if config['preprocess_params']['spect_params'].get('fmax', "None") == "None" else 8000,
-        "center": False
+    registry = get_registry(device)
+    dit_checkpoint_path, dit_config_path = dit_paths(REALTIME_DIT, args.checkpoint_path, args.config_path, bundle=registry.bundle)
+    model, semantic_fn, _, vocoder_fn, campplus_model, to_mel, mel_fn_args = registry.model_set(
+        dit_checkpoint_path, dit_config_path)
+    model_fingerprint = {
+        "checkpoint": dit_checkpoint_path,
+        "config": dit_config_path,
+        "mel_fn_args": mel_fn_args,
+        "precision": format_policy(registry.precision),
     }
-    from modules.audio import mel_spectrogram
-
-    to_mel = lambda x: mel_spectrogram(x, **mel_fn_args)
 
     return (
         model,
@@ -395,6 +234,7 @@ if __name__ == "__main__":
             self.output_devices_indices = None
             self.stream = None
             self.model_set = load_models(args)
+            self.profile_dir = args.profile_dir
             from funasr import AutoModel
             self.vad_model = AutoModel(model="fsmn-vad", model_revision="v2.0.4")
             self.update_devices()
@@ -859,27 +699,25 @@ if __name__ == "__main__":
                     )
                     * self.zc
             )
-            self.input_wav: torch.Tensor = torch.zeros(
+            # input history, written one block at a time; view() is the model input without a copy
+            self.input_wav = RingBuffer(
                 self.extra_frame
                 + self.crossfade_frame
                 + self.sola_search_frame
                 + self.block_frame
                 + self.extra_frame_right,
                 device=self.config.device,
-                dtype=torch.float32,
             )  # 2 * 44100 + 0.08 * 44100 + 0.01 * 44100 + 0.25 * 44100
-            self.input_wav_denoise: torch.Tensor = self.input_wav.clone()
-            self.input_wav_res: torch.Tensor = torch.zeros(
-                320 * self.input_wav.shape[0] // self.zc,
+            self.input_wav_denoise: torch.Tensor = self.input_wav.view().clone()
+            self.input_wav_res = RingBuffer(
+                320 * self.input_wav.size // self.zc,
                 device=self.config.device,
-                dtype=torch.float32,
             )  # input wave 44100 -> 16000
             self.rms_buffer: np.ndarray = np.zeros(4 * self.zc, dtype="float32")
             self.sola_buffer: torch.Tensor = torch.zeros(
                 self.sola_buffer_frame, device=self.config.device, dtype=torch.float32
             )
             self.nr_buffer: torch.Tensor = self.sola_buffer.clone()
-            self.output_buffer: torch.Tensor = self.input_wav.clone()
             self.skip_head = self.extra_frame // self.zc
             self.skip_tail = self.extra_frame_right // self.zc
             self.return_length = (
@@ -900,11 +738,9 @@ if __name__ == "__main__":
                 ** 2
             )
             self.fade_out_window: torch.Tensor = 1 - self.fade_in_window
-            self.resampler = tat.Resample(
-                orig_freq=self.gui_config.samplerate,
-                new_freq=16000,
-                dtype=torch.float32,
-            ).to(self.config.device)
+            # 16 kHz input for the content encoder and for VAD, carrying filter history across blocks
+            self.resampler = StreamResampler(self.gui_config.samplerate, 16000, device=self.config.device)
+            self.resampler_pending = 0
             if self.model_set[-1]["sampling_rate"] != self.gui_config.samplerate:
                 self.resampler2 = tat.Resample(
                     orig_freq=self.model_set[-1]["sampling_rate"],
@@ -959,6 +795,9 @@ if __name__ == "__main__":
             print(indata.shape)
             start_time = time.perf_counter()
             indata = librosa.to_mono(indata.T)
+            block = torch.from_numpy(indata).to(self.config.device)
+            # one 16 kHz conversion per block, shared by VAD and the content encoder
+            final = self.resampler.push(block)
 
             # VAD first
             if device.type == "mps":
@@ -970,7 +809,7 @@ if __name__ == "__main__":
                 end_event = torch.cuda.Event(enable_timing=True)
                 torch.cuda.synchronize()
             start_event.record()
-            indata_16k = librosa.resample(indata, orig_sr=self.gui_config.samplerate, target_sr=16000)
+            indata_16k = final.cpu().numpy()
             res = self.vad_model.generate(input=indata_16k, cache=self.vad_cache, is_final=False, chunk_size=self.vad_chunk_size)
             res_value = res[0]["value"]
             print(res_value)
@@ -1000,21 +839,12 @@ if __name__ == "__main__":
             #         if db_threhold[i]:
             #             indata[i * self.zc : (i + 1) * self.zc] = 0
             #     indata = indata[self.zc // 2 :]
-            self.input_wav[: -self.block_frame] = self.input_wav[
-                self.block_frame :
-            ].clone()
-            self.input_wav[-indata.shape[0] :] = torch.from_numpy(indata).to(
-                self.config.device
-            )
-            self.input_wav_res[: -self.block_frame_16k] = self.input_wav_res[
-                self.block_frame_16k :
-            ].clone()
-            self.input_wav_res[-320 * (indata.shape[0] // self.zc + 1) :] = (
-                # self.resampler(self.input_wav[-indata.shape[0] - 2 * self.zc :])[
-                #     320:
-                # ]
-                torch.from_numpy(librosa.resample(self.input_wav[-indata.shape[0] - 2 * self.zc :].cpu().numpy(), orig_sr=self.gui_config.samplerate, target_sr=16000)[320:])
-            )
+            self.input_wav.push(block)
+            # the last block's provisional tail (filtered as if the input ended there) is
+            # replaced by the final samples; only the new block went through the filter
+            provisional = self.resampler.pending()
+            self.input_wav_res.push(torch.cat([final, provisional]), overwrite=self.resampler_pending)
+            self.resampler_pending = provisional.shape[0]
             print(f"preprocess time: {time.perf_counter() - start_time:.2f}")
             # infer
             if self.function == "vc":
@@ -1033,7 +863,7 @@ if __name__ == "__main__":
                     self.model_set,
                     self.reference_wav,
                     self.gui_config.reference_audio_path,
-                    self.input_wav_res,
+                    self.input_wav_res.view(),
                     self.block_frame_16k,
                     self.skip_head,
                     self.skip_tail,
@@ -1042,6 +872,7 @@ if __name__ == "__main__":
                     self.gui_config.inference_cfg_rate,
                     self.gui_config.max_prompt_length,
                     self.gui_config.extra_time_ce - self.gui_config.extra_time,
+                    profile_dir=self.profile_dir,
                 )
                 if self.resampler2 is not None:
                     infer_wav = self.resampler2(infer_wav)
@@ -1053,11 +884,12 @@ if __name__ == "__main__":
                 elapsed_time_ms = start_event.elapsed_time(end_event)
                 print(f"Time taken for VC: {elapsed_time_ms}ms")
                 if not self.vad_speech_detected:
-                    infer_wav = torch.zeros_like(self.input_wav[self.extra_frame :])
+                    infer_wav = torch.zeros_like(self.input_wav.view()[self.extra_frame :])
             elif self.gui_config.I_noise_reduce:
                 infer_wav = self.input_wav_denoise[self.extra_frame :].clone()
             else:
-                infer_wav = self.input_wav[self.extra_frame :].clone()
+                # SOLA below edits infer_wav in place, so passthrough copies the history
+                infer_wav = self.input_wav.view()[self.extra_frame :].clone()
 
             # SOLA algorithm from https://github.com/yxlllc/DDSP-SVC
             conv_input = infer_wav[
@@ -1094,13 +926,8 @@ if __name__ == "__main__":
             self.sola_buffer[:] = infer_wav[
                 self.block_frame : self.block_frame + self.sola_buffer_frame
             ]
-            outdata[:] = (
-                infer_wav[: self.block_frame]
-                .repeat(self.gui_config.channels, 1)
-                .t()
-                .cpu()
-                .numpy()
-            )
+            # broadcast the mono block over the output channels
+            outdata[:] = infer_wav[: self.block_frame].cpu().numpy()[:, None]
 
             total_time = time.perf_counter() - start_time
             if flag_vc:
@@ -1178,6 +1005,7 @@ if __name__ == "__main__":
     parser.add_argument("--config-path", type=str, default=None, help="Path to the vocoder checkpoint")
     parser.add_argument("--fp16", type=str2bool, nargs="?", const=True, help="Whether to use fp16", default=True)
     parser.add_argument("--gpu", type=int, help="Which GPU id to use", default=0)
+    parser.add_argument("--profile-dir", type=str, default=None, help="Directory for cached reference voice profiles")
     args = parser.parse_args()
     cuda_target = f"cuda:{args.gpu}" if args.gpu else "cuda" 
 
@@ -1,21 +1,22 @@
 import torch
-import torchaudio
 import librosa
 import numpy as np
 from pydub import AudioSegment
-import yaml
-from modules.commons import build_model, load_checkpoint, recursive_munch
-from hf_utils import load_custom_model_from_hf
-from modules.campplus.DTDNN import CAMPPlus
-from modules.bigvgan import bigvgan
-from modules.audio import mel_spectrogram
-from modules.rmvpe import RMVPE
-from transformers import AutoFeatureExtractor, WhisperModel
+from modules.precision import format_policy
+from modules.model_registry import BASE_DIT, F0_DIT, dit_paths, get_mel_fn_args, get_registry
+from modules.voice_profile import compute_profile, get_profile
+from modules.content_windows import encode_windows
+from modules.resample import resample
+from modules.whisper_encoder import encode_trimmed, encoder_frames
+
+# The wrapper uses the first F0 fine-tune rather than the v2 one in F0_DIT
+WRAPPER_F0_DIT = ("DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema.pth", F0_DIT[1])
+WHISPER_NAME = "openai/whisper-small"
 
 class SeedVCWrapper:
     def __init__(self, device=None):
         """
-        Initialize the Seed-VC wrapper with all necessary models and configurations.
+        Initialize the Seed-VC wrapper. Models are loaded lazily on first use.
         
         Args:
             device: torch device to use. If None, will be automatically determined.
@@ -31,119 +32,78 @@ class SeedVCWrapper:
         else:
             self.device = device
             
-        # Load base model and configuration
-        self._load_base_model()
-        
-        # Load F0 conditioned model
-        self._load_f0_model()
-        
-        # Load additional modules
-        self._load_additional_modules()
-        
+        # Models are loaded through the shared registry on first use, so a wrapper that
+        # only ever converts without F0 never loads the 44k DiT, BigVGAN or RMVPE
+        self.registry = get_registry(self.device)
+        self._dit_paths = {}
+
         # Set streaming parameters
         self.overlap_frame_len = 16
         self.bitrate = "320k"
-        
-    def _load_base_model(self):
-        """Load the base DiT model for voice conversion."""
-        dit_checkpoint_path, dit_config_path = load_custom_model_from_hf(
-            "Plachta/Seed-VC",
-            "DiT_seed_v2_uvit_whisper_small_wavenet_bigvgan_pruned.pth",
-            "config_dit_mel_seed_uvit_whisper_small_wavenet.yml"
-        )
-        config = yaml.safe_load(open(dit_config_path, 'r'))
-        model_params = recursive_munch(config['model_params'])
-        self.model = build_model(model_params, stage='DiT')
-        self.hop_length = config['preprocess_params']['spect_params']['hop_length']
-        self.sr = config['preprocess_params']['sr']
-        
-        # Load checkpoints
-        self.model, _, _, _ = load_checkpoint(
-            self.model, None, dit_checkpoint_path,
-            load_only_params=True, ignore_modules=[], is_distributed=False
-        )
-        for key in self.model:
-            self.model[key].eval()
-            self.model[key].to(self.device)
-        self.model.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
-        
-        # Set up mel spectrogram function
-        mel_fn_args = {
-            "n_fft": config['preprocess_params']['spect_params']['n_fft'],
-            "win_size": config['preprocess_params']['spect_params']['win_length'],
-            "hop_size": config['preprocess_params']['spect_params']['hop_length'],
-            "num_mels": config['preprocess_params']['spect_params']['n_mels'],
-            "sampling_rate": self.sr,
-            "fmin": 0,
-            "fmax": None,
-            "center": False
-        }
-        self.to_mel = lambda x: mel_spectrogram(x, **mel_fn_args)
-        
-        # Load whisper model
-        whisper_name = model_params.speech_tokenizer.whisper_name if hasattr(model_params.speech_tokenizer, 'whisper_name') else "openai/whisper-small"
-        self.whisper_model = WhisperModel.from_pretrained(whisper_name, torch_dtype=torch.float16).to(self.device)
-        del self.whisper_model.decoder
-        self.whisper_feature_extractor = AutoFeatureExtractor.from_pretrained(whisper_name)
-        
-    def _load_f0_model(self):
-        """Load the F0 conditioned model for voice conversion."""
-        dit_checkpoint_path, dit_config_path = load_custom_model_from_hf(
-            "Plachta/Seed-VC",
-            "DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema.pth",
-            "config_dit_mel_seed_uvit_whisper_base_f0_44k.yml"
-        )
-        config = yaml.safe_load(open(dit_config_path, 'r'))
-        model_params = recursive_munch(config['model_params'])
-        self.model_f0 = build_model(model_params, stage='DiT')
-        self.hop_length_f0 = config['preprocess_params']['spect_params']['hop_length']
-        self.sr_f0 = config['preprocess_params']['sr']
-        
-        # Load checkpoints
-        self.model_f0, _, _, _ = load_checkpoint(
-            self.model_f0, None, dit_checkpoint_path,
-            load_only_params=True, ignore_modules=[], is_distributed=False
-        )
-        for key in self.model_f0:
-            self.model_f0[key].eval()
-            self.model_f0[key].to(self.device)
-        self.model_f0.cfm.estimator.setup_caches(max_batch_size=1, max_seq_length=8192)
-        
-        # Set up mel spectrogram function for F0 model
-        mel_fn_args_f0 = {
-            "n_fft": config['preprocess_params']['spect_params']['n_fft'],
-            "win_size": config['preprocess_params']['spect_params']['win_length'],
-            "hop_size": config['preprocess_params']['spect_params']['hop_length'],
-            "num_mels": config['preprocess_params']['spect_params']['n_mels'],
-            "sampling_rate": self.sr_f0,
-            "fmin": 0,
-            "fmax": None,
-            "center": False
-        }
-        self.to_mel_f0 = lambda x: mel_spectrogram(x, **mel_fn_args_f0)
-        
-    def _load_additional_modules(self):
-        """Load additional modules like CAMPPlus, BigVGAN, and RMVPE."""
-        # Load CAMPPlus
-        campplus_ckpt_path = load_custom_model_from_hf("funasr/campplus", "campplus_cn_common.bin", config_filename=None)
-        self.campplus_model = CAMPPlus(feat_dim=80, embedding_size=192)
-        self.campplus_model.load_state_dict(torch.load(campplus_ckpt_path, map_location="cpu"))
-        self.campplus_model.eval()
-        self.campplus_model.to(self.device)
-        
-        # Load BigVGAN models
-        self.bigvgan_model = bigvgan.BigVGAN.from_pretrained('nvidia/bigvgan_v2_22khz_80band_256x', use_cuda_kernel=False)
-        self.bigvgan_model.remove_weight_norm()
-        self.bigvgan_model = self.bigvgan_model.eval().to(self.device)
-        
-        self.bigvgan_44k_model = bigvgan.BigVGAN.from_pretrained('nvidia/bigvgan_v2_44khz_128band_512x', use_cuda_kernel=False)
-        self.bigvgan_44k_model.remove_weight_norm()
-        self.bigvgan_44k_model = self.bigvgan_44k_model.eval().to(self.device)
-        
-        # Load RMVPE for F0 extraction
-        model_path = load_custom_model_from_hf("lj1995/VoiceConversionWebUI", "rmvpe.pt", None)
-        self.rmvpe = RMVPE(model_path, is_half=False, device=self.device)
-        
+
+    def _dit(self, f0_condition):
+        """Return ``(model, config)`` of the base or F0 conditioned DiT, loading it on first use."""
+        if f0_condition not in self._dit_paths:
+            self._dit_paths[f0_condition] = dit_paths(WRAPPER_F0_DIT if f0_condition else BASE_DIT,
+                                                      bundle=self.registry.bundle)
+        return self.registry.dit(*self._dit_paths[f0_condition])
+
+    @property
+    def model(self):
+        return self._dit(False)[0]
+
+    @property
+    def model_f0(self):
+        return self._dit(True)[0]
+
+    @property
+    def sr(self):
+        return self._dit(False)[1]['preprocess_params']['sr']
+
+    @property
+    def hop_length(self):
+        return self._dit(False)[1]['preprocess_params']['spect_params']['hop_length']
+
+    @property
+    def sr_f0(self):
+        return self._dit(True)[1]['preprocess_params']['sr']
+
+    @property
+    def hop_length_f0(self):
+        return self._dit(True)[1]['preprocess_params']['spect_params']['hop_length']
+
+    @property
+    def to_mel(self):
+        return self.registry.mel_frontend(get_mel_fn_args(self._dit(False)[1]))
+
+    @property
+    def to_mel_f0(self):
+        return self.registry.mel_frontend(get_mel_fn_args(self._dit(True)[1]))
+
+    @property
+    def whisper_model(self):
+        return self.registry.whisper(WHISPER_NAME)[0]
+
+    @property
+    def whisper_feature_extractor(self):
+        return self.registry.whisper(WHISPER_NAME)[1]
+
+    @property
+    def campplus_model(self):
+        return self.registry.campplus()
+
+    @property
+    def bigvgan_model(self):
+        return self.registry.bigvgan('nvidia/bigvgan_v2_22khz_80band_256x')
+
+    @property
+    def bigvgan_44k_model(self):
+        return self.registry.bigvgan('nvidia/bigvgan_v2_44khz_128band_512x')
+
+    @property
+    def rmvpe(self):
+        return self.registry.rmvpe()
+
     @staticmethod
     def adjust_f0_semitones(f0_sequence, n_semitones):
         """Adjust F0 values by a number of semitones."""
@@ -247,75 +207,81 @@ class SeedVCWrapper:
                 
         return processed_frames, previous_chunk, False, mp3_bytes, full_audio
 
+    def _encode_whisper_window(self, audio_16k):
+        """Whisper features of a (B, samples) batch of at most 30 s of 16 kHz audio, one frame per 320 samples."""
+        inputs = self.whisper_feature_extractor(
+            [wave.cpu().numpy() for wave in audio_16k],
+            return_tensors="pt",
+            return_attention_mask=True,
+            sampling_rate=16000
+        )
+        input_features = self.whisper_model._mask_input_features(
+            inputs.input_features, attention_mask=inputs.attention_mask
+        ).to(self.device)
+        if self.registry.whisper_trim:
+            return encode_trimmed(self.whisper_model.encoder, input_features,
+                                  encoder_frames(audio_16k.size(-1))).to(torch.float32)
+        outputs = self.whisper_model.encoder(
+            input_features.to(self.whisper_model.encoder.dtype),
+            head_mask=None,
+            output_attentions=False,
+            output_hidden_states=False,
+            return_dict=True,
+        )
+        features = outputs.last_hidden_state.to(torch.float32)
+        return features[:, :audio_16k.size(-1) // 320 + 1]
+
     def _process_whisper_features(self, audio_16k, is_source=True):
         """Process audio through Whisper model to extract features."""
-        if audio_16k.size(-1) <= 16000 * 30:
-            # If audio is short enough, process in one go
-            inputs = self.whisper_feature_extractor(
-                [audio_16k.squeeze(0).cpu().numpy()],
-                return_tensors="pt",
-                return_attention_mask=True,
-                sampling_rate=16000
-            )
-            input_features = self.whisper_model._mask_input_features(
-                inputs.input_features, attention_mask=inputs.attention_mask
-            ).to(self.device)
-            outputs = self.whisper_model.encoder(
-                input_features.to(self.whisper_model.encoder.dtype),
-                head_mask=None,
-                output_attentions=False,
-                output_hidden_states=False,
-                return_dict=True,
-            )
-            features = outputs.last_hidden_state.to(torch.float32)
-            features = features[:, :audio_16k.size(-1) // 320 + 1]
-        else:
-            # Process long audio in chunks
-            overlapping_time = 5  # 5 seconds
-            features_list = []
-            buffer = None
-            traversed_time = 0
-            while traversed_time < audio_16k.size(-1):
-                if buffer is None:  # first chunk
-                    chunk = audio_16k[:, traversed_time:traversed_time + 16000 * 30]
-                else:
-                    chunk = torch.cat([
-                        buffer, 
-                        audio_16k[:, traversed_time:traversed_time + 16000 * (30 - overlapping_time)]
-                    ], dim=-1)
-                inputs = self.whisper_feature_extractor(
-                    [chunk.squeeze(0).cpu().numpy()],
-                    return_tensors="pt",
-                    return_attention_mask=True,
-                    sampling_rate=16000
-                )
-                input_features = self.whisper_model._mask_input_features(
-                    inputs.input_features, attention_mask=inputs.attention_mask
-                ).to(self.device)
-                outputs = self.whisper_model.encoder(
-                    input_features.to(self.whisper_model.encoder.dtype),
-                    head_mask=None,
-                    output_attentions=False,
-                    output_hidden_states=False,
-                    return_dict=True,
-                )
-                chunk_features = outputs.last_hidden_state.to(torch.float32)
-                chunk_features = chunk_features[:, :chunk.size(-1) // 320 + 1]
-                if traversed_time == 0:
-                    features_list.append(chunk_features)
-                else:
-                    features_list.append(chunk_features[:, 50 * overlapping_time:])
-                buffer = chunk[:, -16000 * overlapping_time:]
-                traversed_time += 30 * 16000 if traversed_time == 0 else chunk.size(-1) - 16000 * overlapping_time
-            features = torch.cat(features_list, dim=1)
-        
+        # 30 s windows with 5 s overlap, encoded in batches; audio up to 30 s is a single window
+        features = encode_windows(self._encode_whisper_window, audio_16k)
         return features
     
+    def _get_reference_profile(self, target, f0_condition, profile_dir=None):
+        """
+        Compute (or load from ``profile_dir``) the reference-side tensors for a target voice.
+
+        Args:
+            target: Path to target audio file
+            f0_condition: Whether the F0 conditioned model is used
+            profile_dir: Directory of cached voice profiles, or None to always recompute
+
+        Returns:
+            Dict with ``S_ori``, ``mel2``, ``style2``, ``prompt_condition`` and ``F0_ori``
+        """
+        inference_module = self.model if not f0_condition else self.model_f0
+        mel_fn = self.to_mel if not f0_condition else self.to_mel_f0
+        sr = 22050 if not f0_condition else 44100
+
+        def compute():
+            ref_audio = librosa.load(target, sr=sr)[0]
+            ref_audio = torch.tensor(ref_audio[:sr * 25]).unsqueeze(0).float().to(self.device)
+            return compute_profile(
+                ref_audio, sr,
+                lambda waves_16k: self._process_whisper_features(waves_16k, is_source=False),
+                self.campplus_model, mel_fn, inference_module.length_regulator,
+                f0_fn=self.rmvpe.infer_from_audio if f0_condition else None
+            )
+
+        if profile_dir is None:
+            return compute()
+        fingerprint = {
+            "wrapper": "SeedVCWrapper",
+            "f0_condition": bool(f0_condition),
+            "sr": sr,
+            "max_reference_seconds": 25,
+        }
+        fingerprint["precision"] = format_policy(self.registry.precision)
+        if self.registry.whisper_trim:
+            fingerprint["whisper_trim"] = True
+        return get_profile(profile_dir, target, fingerprint, compute, self.device)
+
     @torch.no_grad()
     @torch.inference_mode()
     def convert_voice(self, source, target, diffusion_steps=10, length_adjust=1.0,
                      inference_cfg_rate=0.7, f0_condition=False, auto_f0_adjust=True, 
-                     pitch_shift=0, stream_output=True):
+                     pitch_shift=0, stream_output=True, profile_dir=None,
+                     cfg_interval=(0.0, 1.0), cfg_reuse=1, chunk_batch_size=1):
         """
         Convert both timbre and voice from source to target.
         
@@ -329,6 +295,10 @@ class SeedVCWrapper:
             auto_f0_adjust: Whether to automatically adjust F0 (default: True)
             pitch_shift: Pitch shift in semitones (default: 0)
             stream_output: Whether to stream the output (default: True)
+            profile_dir: Directory of cached reference voice profiles (default: None)
+            cfg_interval: (start, end) range of diffusion time where CFG is applied (default: (0.0, 1.0))
+            cfg_reuse: Diffusion steps sharing one unconditional prediction (default: 1, no reuse)
+            chunk_batch_size: Chunks of a long source converted in one batched diffusion call (default: 1)
             
         Returns:
             If stream_output is True, yields (mp3_bytes, full_audio) tuples
@@ -345,49 +315,30 @@ class SeedVCWrapper:
         
         # Load audio
         source_audio = librosa.load(source, sr=sr)[0]
-        ref_audio = librosa.load(target, sr=sr)[0]
         
         # Process audio
         source_audio = torch.tensor(source_audio).unsqueeze(0).float().to(self.device)
-        ref_audio = torch.tensor(ref_audio[:sr * 25]).unsqueeze(0).float().to(self.device)
+        
+        # Reference-side features (Whisper, mel, CAMPPlus style, F0), cached per reference
+        profile = self._get_reference_profile(target, f0_condition, profile_dir)
+        mel2 = profile["mel2"]
+        style2 = profile["style2"]
+        prompt_condition = profile["prompt_condition"]
+        F0_ori = profile["F0_ori"]
         
         # Resample to 16kHz for feature extraction
-        ref_waves_16k = torchaudio.functional.resample(ref_audio, sr, 16000)
-        converted_waves_16k = torchaudio.functional.resample(source_audio, sr, 16000)
+        converted_waves_16k = resample(source_audio, sr, 16000)
         
         # Extract Whisper features
         S_alt = self._process_whisper_features(converted_waves_16k, is_source=True)
-        S_ori = self._process_whisper_features(ref_waves_16k, is_source=False)
-        
-        # Compute mel spectrograms
-        mel = mel_fn(source_audio.to(self.device).float())
-        mel2 = mel_fn(ref_audio.to(self.device).float())
-        
-        # Set target lengths
-        target_lengths = torch.LongTensor([int(mel.size(2) * length_adjust)]).to(mel.device)
-        target2_lengths = torch.LongTensor([mel2.size(2)]).to(mel2.device)
         
-        # Compute style features
-        feat2 = torchaudio.compliance.kaldi.fbank(
-            ref_waves_16k,
-            num_mel_bins=80,
-            dither=0,
-            sample_frequency=16000
-        )
-        feat2 = feat2 - feat2.mean(dim=0, keepdim=True)
-        style2 = self.campplus_model(feat2.unsqueeze(0))
+        # Set target lengths from the source mel length
+        target_lengths = torch.LongTensor([int(mel_fn.num_frames(source_audio.size(-1)) * length_adjust)]).to(self.device)
         
         # Process F0 if needed
         if f0_condition:
-            F0_ori = self.rmvpe.infer_from_audio(ref_waves_16k[0], thred=0.03)
-            F0_alt = self.rmvpe.infer_from_audio(converted_waves_16k[0], thred=0.03)
-            
-            if self.device == "mps":
-                F0_ori = torch.from_numpy(F0_ori).float().to(self.device)[None]
-                F0_alt = torch.from_numpy(F0_alt).float().to(self.device)[None]
-            else:
-                F0_ori = torch.from_numpy(F0_ori).to(self.device)[None]
-                F0_alt = torch.from_numpy(F0_alt).to(self.device)[None]
+            F0_alt = self.rmvpe.infer_from_audio(converted_waves_16k[0], thred=0.03,
+                                                 return_tensor=True).to(self.device)[None]
             
             voiced_F0_ori = F0_ori[F0_ori > 1]
             voiced_F0_alt = F0_alt[F0_alt > 1]
@@ -406,7 +357,6 @@ class SeedVCWrapper:
             if pitch_shift != 0:
                 shifted_f0_alt[F0_alt > 1] = self.adjust_f0_semitones(shifted_f0_alt[F0_alt > 1], pitch_shift)
         else:
-            F0_ori = None
             F0_alt = None
             shifted_f0_alt = None
         
@@ -414,31 +364,36 @@ class SeedVCWrapper:
         cond, _, codes, commitment_loss, codebook_loss = inference_module.length_regulator(
             S_alt, ylens=target_lengths, n_quantizers=3, f0=shifted_f0_alt
         )
-        prompt_condition, _, codes, commitment_loss, codebook_loss = inference_module.length_regulator(
-            S_ori, ylens=target2_lengths, n_quantizers=3, f0=F0_ori
-        )
         
         # Process in chunks for streaming
         max_source_window = max_context_window - mel2.size(2)
         processed_frames = 0
         generated_wave_chunks = []
         previous_chunk = None
+        # Converted mels of upcoming chunks, keyed by their start frame
+        pending_targets = {}
         
         # Generate chunk by chunk and stream the output
         while processed_frames < cond.size(1):
-            chunk_cond = cond[:, processed_frames:processed_frames + max_source_window]
             is_last_chunk = processed_frames + max_source_window >= cond.size(1)
-            cat_condition = torch.cat([prompt_condition, chunk_cond], dim=1)
             
-            with torch.autocast(device_type=self.device.type, dtype=torch.float16):
-                # Voice Conversion
-                vc_target = inference_module.cfm.inference(
-                    cat_condition,
-                    torch.LongTensor([cat_condition.size(1)]).to(mel2.device),
-                    mel2, style2, None, diffusion_steps,
-                    inference_cfg_rate=inference_cfg_rate
-                )
-                vc_target = vc_target[:, :, mel2.size(-1):]
+            if processed_frames not in pending_targets:
+                # Chunks are independent given the prompt, so the next few share one batched call
+                starts = [processed_frames]
+                while len(starts) < chunk_batch_size and starts[-1] + max_source_window < cond.size(1):
+                    starts.append(starts[-1] + max_source_window - self.overlap_frame_len)
+                with torch.autocast(device_type=self.device.type, dtype=torch.float16):
+                    # Voice Conversion
+                    vc_targets = inference_module.cfm.inference_chunks(
+                        prompt_condition,
+                        [cond[:, start:start + max_source_window] for start in starts],
+                        mel2, style2, diffusion_steps,
+                        inference_cfg_rate=inference_cfg_rate,
+                        cfg_interval=cfg_interval,
+                        cfg_reuse=cfg_reuse
+                    )
+                pending_targets.update(zip(starts, vc_targets))
+            vc_target = pending_targets.pop(processed_frames)
             
             vc_wave = bigvgan_fn(vc_target.float())[0]
             
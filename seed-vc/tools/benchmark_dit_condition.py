@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for the step-invariant conditioning in DiT.
+
+For each sequence length it times one estimator step three ways:
+  legacy   concatenating x, prompt, projected content and repeated style, then cond_x_merge_linear
+           (the input merge as it was done before merge_condition existed)
+  merge    only the per-step part once merged_cond is precomputed: projecting x and adding merged_cond
+  forward  a full DiT.forward, recomputing the condition vs. passing merged_cond
+and checks that both merges agree. Weights are random, so no checkpoint is needed.
+
+Usage (from the seed-vc directory):
+    python tools/benchmark_dit_condition.py --lengths 300 1000 2600 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.commons import build_model, recursive_munch
+
+
+def legacy_merge(dit, x, prompt_x, style, cond):
+    T = x.size(2)
+    x_in = torch.cat([x.transpose(1, 2), prompt_x.transpose(1, 2), dit.cond_projection(cond)], dim=-1)
+    if dit.transformer_style_condition and not dit.style_as_token:
+        x_in = torch.cat([x_in, style[:, None, :].repeat(1, T, 1)], dim=-1)
+    return dit.cond_x_merge_linear(x_in)
+
+
+def step_merge(dit, x, merged_cond):
+    return F.linear(x.transpose(1, 2), dit.cond_x_merge_linear.weight[:, :dit.in_channels]) + merged_cond
+
+
+def timeit(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+@torch.inference_mode()
+def main(args):
+    torch.set_num_threads(args.threads)
+    config = yaml.safe_load(open(args.config, "r"))
+    model_params = recursive_munch(config["model_params"])
+    model_params.dit_type = 'DiT'
+    dit = build_model(model_params, stage="DiT").cfm.estimator.eval()
+    dit.setup_caches(max_batch_size=2 * args.batch_size, max_seq_length=8192)
+
+    B = args.batch_size
+    print(f"{'frames':>7}{'legacy ms':>11}{'merge ms':>10}{'max diff':>10}{'fwd ms':>9}{'fwd cached ms':>15}{'saved':>8}")
+    for T in args.lengths:
+        x = torch.randn(B, dit.in_channels, T)
+        prompt_x = torch.randn(B, dit.in_channels, T)
+        cond = torch.randn(B, T, model_params.DiT.content_dim)
+        style = torch.randn(B, model_params.style_encoder.dim)
+        x_lens = torch.full((B,), T, dtype=torch.long)
+        t = torch.full((B,), 0.5)
+
+        merged_cond = dit.merge_condition(prompt_x, style, cond)
+        diff = (legacy_merge(dit, x, prompt_x, style, cond) - step_merge(dit, x, merged_cond)).abs().max().item()
+        legacy_ms = timeit(lambda: legacy_merge(dit, x, prompt_x, style, cond), args.repeats)
+        merge_ms = timeit(lambda: step_merge(dit, x, merged_cond), args.repeats)
+        forward_ms = timeit(lambda: dit(x, prompt_x, x_lens, t, style, cond), args.forward_repeats)
+        cached_ms = timeit(lambda: dit(x, prompt_x, x_lens, t, style, cond, merged_cond=merged_cond),
+                           args.forward_repeats)
+        print(f"{T:>7}{legacy_ms:>11.2f}{merge_ms:>10.2f}{diff:>10.1e}{forward_ms:>9.1f}{cached_ms:>15.1f}"
+              f"{(forward_ms - cached_ms) / forward_ms * 100:>7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="./configs/presets/config_dit_mel_seed_uvit_whisper_small_wavenet.yml")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[300, 1000, 2600],
+                        help="Sequence lengths in mel frames (prompt + source)")
+    parser.add_argument("--batch-size", type=int, default=2, help="2 matches one CFG step for a single utterance")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--forward-repeats", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+"""
+Per-component inference time under different precision policies.
+
+Every policy gets a fresh model registry (see modules/precision.py) and converts
+the same source with the same initial noise. Per policy it prints the time of
+  content   the content encoder on the source
+  campplus  the speaker encoder on the reference
+  rmvpe     F0 extraction of the source (only with --f0-condition true)
+  dit       the full CFM sampling run over prompt + source
+  vocoder   the vocoder on the generated mel
+and the mean absolute difference of the generated mel from the first policy's.
+
+A policy is "auto" (the device defaults), a bare precision applied to every component
+that supports it ("fp32", "bf16", "fp16", "int8"), or comma-separated
+component=precision overrides of the defaults.
+
+Usage (from the seed-vc directory):
+    python tools/benchmark_precision.py --source src.wav --target ref.wav \\
+        --policies auto bf16 int8 content=bf16,dit=int8,campplus=int8
+"""
+import gc
+import os
+import sys
+import time
+
+import librosa
+import torch
+import torchaudio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference
+from modules.model_registry import BASE_DIT, F0_DIT, ModelRegistry, dit_paths
+from modules.precision import COMPONENTS, PRECISIONS, QUANTIZE_NAMES, SUPPORTED, format_policy, parse_policy
+from modules.voice_profile import compute_profile
+
+
+def policy_overrides(spec):
+    if spec == "auto":
+        return {}
+    if spec in PRECISIONS:
+        return {component: spec for component in COMPONENTS
+                if spec in SUPPORTED.get(component, PRECISIONS) and (spec != "int8" or component in QUANTIZE_NAMES)}
+    return parse_policy(spec)
+
+
+def timed(fn, device, repeats):
+    """Run ``fn`` once to warm up, then return its last output and the mean time in ms."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        output = fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return output, (time.perf_counter() - start) / repeats * 1000
+
+
+@torch.no_grad()
+def run_policy(args, registry, paths):
+    device = inference.device
+    model, semantic_fn, f0_fn, vocoder_fn, campplus_model, mel_fn, mel_fn_args = registry.model_set(
+        *paths, f0_condition=args.f0_condition)
+    sr = mel_fn_args["sampling_rate"]
+    ref_audio = torch.from_numpy(librosa.load(args.target, sr=sr)[0][:sr * 25])[None].to(device)
+    source_audio = torch.from_numpy(librosa.load(args.source, sr=sr)[0])[None].to(device)
+    source_16k = torchaudio.functional.resample(source_audio, sr, 16000)
+    ref_16k = torchaudio.functional.resample(ref_audio, sr, 16000)
+    profile = compute_profile(ref_audio, sr, semantic_fn, campplus_model, mel_fn, model.length_regulator,
+                              f0_fn=f0_fn)
+
+    times = {}
+    S_alt, times["content"] = timed(lambda: semantic_fn(source_16k), device, args.repeats)
+    feat = torchaudio.compliance.kaldi.fbank(ref_16k, num_mel_bins=80, dither=0, sample_frequency=16000)
+    feat = feat - feat.mean(dim=0, keepdim=True)
+    _, times["campplus"] = timed(lambda: campplus_model(feat.unsqueeze(0)), device, args.repeats)
+    F0_alt = None
+    if args.f0_condition:
+        F0_alt, times["rmvpe"] = timed(lambda: f0_fn(source_16k[0], thred=0.03, return_tensor=True).to(device)[None],
+                                       device, args.repeats)
+
+    target_lengths = torch.LongTensor([mel_fn(source_audio).size(2)]).to(device)
+    cond = model.length_regulator(S_alt, ylens=target_lengths, n_quantizers=3, f0=F0_alt)[0]
+    cat_condition = torch.cat([profile["prompt_condition"], cond], dim=1)
+    x_lens = torch.LongTensor([cat_condition.size(1)]).to(device)
+
+    def sample():
+        torch.manual_seed(args.seed)
+        with torch.autocast(device_type=device.type, dtype=registry.dtype("dit")):
+            mel = model.cfm.inference(cat_condition, x_lens, profile["mel2"], profile["style2"], None,
+                                      args.diffusion_steps, inference_cfg_rate=args.inference_cfg_rate)
+        return mel[:, :, profile["mel2"].size(-1):].float()
+
+    mel, times["dit"] = timed(sample, device, args.dit_repeats)
+    _, times["vocoder"] = timed(lambda: vocoder_fn(mel), device, args.repeats)
+    return times, mel
+
+
+def main(args):
+    paths = dit_paths(F0_DIT if args.f0_condition else BASE_DIT, args.checkpoint, args.config)
+    components = ["content", "campplus"] + (["rmvpe"] if args.f0_condition else []) + ["dit", "vocoder"]
+    print(f"Device: {inference.device}")
+    print(f"{'policy':<34}" + "".join(f"{name + ' ms':>13}" for name in components) + f"{'mel L1':>9}")
+    reference_mel = None
+    for spec in args.policies:
+        registry = ModelRegistry(inference.device, precision=policy_overrides(spec))
+        times, mel = run_policy(args, registry, paths)
+        if reference_mel is None:
+            reference_mel = mel
+        length = min(mel.size(-1), reference_mel.size(-1))
+        l1 = (mel[..., :length] - reference_mel[..., :length]).abs().mean().item()
+        print(f"{spec:<34.34}" + "".join(f"{times[name]:>13.1f}" for name in components) + f"{l1:>9.4f}")
+        print(f"  {format_policy(registry.precision)}")
+        del registry
+        gc.collect()
+        if inference.device.type == "cuda":
+            torch.cuda.empty_cache()
+
+
+if __name__ == "__main__":
+    parser = inference.get_parser()
+    parser.add_argument("--policies", type=str, nargs="+", default=["auto", "fp32", "bf16", "int8"])
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per component after one warm-up")
+    parser.add_argument("--dit-repeats", type=int, default=1, help="Timed CFM sampling runs after one warm-up")
+    parser.add_argument("--seed", type=int, default=1234)
+    main(parser.parse_args())
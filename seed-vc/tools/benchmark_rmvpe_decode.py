@@ -0,0 +1,123 @@
+"""
+Benchmark for RMVPE salience decoding (to_local_average_cents).
+
+For each clip length it decodes the same salience three ways:
+  loop     the per-frame Python loop decode used before vectorization, on CPU in numpy
+  numpy    the vectorized numpy decode (still used for the DirectML / ONNX path)
+  torch    decode_tensor on --device, single clip and a batch of --batch-size clips
+and reports the largest F0 difference against the loop. Salience is synthetic (a
+pitch track with unvoiced gaps) unless --audio is given, in which case RMVPE runs on
+that file tiled to each length.
+
+Usage (from the seed-vc directory):
+    python tools/benchmark_rmvpe_decode.py --seconds 30 120 600
+    python tools/benchmark_rmvpe_decode.py --audio examples/source/source_s1.wav --device cuda
+"""
+import argparse
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.rmvpe import RMVPE
+
+FRAMES_PER_SECOND = 100
+
+
+def loop_decode(rmvpe, salience, thred=0.03):
+    center = np.argmax(salience, axis=1) + 4
+    salience = np.pad(salience, ((0, 0), (4, 4)))
+    todo_salience, todo_cents_mapping = [], []
+    for idx in range(salience.shape[0]):
+        todo_salience.append(salience[:, center[idx] - 4:center[idx] + 5][idx])
+        todo_cents_mapping.append(rmvpe.cents_mapping[center[idx] - 4:center[idx] + 5])
+    todo_salience, todo_cents_mapping = np.array(todo_salience), np.array(todo_cents_mapping)
+    cents = np.sum(todo_salience * todo_cents_mapping, 1) / np.sum(todo_salience, 1)
+    cents[np.max(salience, axis=1) <= thred] = 0
+    f0 = 10 * (2 ** (cents / 1200))
+    f0[f0 == 10] = 0
+    return f0
+
+
+def decoder_only():
+    # decoding only needs the cents mapping, so no checkpoint is loaded
+    rmvpe = RMVPE.__new__(RMVPE)
+    rmvpe.cents_mapping = np.pad(20 * np.arange(360) + 1997.3794084376191, (4, 4))
+    rmvpe.cents_mapping_tensor = torch.from_numpy(rmvpe.cents_mapping).float()
+    return rmvpe
+
+
+def synthetic_salience(frames, generator):
+    bins = torch.arange(360).float()
+    pitch = (180 + torch.cumsum(torch.randn(frames, generator=generator), 0) * 0.5).clamp(20, 340)
+    salience = torch.exp(-0.5 * ((bins[None] - pitch[:, None]) / 1.5) ** 2)
+    salience = salience + 0.02 * torch.rand(frames, 360, generator=generator)
+    voiced = (torch.rand(frames // 50 + 1, generator=generator) > 0.3).repeat_interleave(50)[:frames]
+    return salience * torch.where(voiced, 1.0, 0.01)[:, None]
+
+
+def audio_salience(rmvpe, audio, frames):
+    wave = torch.from_numpy(librosa.load(audio, sr=16000)[0])
+    wave = wave.repeat(frames * 160 // wave.numel() + 1)[:frames * 160]
+    mel = rmvpe.mel_extractor(wave.float().to(rmvpe.device)[None], center=True)
+    return rmvpe.mel2hidden(mel)[0, :frames].float().cpu()
+
+
+def timeit(fn, repeats, device):
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+@torch.inference_mode()
+def main(args):
+    device = torch.device(args.device)
+    generator = torch.Generator().manual_seed(args.seed)
+    if args.audio:
+        from modules.model_registry import get_registry
+        rmvpe = get_registry(device).rmvpe()
+    else:
+        rmvpe = decoder_only()
+
+    print(f"{'seconds':>8}{'loop ms':>10}{'numpy ms':>10}{'torch ms':>10}"
+          f"{f'batch x{args.batch_size} ms':>15}{'max |df0| Hz':>14}")
+    for seconds in args.seconds:
+        frames = int(seconds * FRAMES_PER_SECOND)
+        salience = audio_salience(rmvpe, args.audio, frames) if args.audio else synthetic_salience(frames, generator)
+        salience_np = salience.numpy()
+        salience_device = salience.to(device)
+        batch = salience_device[None].repeat(args.batch_size, 1, 1)
+
+        reference = loop_decode(rmvpe, salience_np)
+        f0 = rmvpe.decode_tensor(salience_device).cpu().numpy()
+        f0_batch = rmvpe.decode_tensor(batch).cpu().numpy()
+        diff = max(np.abs(f0 - reference).max(), np.abs(f0_batch - reference[None]).max(),
+                   np.abs(rmvpe.decode(salience_np) - reference).max())
+
+        loop_ms = timeit(lambda: loop_decode(rmvpe, salience_np), args.repeats, torch.device("cpu"))
+        numpy_ms = timeit(lambda: rmvpe.decode(salience_np), args.repeats, torch.device("cpu"))
+        torch_ms = timeit(lambda: rmvpe.decode_tensor(salience_device), args.repeats, device)
+        batch_ms = timeit(lambda: rmvpe.decode_tensor(batch), args.repeats, device)
+        print(f"{seconds:>8g}{loop_ms:>10.2f}{numpy_ms:>10.2f}{torch_ms:>10.2f}{batch_ms:>15.2f}{diff:>14.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 120, 600], help="Clip lengths to decode")
+    parser.add_argument("--audio", type=str, default=None, help="Decode RMVPE salience of this file instead")
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    main(parser.parse_args())
@@ -0,0 +1,151 @@
+"""
+Compare the ODE solvers in modules/flow_matching.py against the Euler baseline.
+
+Every configuration converts the same source with the same initial noise. For
+each one the script reports estimator calls, wall time per call, peak memory
+above the starting point and the distance of the resulting mel spectrogram from
+the baseline (--diffusion-steps Euler steps on a uniform schedule). Peak memory
+comes from the CUDA allocator on GPU and from sampling the process RSS on CPU.
+
+Usage (from the seed-vc directory):
+    python tools/benchmark_solvers.py --source src.wav --target ref.wav --diffusion-steps 40 \\
+        --configs euler:uniform:10 heun:cosine:6 multistep:cosine:10 euler:uniform:40:0.05
+"""
+import os
+import sys
+import threading
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference
+from inference import load_models, get_reference_profile, prepare_source
+
+DEFAULT_CONFIGS = [
+    "euler:uniform:10",
+    "euler:cosine:10",
+    "euler:cosine:15",
+    "midpoint:cosine:6",
+    "heun:cosine:6",
+    "heun:cosine:8",
+    "multistep:uniform:10",
+    "multistep:cosine:10",
+    "multistep:cosine:15",
+    "euler:uniform:40:0.05",
+]
+
+
+def parse_config(config):
+    parts = config.split(":")
+    solver, schedule, steps = parts[0], parts[1], int(parts[2])
+    velocity_tol = float(parts[3]) if len(parts) > 3 else None
+    return {"solver": solver, "schedule": schedule, "n_timesteps": steps, "velocity_tol": velocity_tol}
+
+
+class PeakMemory:
+    def __init__(self, device, interval=0.002):
+        self.device = device
+        self.interval = interval
+        self.peak_mb = 0.0
+
+    @staticmethod
+    def _rss_mb():
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._peak = max(self._peak, self._rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            self._start = torch.cuda.memory_allocated()
+        elif os.path.exists("/proc/self/statm"):
+            self._start = self._peak = self._rss_mb()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize()
+            self.peak_mb = (torch.cuda.max_memory_allocated() - self._start) / 2 ** 20
+        elif hasattr(self, "_thread"):
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = self._peak - self._start
+        return False
+
+
+def run(model, cond, profile, args, config):
+    mel2 = profile["mel2"]
+    cat_condition = torch.cat([profile["prompt_condition"], cond], dim=1)
+    x_lens = torch.LongTensor([cat_condition.size(1)]).to(mel2.device)
+
+    calls = [0]
+    def count_call(module, inputs, output):
+        calls[0] += 1
+    hook = model.cfm.estimator.register_forward_hook(count_call)
+
+    elapsed = []
+    peak_mb = 0.0
+    try:
+        for _ in range(args.repeats):
+            torch.manual_seed(args.seed)
+            calls[0] = 0
+            start = time.time()
+            with PeakMemory(inference.device) as memory, \
+                    torch.autocast(device_type=inference.device.type,
+                                   dtype=inference.dit_dtype):
+                mel = model.cfm.inference(cat_condition, x_lens, mel2, profile["style2"], None,
+                                          config["n_timesteps"], inference_cfg_rate=args.inference_cfg_rate,
+                                          solver=config["solver"], schedule=config["schedule"],
+                                          velocity_tol=config["velocity_tol"],
+                                          cfg_interval=tuple(args.cfg_interval), cfg_reuse=args.cfg_reuse)
+            elapsed.append(time.time() - start)
+            peak_mb = max(peak_mb, memory.peak_mb)
+    finally:
+        hook.remove()
+    return mel[:, :, mel2.size(-1):].float(), calls[0], min(elapsed), peak_mb
+
+
+def main(args):
+    model_set = load_models(args)
+    model = model_set[0]
+    profile = get_reference_profile(model_set, args)
+    cond = prepare_source(model_set, args, profile)
+    # Keep to one context window so every configuration runs a single diffusion call
+    sr = 22050 if not args.f0_condition else 44100
+    hop_length = 256 if not args.f0_condition else 512
+    cond = cond[:, :sr // hop_length * 30 - profile["mel2"].size(2)]
+
+    baseline = {"solver": "euler", "schedule": "uniform", "n_timesteps": args.diffusion_steps, "velocity_tol": None}
+    base_mel, base_calls, base_time, base_peak = run(model, cond, profile, args, baseline)
+    frames = base_mel.size(-1)
+
+    print(f"{'config':<28}{'calls':>7}{'time (s)':>10}{'ms/call':>9}{'peak MB':>9}{'speedup':>9}"
+          f"{'mel L1':>9}{'rel L2':>9}")
+    print(f"{'euler:uniform:' + str(args.diffusion_steps) + ' (baseline)':<28}{base_calls:>7}{base_time:>10.3f}"
+          f"{base_time / base_calls * 1000:>9.1f}{base_peak:>9.1f}{1.0:>9.2f}{0.0:>9.4f}{0.0:>9.4f}")
+    for config in args.configs:
+        mel, calls, elapsed, peak = run(model, cond, profile, args, parse_config(config))
+        l1 = (mel - base_mel).abs().mean().item()
+        rel_l2 = ((mel - base_mel).norm() / base_mel.norm()).item()
+        print(f"{config:<28}{calls:>7}{elapsed:>10.3f}{elapsed / calls * 1000:>9.1f}{peak:>9.1f}"
+              f"{base_time / elapsed:>9.2f}{l1:>9.4f}{rel_l2:>9.4f}")
+    print(f"{frames} mel frames, cfg rate {args.inference_cfg_rate}, device {inference.device}")
+
+
+if __name__ == "__main__":
+    parser = inference.get_parser()
+    parser.add_argument("--configs", type=str, nargs="+", default=DEFAULT_CONFIGS,
+                        help="solver:schedule:steps[:velocity_tol] entries to compare against the baseline")
+    parser.add_argument("--repeats", type=int, default=2, help="Timed runs per configuration; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=1234)
+    main(parser.parse_args())
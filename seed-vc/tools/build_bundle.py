@@ -0,0 +1,95 @@
+"""
+Write a fast-start model bundle for the v1 models.
+
+The bundle is a directory with one safetensors file per component and a
+manifest.json. Weights are stored exactly as the live modules hold them after
+loading: DDP prefixes stripped, shape-filtered, weight norm folded away (DiT
+and BigVGAN) and Whisper reduced to its encoder. The models are built on CPU
+under its default precision policy (see modules/precision.py), so every
+component, Whisper included, is stored in fp32; the registry casts Whisper
+to the content precision of the loading device. Loading from it is a memory
+map plus assign, so cold start is bounded by page-ins rather than
+unpickling and re-normalizing checkpoints.
+
+Usage (from the seed-vc directory, with network access):
+    python tools/build_bundle.py --output ./checkpoints/bundle --variants base f0
+    python inference.py --bundle ./checkpoints/bundle ...   # or export SEED_VC_BUNDLE
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.commons import recursive_munch
+from modules.model_bundle import BundleWriter, flatten_munch_state, remove_weight_norms
+from modules.model_registry import BASE_DIT, F0_DIT, ModelRegistry, dit_paths
+
+VARIANTS = {"base": BASE_DIT, "f0": F0_DIT}
+
+
+def add_dit(writer, registry, name, checkpoint_path, config_path):
+    model, config = registry.dit(checkpoint_path, config_path)
+    for key in model:
+        remove_weight_norms(model[key])
+    config_file = writer.filename("dit", name, suffix=".yml")
+    shutil.copyfile(config_path, os.path.join(writer.bundle_dir, config_file))
+    writer.add("dit", name, flatten_munch_state(model), config=config_file)
+    return recursive_munch(config["model_params"])
+
+
+def add_whisper(writer, registry, name):
+    whisper_model, feature_extractor = registry.whisper(name)
+    feature_extractor_dir = writer.filename("whisper", name, suffix="_feature_extractor")
+    feature_extractor.save_pretrained(os.path.join(writer.bundle_dir, feature_extractor_dir))
+    writer.add("whisper", name, whisper_model.state_dict(),
+               config=whisper_model.config.to_dict(), feature_extractor=feature_extractor_dir)
+
+
+@torch.no_grad()
+def main(args):
+    registry = ModelRegistry(torch.device("cpu"))
+    writer = BundleWriter(args.output)
+
+    dits = [(VARIANTS[variant][0], *dit_paths(VARIANTS[variant])) for variant in args.variants]
+    if args.checkpoint:
+        dits.append((os.path.basename(args.checkpoint), args.checkpoint, args.config))
+
+    whisper_names, bigvgan_names = set(), set()
+    for name, checkpoint_path, config_path in dits:
+        model_params = add_dit(writer, registry, name, checkpoint_path, config_path)
+        if model_params.speech_tokenizer.type == 'whisper':
+            whisper_names.add(model_params.speech_tokenizer.name)
+        else:
+            print(f"Speech tokenizer {model_params.speech_tokenizer.type} of {name} is not bundled")
+        if model_params.vocoder.type == 'bigvgan':
+            bigvgan_names.add(model_params.vocoder.name)
+        else:
+            print(f"Vocoder {model_params.vocoder.type} of {name} is not bundled")
+
+    for name in sorted(whisper_names):
+        add_whisper(writer, registry, name)
+    for name in sorted(bigvgan_names):
+        bigvgan_model = registry.bigvgan(name)
+        writer.add("bigvgan", name, bigvgan_model.state_dict(), config=dict(bigvgan_model.h))
+    writer.add("campplus", "campplus_cn_common.bin", registry.campplus().state_dict())
+    if "f0" in args.variants or args.f0_condition:
+        writer.add("rmvpe", "rmvpe.pt", registry.rmvpe().model.state_dict())
+    writer.close()
+
+    total = sum(entry["bytes"] for entry in writer.components.values())
+    print(f"Wrote {len(writer.components)} components ({total / 2 ** 20:.1f} MB) to {writer.bundle_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str, default="./checkpoints/bundle")
+    parser.add_argument("--variants", type=str, nargs="*", default=["base", "f0"], choices=sorted(VARIANTS),
+                        help="Released DiT models to include")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Also bundle a fine-tuned DiT checkpoint")
+    parser.add_argument("--config", type=str, default=None, help="Config of --checkpoint")
+    parser.add_argument("--f0-condition", action="store_true", help="Include RMVPE even without the f0 variant")
+    main(parser.parse_args())
@@ -0,0 +1,152 @@
+"""
+Export the v1 DiT estimator, length regulator and BigVGAN vocoder for the CPU backends of inference.py.
+
+Every graph has a dynamic batch and sequence length. The DiT is exported per solver
+step, taking the merged condition that DiT.merge_condition computes once per run.
+The export directory gets one graph per component plus an export.json manifest
+naming the checkpoint it came from.
+
+--check loads the exported graphs the way inference.py does and compares them with
+the PyTorch modules on random inputs, at lengths other than the traced one and with
+padding, then exits non-zero if any relative error exceeds --tol.
+
+Usage (from the seed-vc directory):
+    python tools/export_models.py --format onnx --export-dir ./checkpoints/export_onnx --check
+    python tools/export_models.py --format torchscript --f0-condition true --export-dir ./checkpoints/export_ts_f0
+    python inference.py --backend onnx --export-dir ./checkpoints/export_onnx ...
+"""
+import argparse
+import os
+import sys
+from functools import partial
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.commons import recursive_munch, str2bool
+from modules.export import (EXPORT_FORMATS, SUFFIXES, EstimatorStep, RegulatorStep, export_graph, load_graph,
+                            load_manifest, save_manifest)
+from modules.model_registry import BASE_DIT, F0_DIT, ModelRegistry, dit_paths
+
+
+def dit_inputs(dit, style_dim, length, batch_size=1, padding=0):
+    x_lens = torch.full((batch_size,), length, dtype=torch.long)
+    x_lens[1:] -= padding
+    style = torch.randn(batch_size, style_dim)
+    prompt_x = torch.randn(batch_size, dit.in_channels, length)
+    cond = torch.randn(batch_size, length, dit.cond_projection.in_features)
+    return {
+        "x": torch.randn(batch_size, dit.in_channels, length),
+        "x_lens": x_lens,
+        "t": torch.rand(batch_size),
+        "style": style,
+        "merged_cond": dit.merge_condition(prompt_x, style, cond),
+    }
+
+
+def regulator_inputs(regulator, length, batch_size=1, padding=0):
+    # content at 50 Hz, mel frames at ~86 Hz, F0 at 100 Hz with unvoiced frames
+    ylens = torch.full((batch_size,), length * 86 // 50, dtype=torch.long)
+    ylens[1:] -= padding
+    inputs = {"x": torch.randn(batch_size, length, regulator.content_in_proj.in_features), "ylens": ylens}
+    if regulator.f0_condition:
+        f0 = torch.rand(batch_size, 2 * length) * 400 + 80
+        inputs["f0"] = f0 * (torch.rand(batch_size, 2 * length) > 0.2)
+    return inputs
+
+
+def vocoder_inputs(vocoder, length, batch_size=1, padding=0):
+    return {"mel": torch.randn(batch_size, vocoder.h.num_mels, length)}
+
+
+def get_components(model, model_params, vocoder):
+    """
+    (name, module to export, PyTorch reference, example input builder, dynamic axes) of every exportable
+    component. The reference is the original module wherever the exported one rewrites its forward.
+    """
+    step = EstimatorStep(model.cfm.estimator)
+    exported = [(
+        "dit", step, step,
+        partial(dit_inputs, model.cfm.estimator, model_params.style_encoder.dim),
+        {"x": {0: "batch", 2: "length"}, "x_lens": {0: "batch"}, "t": {0: "batch"}, "style": {0: "batch"},
+         "merged_cond": {0: "batch", 1: "length"}, "output": {0: "batch", 2: "length"}},
+    )]
+    try:
+        regulator = RegulatorStep(model.length_regulator)
+    except ValueError as e:
+        print(f"Skipping length_regulator: {e}")
+    else:
+        dynamic_axes = {"x": {0: "batch", 1: "content_length"}, "ylens": {0: "batch"},
+                        "output": {0: "batch", 1: "length"}}
+        if model.length_regulator.f0_condition:
+            dynamic_axes["f0"] = {0: "batch", 1: "f0_length"}
+        def reference(x, ylens, f0=None):
+            return model.length_regulator(x, ylens=ylens, f0=f0)[0]
+        exported.append(("length_regulator", regulator, reference,
+                         partial(regulator_inputs, model.length_regulator), dynamic_axes))
+    if model_params.vocoder.type == "bigvgan":
+        exported.append(("vocoder", vocoder, vocoder, partial(vocoder_inputs, vocoder),
+                         {"mel": {0: "batch", 2: "length"}, "output": {0: "batch", 2: "samples"}}))
+    else:
+        print(f"Skipping vocoder: only BigVGAN is exported, not {model_params.vocoder.type}")
+    return exported
+
+
+def check(args, exported):
+    manifest = load_manifest(args.export_dir)
+    passed = True
+    print(f"{'component':<18}{'batch':>6}{'length':>8}{'max abs err':>14}{'rel err':>10}")
+    for name, _, reference_fn, make_inputs, _ in exported:
+        graph = load_graph(args.export_dir, manifest["components"][name], args.format)
+        for batch_size, length, padding in ((1, args.length // 2 + 37, 0), (2, args.length * 2 + 11, 29)):
+            inputs = make_inputs(length, batch_size=batch_size, padding=padding)
+            reference = reference_fn(*inputs.values())
+            output = graph(**inputs)
+            error = (reference - output).abs().max().item()
+            relative = error / max(reference.abs().max().item(), 1e-8)
+            passed &= relative <= args.tol
+            print(f"{name:<18}{batch_size:>6}{length:>8}{error:>14.3e}{relative:>10.2e}")
+    print("Parity check " + ("passed" if passed else f"FAILED (tolerance {args.tol})"))
+    return passed
+
+
+@torch.no_grad()
+def main(args):
+    torch.manual_seed(args.seed)
+    # Unquantized fp32 modules; the exported graphs get their own CPU optimizations from the runtime
+    registry = ModelRegistry(torch.device("cpu"))
+    checkpoint_path, config_path = dit_paths(F0_DIT if args.f0_condition else BASE_DIT, args.checkpoint, args.config)
+    model, config = registry.dit(checkpoint_path, config_path)
+    model_params = recursive_munch(config["model_params"])
+    vocoder = registry.vocoder(model_params)
+
+    os.makedirs(args.export_dir, exist_ok=True)
+    manifest = {"format": args.format, "checkpoint": os.path.basename(checkpoint_path), "components": {}}
+    exported = get_components(model, model_params, vocoder)
+    for name, module, _, make_inputs, dynamic_axes in exported:
+        # the DiT is traced with the stacked CFG batch it sees most
+        inputs = make_inputs(args.length, batch_size=2 if name == "dit" else 1)
+        filename = name + SUFFIXES[args.format]
+        export_graph(module, inputs, dynamic_axes, os.path.join(args.export_dir, filename), args.format, args.opset)
+        manifest["components"][name] = {"file": filename, "inputs": list(inputs)}
+        print(f"Exported {name} to {os.path.join(args.export_dir, filename)}")
+    save_manifest(args.export_dir, manifest)
+
+    if args.check and not check(args, exported):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", type=str, default="onnx", choices=EXPORT_FORMATS)
+    parser.add_argument("--export-dir", type=str, default="./checkpoints/export")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Fine-tuned DiT checkpoint to export")
+    parser.add_argument("--config", type=str, default=None, help="Config of --checkpoint")
+    parser.add_argument("--f0-condition", type=str2bool, default=False)
+    parser.add_argument("--length", type=int, default=256, help="Sequence length of the traced example inputs")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--check", action="store_true", help="Compare the exported graphs with PyTorch afterwards")
+    parser.add_argument("--tol", type=float, default=1e-3, help="Largest relative error --check accepts")
+    parser.add_argument("--seed", type=int, default=1234)
+    main(parser.parse_args())
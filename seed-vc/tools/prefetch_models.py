@@ -0,0 +1,90 @@
+"""
+Download every checkpoint the v1 entry points need and record it in the local model manifest.
+
+After this has run once with network access, set SEED_VC_OFFLINE=1 and model
+resolution goes through checkpoints/model_manifest.json only: absolute paths,
+size-checked at startup, no hub lookups. --verify re-hashes every recorded file
+against its sha256.
+
+Usage (from anywhere):
+    python seed-vc/tools/prefetch_models.py                 # base + f0 models
+    python seed-vc/tools/prefetch_models.py --variants base f0 realtime
+    python seed-vc/tools/prefetch_models.py --verify
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hf_utils
+from hf_utils import load_manifest, resolve_file, resolve_pretrained
+
+# (repo_id, filename) pairs and from_pretrained repos (with the files they load) per variant
+VARIANT_FILES = {
+    "base": [
+        ("Plachta/Seed-VC", "DiT_seed_v2_uvit_whisper_small_wavenet_bigvgan_pruned.pth"),
+        ("Plachta/Seed-VC", "config_dit_mel_seed_uvit_whisper_small_wavenet.yml"),
+        ("funasr/campplus", "campplus_cn_common.bin"),
+    ],
+    "f0": [
+        ("Plachta/Seed-VC", "DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema_v2.pth"),
+        ("Plachta/Seed-VC", "DiT_seed_v2_uvit_whisper_base_f0_44k_bigvgan_pruned_ft_ema.pth"),
+        ("Plachta/Seed-VC", "config_dit_mel_seed_uvit_whisper_base_f0_44k.yml"),
+        ("funasr/campplus", "campplus_cn_common.bin"),
+        ("lj1995/VoiceConversionWebUI", "rmvpe.pt"),
+    ],
+    "realtime": [
+        ("Plachta/Seed-VC", "DiT_uvit_tat_xlsr_ema.pth"),
+        ("Plachta/Seed-VC", "config_dit_mel_seed_uvit_xlsr_tiny.yml"),
+        ("funasr/campplus", "campplus_cn_common.bin"),
+        ("FunAudioLLM/CosyVoice-300M", "hift.pt"),
+    ],
+}
+VARIANT_SNAPSHOTS = {
+    "base": [
+        ("openai/whisper-small", ["*.json", "model.safetensors"]),
+        ("nvidia/bigvgan_v2_22khz_80band_256x", ["config.json", "bigvgan_generator.pt"]),
+    ],
+    "f0": [
+        ("openai/whisper-small", ["*.json", "model.safetensors"]),
+        ("nvidia/bigvgan_v2_44khz_128band_512x", ["config.json", "bigvgan_generator.pt"]),
+    ],
+    "realtime": [
+        ("facebook/wav2vec2-xls-r-300m", ["*.json", "pytorch_model.bin"]),
+    ],
+}
+
+
+def verify():
+    manifest = load_manifest()
+    entries = list(manifest["files"].items())
+    for repo_id, snapshot in manifest["snapshots"].items():
+        entries += [(f"{repo_id}/{name}", entry) for name, entry in snapshot["files"].items()]
+    bad = [key for key, entry in entries if not hf_utils.entry_ok(entry, verify=True)]
+    for key in bad:
+        print(f"FAILED {key}")
+    print(f"{len(entries) - len(bad)}/{len(entries)} files match {hf_utils.MANIFEST_PATH}")
+    return not bad
+
+
+def main(args):
+    if args.verify:
+        sys.exit(0 if verify() else 1)
+    if hf_utils.is_offline():
+        sys.exit("Prefetching needs network access; unset SEED_VC_OFFLINE / HF_HUB_OFFLINE")
+
+    files = {pair for variant in args.variants for pair in VARIANT_FILES[variant]}
+    snapshots = {repo_id: patterns for variant in args.variants for repo_id, patterns in VARIANT_SNAPSHOTS[variant]}
+    for repo_id, filename in sorted(files):
+        print(f"{repo_id}/{filename} -> {resolve_file(repo_id, filename)}")
+    for repo_id, patterns in sorted(snapshots.items()):
+        print(f"{repo_id} -> {resolve_pretrained(repo_id, allow_patterns=patterns, download=True)}")
+    print(f"Manifest written to {hf_utils.MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=str, nargs="+", default=["base", "f0"], choices=sorted(VARIANT_FILES))
+    parser.add_argument("--verify", action="store_true", help="Re-hash every manifest entry instead of downloading")
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""
+Measure what int8 quantization costs in quality and buys in CPU time.
+
+Converts a fixed clip set with the fp32 models and with the components given by
+--quantize (same seed, so both runs start from the same noise), then reports per
+clip and on average:
+  time      conversion wall time for fp32 and int8, and the speedup
+  spk ref   cosine similarity of CAMPPlus speaker embeddings (always the fp32
+            CAMPPlus) between the reference and the fp32 / int8 outputs
+  spk pair  the same similarity between the fp32 and int8 outputs
+  mel L1    mean absolute log-mel difference between the fp32 and int8 outputs
+Component-level errors are printed too: the relative error of the Whisper content
+features and of the CAMPPlus style vector on the reference.
+
+Usage (from the seed-vc directory):
+    python tools/validate_quantization.py --target ref.wav --clips a.wav b.wav c.wav \\
+        --quantize dit whisper campplus --diffusion-steps 30
+"""
+import os
+import sys
+import time
+
+import librosa
+import torch
+import torchaudio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference
+from inference import generate_wave_chunks, get_reference_profile, prepare_source
+from modules.model_registry import BASE_DIT, F0_DIT, ModelRegistry, dit_paths
+from modules.quantization import DEFAULT_QUANTIZE
+
+
+def speaker_embedding(campplus_model, wave, sr):
+    wave_16k = torchaudio.functional.resample(wave, sr, 16000)
+    feat = torchaudio.compliance.kaldi.fbank(wave_16k, num_mel_bins=80, dither=0, sample_frequency=16000)
+    feat = feat - feat.mean(dim=0, keepdim=True)
+    return campplus_model(feat.unsqueeze(0))[0]
+
+
+def relative_error(a, b):
+    return ((a - b).norm() / b.norm()).item()
+
+
+def convert(model_set, args, source, seed):
+    args.source = source
+    start = time.time()
+    torch.manual_seed(seed)
+    profile = get_reference_profile(model_set, args)
+    cond = prepare_source(model_set, args, profile)
+    wave = torch.cat([torch.from_numpy(w) for w in generate_wave_chunks(model_set, args, cond, profile)])
+    return wave[None].float(), time.time() - start, profile
+
+
+@torch.no_grad()
+def main(args):
+    quantize = args.quantize if args.quantize else DEFAULT_QUANTIZE
+    inference.device = torch.device("cpu")
+    inference.fp16 = False
+    inference.dit_dtype = torch.float32
+    paths = dit_paths(F0_DIT if args.f0_condition else BASE_DIT, args.checkpoint, args.config)
+    fp32_set = ModelRegistry(inference.device).model_set(*paths, f0_condition=args.f0_condition)
+    int8_set = ModelRegistry(inference.device, quantize=quantize).model_set(*paths, f0_condition=args.f0_condition)
+    campplus_model, to_mel = fp32_set[4], fp32_set[5]
+    sr = fp32_set[6]["sampling_rate"]
+
+    ref_audio = torch.from_numpy(librosa.load(args.target, sr=sr)[0][:sr * 25])[None]
+    ref_embedding = speaker_embedding(campplus_model, ref_audio, sr)
+
+    print(f"Quantized: {' '.join(quantize)}")
+    print(f"{'clip':<24}{'fp32 s':>8}{'int8 s':>8}{'speedup':>9}{'spk ref fp32':>14}{'spk ref int8':>14}"
+          f"{'spk pair':>10}{'mel L1':>9}")
+    rows = []
+    for i, clip in enumerate(args.clips):
+        fp32_wave, fp32_time, fp32_profile = convert(fp32_set, args, clip, args.seed + i)
+        int8_wave, int8_time, int8_profile = convert(int8_set, args, clip, args.seed + i)
+        fp32_embedding = speaker_embedding(campplus_model, fp32_wave, sr)
+        int8_embedding = speaker_embedding(campplus_model, int8_wave, sr)
+        length = min(fp32_wave.size(-1), int8_wave.size(-1))
+        fp32_mel, int8_mel = to_mel(fp32_wave[:, :length]), to_mel(int8_wave[:, :length])
+        row = (
+            fp32_time,
+            int8_time,
+            torch.cosine_similarity(ref_embedding, fp32_embedding, dim=0).item(),
+            torch.cosine_similarity(ref_embedding, int8_embedding, dim=0).item(),
+            torch.cosine_similarity(fp32_embedding, int8_embedding, dim=0).item(),
+            (fp32_mel - int8_mel).abs().mean().item(),
+            relative_error(int8_profile["S_ori"], fp32_profile["S_ori"]),
+            relative_error(int8_profile["style2"], fp32_profile["style2"]),
+        )
+        rows.append(row)
+        print(f"{os.path.basename(clip)[:23]:<24}{row[0]:>8.2f}{row[1]:>8.2f}{row[0] / row[1]:>9.2f}"
+              f"{row[2]:>14.4f}{row[3]:>14.4f}{row[4]:>10.4f}{row[5]:>9.4f}")
+
+    mean = [sum(column) / len(rows) for column in zip(*rows)]
+    print(f"{'mean':<24}{mean[0]:>8.2f}{mean[1]:>8.2f}{mean[0] / mean[1]:>9.2f}"
+          f"{mean[2]:>14.4f}{mean[3]:>14.4f}{mean[4]:>10.4f}{mean[5]:>9.4f}")
+    print(f"Reference content features rel. error {mean[6]:.4f}, style vector rel. error {mean[7]:.4f}")
+
+
+if __name__ == "__main__":
+    parser = inference.get_parser()
+    parser.add_argument("--clips", type=str, nargs="+", required=True, help="Fixed source clip set")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    args.profile = None
+    main(args)
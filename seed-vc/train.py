@@ -1,6 +1,6 @@
 import os
 import sys
-os.environ['HF_HUB_CACHE'] = './checkpoints/hf_cache'
+os.environ['HF_HUB_CACHE'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints', 'hf_cache')
 import torch
 import torch.multiprocessing as mp
 import random
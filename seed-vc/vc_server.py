@@ -0,0 +1,190 @@
+"""
+Resident Seed-VC conversion service.
+
+Loads the models once through ``inference.load_models`` and keeps them warm,
+accepting conversion requests over a Unix domain socket. Each connection sends
+a single JSON line and receives a single JSON line back:
+
+    -> {"op": "convert", "source": "/abs/src.wav", "target": "/abs/ref.wav",
+        "output": "/abs/outputs", "diffusion_steps": 40, ...}
+    <- {"status": "ok", "output": "/abs/outputs/vc_src_ref_1.0_40_0.7.wav"}
+
+An optional "output_file" ("output_files" for "convert_batch") sets the exact
+output path instead of a name derived from the source and target.
+
+    -> {"op": "convert_batch", "sources": ["/abs/a.wav", "/abs/b.wav"], "target": ..., "output": ...}
+    <- {"status": "ok", "outputs": ["/abs/outputs/vc_a_....wav", "/abs/outputs/vc_b_....wav"]}
+
+    -> {"op": "ping"}
+    <- {"status": "ok", "f0_condition": false, "sampling_rate": 22050}
+
+The "stream" op takes the same fields as "convert" plus optional
+"chunk_seconds" and "prompt_seconds" (how much of the reference prompt each
+chunk attends to; shorter is faster, longer follows the reference voice more
+closely). Once the first chunk is converted the server replies with
+{"status": "ok", "sample_rate": 22050}, the loaded model's output rate (the
+same "sampling_rate" that "ping" reports), and then sends the audio as frames of
+mono 16-bit little-endian PCM, each prefixed by its 4-byte big-endian byte
+length. A zero-length frame marks the end of the stream.
+
+Requests are served one at a time so the models are never used concurrently.
+
+Usage:
+    python vc_server.py --socket /tmp/seed_vc.sock --f0-condition False --fp16 False
+"""
+import argparse
+import json
+import os
+import socketserver
+import struct
+import time
+
+import numpy as np
+
+import inference
+from inference import load_models, convert_voice, convert_batch, stream_voice
+from modules.model_registry import get_registry
+
+DEFAULT_SOCKET_PATH = "/tmp/seed_vc.sock"
+DEFAULT_STREAM_CHUNK_SECONDS = 3.0
+DEFAULT_STREAM_PROMPT_SECONDS = 6.0
+
+# Per-request overrides accepted by the "convert" op. Everything else
+# (checkpoint, config, f0_condition, fp16) is fixed by the loaded models.
+REQUEST_PARAMS = (
+    "source",
+    "target",
+    "output",
+    "diffusion_steps",
+    "length_adjust",
+    "inference_cfg_rate",
+    "solver",
+    "schedule",
+    "velocity_tol",
+    "cfg_interval",
+    "cfg_reuse",
+    "auto_f0_adjust",
+    "semi_tone_shift",
+    "profile",
+    "batch_size",
+    "chunk_batch_size",
+    "output_file",
+    "output_files",
+)
+
+
+class ConversionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if request.get("op") == "stream":
+                self.server.stream(request, self.wfile)
+                return
+            response = self.server.dispatch(request)
+        except Exception as e:
+            response = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+def encode_pcm_frame(block):
+    pcm = (np.clip(block, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    return struct.pack(">I", len(pcm)) + pcm
+
+
+class ConversionServer(socketserver.UnixStreamServer):
+    def __init__(self, socket_path, args):
+        self.args = args
+        print(f"Loading models (f0_condition={args.f0_condition}, fp16={args.fp16})...")
+        start = time.time()
+        self.model_set = load_models(args)
+        print(f"Models loaded in {time.time() - start:.1f}s")
+        print(get_registry(inference.device).report())
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ConversionHandler)
+
+    def dispatch(self, request):
+        op = request.get("op", "convert")
+        if op == "ping":
+            return {
+                "status": "ok",
+                "f0_condition": bool(self.args.f0_condition),
+                "sampling_rate": self.model_set[-1]["sampling_rate"],
+            }
+        if op == "convert":
+            return self.convert(request)
+        if op == "convert_batch":
+            return self.convert_batch(request)
+        return {"status": "error", "error": f"Unknown op: {op}"}
+
+    def request_args(self, request):
+        if "f0_condition" in request and bool(request["f0_condition"]) != bool(self.args.f0_condition):
+            raise ValueError(f"Server was started with f0_condition={self.args.f0_condition}")
+        args = argparse.Namespace(**vars(self.args))
+        for key in REQUEST_PARAMS:
+            if key in request:
+                setattr(args, key, request[key])
+        return args
+
+    def convert(self, request):
+        args = self.request_args(request)
+        start = time.time()
+        output_path = convert_voice(self.model_set, args)
+        return {"status": "ok", "output": os.path.abspath(output_path), "elapsed": time.time() - start}
+
+    def convert_batch(self, request):
+        args = self.request_args(request)
+        start = time.time()
+        output_paths = convert_batch(self.model_set, args, request["sources"])
+        return {"status": "ok", "outputs": [os.path.abspath(path) for path in output_paths],
+                "elapsed": time.time() - start}
+
+    def stream(self, request, wfile):
+        args = self.request_args(request)
+        chunk_seconds = request.get("chunk_seconds", DEFAULT_STREAM_CHUNK_SECONDS)
+        prompt_seconds = request.get("prompt_seconds", DEFAULT_STREAM_PROMPT_SECONDS)
+        blocks = stream_voice(self.model_set, args, chunk_seconds=chunk_seconds, prompt_seconds=prompt_seconds)
+        # Errors before the first block are reported as a normal JSON error by the handler
+        first_block = next(blocks)
+        header = {"status": "ok", "sample_rate": self.model_set[-1]["sampling_rate"]}
+        wfile.write((json.dumps(header) + "\n").encode("utf-8"))
+        wfile.write(encode_pcm_frame(first_block))
+        wfile.flush()
+        try:
+            for block in blocks:
+                wfile.write(encode_pcm_frame(block))
+                wfile.flush()
+        except BrokenPipeError:
+            print("Stream client disconnected")
+            return
+        except Exception as e:
+            # The header has been sent; closing without the end frame tells the client the stream failed
+            print(f"Stream failed: {type(e).__name__}: {e}")
+            return
+        wfile.write(struct.pack(">I", 0))
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main(args):
+    server = ConversionServer(args.socket, args)
+    print(f"Seed-VC server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = inference.get_parser()
+    parser.add_argument("--socket", type=str, default=os.getenv("SEED_VC_SOCKET", DEFAULT_SOCKET_PATH))
+    args = parser.parse_args()
+    main(args)